@@ -18,8 +18,10 @@ except Exception:
     pass
 
 from src.translations import t, TRANSLATIONS
-from src.orchestrator import run_full_case_workflow
+from src.async_orchestrator import run_full_case_workflow_sync, stream_full_case_workflow_sync
+from src.orchestrator import enhance_differential
 from src.embeddings import search as mm_search
+from src.remedies import get_registry
 
 # Page config
 st.set_page_config(
@@ -225,14 +227,28 @@ if selected_page == "new_case":
             
             st.session_state.case_data = case_data
             
-            # Run workflow
-            with st.spinner(t("processing", lang)):
-                try:
-                    result = run_full_case_workflow(case_data)
-                    st.session_state.workflow_result = result
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
-                    st.info("Please check your OpenAI API key in .env file")
+            # Run workflow, showing agents and differential items as they complete
+            status = st.status(t("processing", lang), expanded=True)
+            live_labels = {"rationale": t("rationale", lang), "monitoring": t("monitoring", lang), "wellness_advice": t("wellness", lang)}
+            live = {field: st.empty() for field in live_labels}
+            streamed = {field: [] for field in live_labels}
+            try:
+                for event in stream_full_case_workflow_sync(case_data):
+                    if event["type"] == "step":
+                        status.write(f"**{event['agent']}**: {event['result'].get('message', 'Complete')}")
+                    elif event["type"] == "item" and event["field"] in live:
+                        streamed[event["field"]].append(event["value"])
+                        items = "\n".join(f"- {item}" for item in streamed[event["field"]])
+                        live[event["field"]].markdown(f"**{live_labels[event['field']]}**\n\n{items}")
+                    elif event["type"] == "final":
+                        st.session_state.workflow_result = event["workflow_result"]
+                status.update(state="complete", expanded=False)
+            except Exception as e:
+                status.update(state="error")
+                st.error(f"Error: {str(e)}")
+                st.info("Please check your OpenAI API key in .env file")
+            for placeholder in live.values():
+                placeholder.empty()
     
     # Display results
     if st.session_state.workflow_result:
@@ -256,6 +272,22 @@ if selected_page == "new_case":
                 agent = step.get("agent")
                 step_result = step.get("result", {})
                 st.write(f"**{agent}**: {step_result.get('message', 'Complete')}")
+            if result.get("stages", {}).get("reused"):
+                st.caption(f"♻️ Reused unchanged stages: {', '.join(result['stages']['reused'])}")
+            for degradation in result.get("degradations", []):
+                st.caption(
+                    f"⏳ {degradation['stage']}: used {degradation['fallback']} fallback ({degradation['reason']})"
+                )
+            if result.get("memo"):
+                st.caption(f"♻️ Reused the result of an identical case analyzed {result['memo']['age_s']:.0f}s ago")
+            if result.get("trace"):
+                trace_summary = result["trace"]
+                st.caption(
+                    f"⏱️ {trace_summary['total_ms'] / 1000:.1f}s · "
+                    f"tokens {trace_summary['tokens_in']} in ({trace_summary.get('tokens_cached', 0)} cached) / "
+                    f"{trace_summary['tokens_out']} out · "
+                    f"LLM cache {trace_summary['cache'].get('hit', 0)} hit(s) · trace {trace_summary['trace_id']}"
+                )
         
         # Show prescription
         if final.get("status") == "complete" and final.get("prescription"):
@@ -287,6 +319,16 @@ if selected_page == "new_case":
             for reason in prescription.get("rationale", []):
                 st.write(f"- {reason}")
             
+            # High-confidence cases are written up from templates; the LLM text is on demand
+            if prescription.get("rationale_source") == "template":
+                if st.button("✨ Get AI-enhanced rationale"):
+                    with st.spinner(t("processing", lang)):
+                        try:
+                            st.session_state.workflow_result = enhance_differential(st.session_state.case_data, result)
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error: {str(e)}")
+            
             st.subheader(t("keynotes", lang) + " (Characteristic Symptoms)")
             for keynote in prescription.get("matched_keynotes", []):
                 st.write(f"✓ {keynote}")
@@ -705,33 +747,11 @@ elif selected_page == "test_cases":
         if st.button("🔬 Run AI Analysis on This Case", type="primary"):
             with st.spinner("Analyzing test case..."):
                 try:
-                    from src.orchestrator import run_full_case_workflow
-                    
-                    # Convert test case format to orchestrator format
-                    case_data = test_case['case_data'].copy()
-                    
-                    # Convert lists to strings where needed
-                    if isinstance(case_data.get('mental_emotional'), list):
-                        case_data['mental_emotional'] = case_data['mental_emotional']
-                    if isinstance(case_data.get('generals'), list):
-                        case_data['generals'] = case_data['generals']
-                    if isinstance(case_data.get('cravings'), list):
-                        case_data['cravings'] = ', '.join(case_data['cravings'])
-                    if isinstance(case_data.get('aversions'), list):
-                        case_data['aversions'] = ', '.join(case_data['aversions'])
-                    if isinstance(case_data.get('sleep'), list):
-                        case_data['sleep'] = ', '.join(case_data['sleep'])
-                    if isinstance(case_data.get('dreams'), list):
-                        case_data['dreams'] = ', '.join(case_data['dreams'])
-                    if isinstance(case_data.get('past_history'), list):
-                        case_data['past_history'] = ', '.join(case_data['past_history'])
-                    if isinstance(case_data.get('family_history'), list):
-                        case_data['family_history'] = ', '.join(case_data['family_history'])
-                    if isinstance(case_data.get('lifestyle'), list):
-                        case_data['lifestyle'] = ', '.join(case_data['lifestyle'])
+                    # Test cases already use the orchestrator's case format (lists stay lists)
+                    case_data = test_case['case_data']
                     
                     # Skip intelligent questioning for test cases (they're already comprehensive)
-                    result = run_full_case_workflow(case_data, skip_questioning=True)
+                    result = run_full_case_workflow_sync(case_data, skip_questioning=True)
                     
                     st.success("✅ Analysis Complete!")
                     
@@ -744,7 +764,9 @@ elif selected_page == "test_cases":
                         ai_remedy = prescription.get("remedy", "")
                         expected_remedy = test_case['expected_remedy']
                         
-                        if ai_remedy.lower() == expected_remedy.lower():
+                        registry = get_registry()
+                        ai_remedy_id = registry.resolve(ai_remedy)
+                        if ai_remedy_id is not None and ai_remedy_id == registry.resolve(expected_remedy):
                             st.success(f"✅ **CORRECT!** AI selected: {ai_remedy}")
                         else:
                             st.warning(f"⚠️ **DIFFERENT** - AI selected: {ai_remedy}, Expected: {expected_remedy}")
@@ -0,0 +1,5 @@
+"""
+Modules shared by the Streamlit app (src/) and the FastAPI server (server/src/)
+They import only the standard library (tiktoken optionally) and each other, so
+either app can load them with the repository root on its import path.
+"""
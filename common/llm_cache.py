@@ -0,0 +1,194 @@
+"""
+Persistent LLM response cache
+Chat completions are stored content-addressed by (model, temperature, system prompt
+hash, user message hash) in a local SQLite database, so re-running an analysis or a
+Streamlit rerun returns the earlier response instead of a new multi-second request.
+The TTL/LRU SQLite store (SQLiteCache) is shared with the workflow result memo.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.db")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1").lower() not in ("0", "false", "off")
+# Entries older than this many seconds are treated as missing
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+# Least recently used entries are dropped beyond this count
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+# Only calls at or below this temperature are cached
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.3))
+
+
+def digest(text: str) -> str:
+    """SHA-256 hex digest of a text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SQLiteCache:
+    """
+    SQLite-backed (WAL) key -> text store with TTL and size-based LRU eviction.
+    Subclasses name the table, its payload column and any metadata columns, and may
+    restrict clear/stats to their own rows (`_scope`) or evict more on each store.
+    Hit/miss counters are per process; `hits` per entry is persisted.
+    """
+
+    TABLE = ""
+    PAYLOAD = ""
+    # Metadata column -> SQLite type, between the key and the timestamps
+    COLUMNS: Dict[str, str] = {}
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._schema())
+
+    @classmethod
+    def _schema(cls) -> str:
+        columns = "".join(f"    {name:<11} {kind:<7} NOT NULL,\n" for name, kind in cls.COLUMNS.items())
+        return (
+            f"CREATE TABLE IF NOT EXISTS {cls.TABLE} (\n"
+            f"    key         TEXT    PRIMARY KEY,\n{columns}"
+            f"    created_at  REAL    NOT NULL,\n"
+            f"    accessed_at REAL    NOT NULL,\n"
+            f"    hits        INTEGER NOT NULL DEFAULT 0,\n"
+            f"    {cls.PAYLOAD:<11} TEXT    NOT NULL\n"
+            f") WITHOUT ROWID;\n\n"
+            f"CREATE INDEX IF NOT EXISTS {cls.TABLE}_accessed ON {cls.TABLE} (accessed_at);\n"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _scope(self) -> Tuple[str, tuple]:
+        """WHERE clause (and parameters) selecting this store's own rows for clear/stats"""
+        return "1", ()
+
+    def _get(self, key: str) -> Optional[Tuple[str, float]]:
+        """(payload, created_at), or None on a miss (expired entries count as misses)"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT {self.PAYLOAD}, created_at FROM {self.TABLE} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.TABLE} WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                f"UPDATE {self.TABLE} SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        return row
+
+    def _put(self, key: str, payload: str, **columns):
+        """Store a payload with its metadata columns, then drop expired and least recently used entries"""
+        now = time.time()
+        names = ", ".join(["key", *self.COLUMNS, "created_at", "accessed_at", "hits", self.PAYLOAD])
+        marks = ", ".join("?" * (len(self.COLUMNS) + 3))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} ({names}) VALUES ({marks}, 0, ?)",
+                (key, *(columns[name] for name in self.COLUMNS), now, now, payload)
+            )
+            self.evictions += self._evict(now, columns)
+
+    def _evict(self, now: float, columns: Dict) -> int:
+        """Delete expired and least recently used entries (called under the lock); returns the count"""
+        evicted = 0
+        if self.ttl:
+            evicted += self._conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        evicted += self._conn.execute(
+            f"DELETE FROM {self.TABLE} WHERE key IN ("
+            f"SELECT key FROM {self.TABLE} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        return evicted
+
+    def clear(self):
+        where, params = self._scope()
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.TABLE} WHERE {where}", params)
+
+    def stats(self) -> Dict:
+        where, params = self._scope()
+        with self._lock:
+            entries, size = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH({self.PAYLOAD})), 0) FROM {self.TABLE} WHERE {where}",
+                params
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+class LLMCache(SQLiteCache):
+    """Chat completion responses keyed by request content"""
+
+    TABLE = "responses"
+    PAYLOAD = "response"
+    COLUMNS = {"model": "TEXT", "temperature": "REAL"}
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 max_temperature: float = LLM_CACHE_MAX_TEMPERATURE):
+        super().__init__(path, ttl, max_entries)
+        self.max_temperature = max_temperature
+
+    @staticmethod
+    def key(model: str, temperature: float, system_prompt: str, user_message: str) -> str:
+        """Content address of one chat completion request"""
+        return digest(f"{model}\x00{float(temperature):.3f}\x00{digest(system_prompt)}\x00{digest(user_message)}")
+
+    def cacheable(self, temperature: float) -> bool:
+        return temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response, or None on a miss"""
+        row = self._get(key)
+        return None if row is None else row[0]
+
+    def put(self, key: str, model: str, temperature: float, response: str):
+        """Store a response, then drop expired and least recently used entries"""
+        self._put(key, response, model=model, temperature=float(temperature))
+
+
+@lru_cache(maxsize=1)
+def get_llm_cache() -> Optional[LLMCache]:
+    """Process-wide response cache, or None when disabled with LLM_CACHE=0"""
+    return LLMCache() if LLM_CACHE_ENABLED else None
+
+
+def cache_for(temperature: float, use_cache: bool = True) -> Optional[LLMCache]:
+    """The cache to use for one call, or None when bypassed or too hot to cache"""
+    if not use_cache:
+        return None
+    cache = get_llm_cache()
+    if cache is None or not cache.cacheable(temperature):
+        return None
+    return cache
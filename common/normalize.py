@@ -0,0 +1,210 @@
+"""
+Shared symptom text normalization
+Tokenization, light stemming, homeopathic synonyms and negation scoping
+"""
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Clause boundaries end a negation scope
+CLAUSE_SPLIT_RE = re.compile(r"[,;.:!?\n()]+|\bbut\b|\band\b|\bor\b")
+
+NEGATION_CUES = {"no", "not", "never", "without", "nor", "none", "lack", "absence", "absent", "cannot", "cant", "dont", "doesnt", "isnt", "unable"}
+
+# Tokens negated after a cue ("no thirst", "not chilly at all")
+NEGATION_WINDOW = 3
+NEGATION_PREFIX = "~"
+
+# Prepositions and conjunctions that end a negation scope ("no thirst with fever")
+SCOPE_BREAKS = {"with", "despite", "during", "while", "though", "although", "yet", "except", "and", "but", "or"}
+
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "at", "for", "from", "with", "by", "is", "are",
+    "was", "were", "be", "been", "very", "much", "too", "as", "it", "its", "his", "her",
+    "she", "he", "i", "my", "me", "am", "has", "have", "had", "feel", "feels", "feeling",
+    "than", "after", "about", "into", "all", "any", "some", "there", "this", "that", "like", "also",
+    "easily", "generally", "usually", "mainly", "always", "despite", "while", "though", "although",
+    "yet", "except",
+}
+# "am" is a stopword except as a clock time ("10-11 AM")
+_CLOCK_RE = re.compile(r"\b(\d{1,2})\s*(am|pm)\b")
+
+# Homeopathic synonyms, applied per raw token before stemming.
+# Values may expand to several canonical tokens (chilly -> worse cold).
+SYNONYMS: Dict[str, str] = {
+    "chilly": "worse cold",
+    "chilliness": "worse cold",
+    "chill": "cold",
+    "thirstless": "no thirst",
+    "agg": "worse",
+    "aggravation": "worse",
+    "aggravated": "worse",
+    "aggravates": "worse",
+    "worsens": "worse",
+    "amel": "better",
+    "amelioration": "better",
+    "ameliorated": "better",
+    "ameliorates": "better",
+    "improves": "better",
+    "warmth": "heat",
+    "warm": "heat",
+    "hot": "heat",
+    "craving": "desire",
+    "cravings": "desire",
+    "craves": "desire",
+    "crave": "desire",
+    "desires": "desire",
+    "longing": "desire",
+    "dislike": "aversion",
+    "dislikes": "aversion",
+    "averse": "aversion",
+    "aversions": "aversion",
+    "tearful": "weep",
+    "weepy": "weep",
+    "weeping": "weep",
+    "weeps": "weep",
+    "cries": "weep",
+    "cry": "weep",
+    "crying": "weep",
+    "anxious": "anxiety",
+    "worried": "anxiety",
+    "worry": "anxiety",
+    "irritability": "irritable",
+    "angry": "irritable",
+    "fatty": "fat",
+    "fats": "fat",
+    "salty": "salt",
+    "sugar": "sweet",
+    "sweets": "sweet",
+    "sleepless": "insomnia",
+    "sleeplessness": "insomnia",
+    "tired": "fatigue",
+    "tiredness": "fatigue",
+    "exhaustion": "fatigue",
+    "exhausted": "fatigue",
+    "weakness": "weak",
+    "solitude": "alone",
+    "lonely": "alone",
+    "consoled": "consolation",
+    "sympathy": "consolation",
+    "movement": "motion",
+    "moving": "motion",
+    "walking": "motion",
+    "stools": "stool",
+    "menstrual": "menses",
+    "period": "menses",
+    "periods": "menses",
+    "dreams": "dream",
+    "dreaming": "dream",
+}
+
+# Multi-word synonyms applied to the lowercased text before tokenizing
+PHRASE_SYNONYMS: Dict[str, str] = {
+    "warm blooded": "worse heat",
+    "hot blooded": "worse heat",
+    "hot patient": "worse heat",
+    "cold blooded": "worse cold",
+    "cold patient": "worse cold",
+    "sensitive to cold": "worse cold",
+    "sensitive to heat": "worse heat",
+    "in company": "company",
+    "does not": "not",
+    "do not": "not",
+    "can not": "cannot",
+}
+_PHRASE_RE = re.compile(r"\b(" + "|".join(re.escape(p) for p in sorted(PHRASE_SYNONYMS, key=len, reverse=True)) + r")\b")
+
+# "-less" adjectives that are not negations of their stem
+_LESS_EXCEPTIONS = {"restless", "restlessness", "helpless", "hopeless", "careless", "useless", "unless", "senseless", "regardless", "homeless"}
+
+# (suffix, minimum stem length left behind)
+_SUFFIXES = (("ness", 3), ("ings", 3), ("ing", 3), ("edly", 3), ("ed", 3), ("ly", 4), ("ies", 3), ("s", 3))
+_STEM_EXCEPTIONS = {"evening", "during", "nothing", "something", "morning"}
+
+
+def stem(token: str) -> str:
+    """Light suffix stripping, consistent for both rubric keywords and case text"""
+    if len(token) <= 3 or not token.isalpha() or token in _STEM_EXCEPTIONS:
+        return token
+    for suffix, min_stem in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_stem:
+            if suffix == "s" and token.endswith(("ss", "us", "is")):
+                continue
+            token = token[: -len(suffix)] + ("y" if suffix == "ies" else "")
+            break
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] == token[-2] and token[-1] not in "aeiouls":
+        token = token[:-1]
+    return token
+
+
+def _expand(token: str) -> List[str]:
+    """Map a raw token to one or more canonical tokens ('thirstless' -> ['no', 'thirst'])"""
+    mapped = SYNONYMS.get(token)
+    if mapped:
+        return mapped.split()
+    if token.endswith("less") and len(token) > 6 and token not in _LESS_EXCEPTIONS:
+        return ["no"] + _expand(token[:-4])
+    return [token]
+
+
+def normalize_clause(clause: str) -> List[str]:
+    """Normalize a single clause: synonyms, stopwords, stemming and negation marks"""
+    tokens: List[str] = []
+    negate_left = 0
+    for raw in TOKEN_RE.findall(clause):
+        if raw in NEGATION_CUES:
+            negate_left = NEGATION_WINDOW
+            continue
+        if raw in SCOPE_BREAKS:
+            negate_left = 0
+        # A cue produced by expansion ("painless" -> "no pain") negates only its own stem
+        negate_stem = False
+        for tok in _expand(raw):
+            if tok in NEGATION_CUES:
+                negate_stem = True
+                continue
+            if tok in STOPWORDS:
+                continue
+            tok = stem(tok)
+            if negate_left:
+                tokens.append(NEGATION_PREFIX + tok)
+                negate_left -= 1
+            elif negate_stem:
+                tokens.append(NEGATION_PREFIX + tok)
+            else:
+                tokens.append(tok)
+    return tokens
+
+
+def normalize_text(text: str) -> List[str]:
+    """Normalize free text into canonical tokens; negation never crosses a clause boundary"""
+    text = str(text).lower().replace("'", "")
+    text = _CLOCK_RE.sub(r"\1\2", text)
+    text = _PHRASE_RE.sub(lambda m: PHRASE_SYNONYMS[m.group(1)], text)
+
+    tokens: List[str] = []
+    for clause in CLAUSE_SPLIT_RE.split(text):
+        if clause and not clause.isspace():
+            tokens.extend(normalize_clause(clause))
+    return tokens
+
+
+@lru_cache(maxsize=8192)
+def normalize_phrase(text: str, context: str = "") -> FrozenSet[str]:
+    """
+    Normalized token set for one symptom phrase.
+    `context` carries implicit field words (a craving 'Salt' means 'desire salt').
+    """
+    tokens = normalize_text(text)
+    if context:
+        tokens += normalize_text(context)
+    return frozenset(tokens)
+
+
+def keyword_form(keyword: str) -> FrozenSet[str]:
+    """Precomputed form of a rubric keyword; matches a phrase when it is a subset of it"""
+    return frozenset(normalize_text(keyword))
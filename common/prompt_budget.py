@@ -0,0 +1,133 @@
+"""
+Token-aware prompt context
+The differential prompt's Materia Medica context is filled up to a fixed token budget
+by priority: the case-matched keynotes of each candidate first, then excerpt lines
+ranked by overlap with the case (duplicates across remedies and excerpts dropped),
+all as compact JSON. Tokens are counted locally (tiktoken when installed, otherwise
+an estimate). The report gives the tokens used and saved against the full context,
+which PROMPT_FULL_CONTEXT=1 restores.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .normalize import normalize_text
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+# Tokens allowed for the candidates and Materia Medica context of one prompt
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", 800))
+PROMPT_FULL_CONTEXT = os.getenv("PROMPT_FULL_CONTEXT", "0").lower() in ("1", "true", "on")
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+
+# Word pieces of up to four characters and single punctuation marks: close to BPE counts for English
+_PIECE_RE = re.compile(r"\w{1,4}|[^\w\s]")
+# Monograph lines that are headings rather than content ("Keynotes:", "Remedy: Natrum Muriaticum")
+_HEADING_RE = re.compile(r"^(remedy:.*|[A-Za-z /]+:)$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text`, exact with tiktoken, estimated without"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_PIECE_RE.findall(text))
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _excerpt_lines(excerpts: List[str]) -> List[str]:
+    lines = []
+    for excerpt in excerpts:
+        for line in excerpt.splitlines():
+            line = line.strip().lstrip("-•* ").strip()
+            if line and not _HEADING_RE.match(line):
+                lines.append(line)
+    return lines
+
+
+def full_context(candidates: List[Dict], mm_context: List[Dict]) -> Tuple[str, str]:
+    """Top candidates and Materia Medica context as the unbudgeted prompt sections"""
+    return json.dumps(candidates, indent=2), json.dumps(mm_context, indent=2)
+
+
+def budget_context(case_tokens: List[str], candidates: List[Dict], mm_context: List[Dict],
+                   keynotes: Dict[str, List[str]], budget: int = PROMPT_CONTEXT_TOKENS,
+                   full: Optional[bool] = None) -> Tuple[str, str, Dict]:
+    """
+    Candidates and Materia Medica prompt sections within `budget` tokens, plus a report.
+    `keynotes` maps remedy name -> case-matched keynotes. The candidate list is always
+    kept (compact); keynotes, then excerpt lines by case overlap, fill the rest.
+    """
+    full = PROMPT_FULL_CONTEXT if full is None else full
+    full_sections = full_context(candidates, mm_context)
+    full_tokens = sum(count_tokens(s) for s in full_sections)
+    if full:
+        return (*full_sections, {"full_context": True, "tokens": full_tokens, "full_tokens": full_tokens,
+                                 "saved": 0, "budget": None})
+
+    candidates_text = compact_json([
+        {k: v for k, v in c.items() if k in ("name", "score", "reasons") and v not in (None, [], "")}
+        for c in candidates
+    ])
+    remaining = budget - count_tokens(candidates_text) - count_tokens("[]")
+
+    # Keynotes (in candidate order) rank above excerpt lines (by overlap with the case)
+    ranked = []
+    query = set(case_tokens)
+    for ri, entry in enumerate(mm_context):
+        remedy = entry.get("remedy", "")
+        for i, line in enumerate(keynotes.get(remedy, [])):
+            ranked.append((0, 0, ri, i, remedy, "keynotes", line))
+        for i, line in enumerate(_excerpt_lines(entry.get("mm_excerpts", []))):
+            overlap = len(query & set(normalize_text(line)))
+            if overlap:
+                ranked.append((1, -overlap, i, ri, remedy, "excerpts", line))
+    ranked.sort(key=lambda r: r[:4])
+
+    sections = {entry.get("remedy", ""): {"remedy": entry.get("remedy", "")} for entry in mm_context}
+    # Excerpt lines repeated anywhere (the same monograph retrieved for two candidates,
+    # a keynote quoted again in an excerpt) are sent once
+    sent, seen_lines, dropped = set(), set(), 0
+    for *_, remedy, kind, line in ranked:
+        form = frozenset(normalize_text(line))
+        if (remedy, form) in sent or (kind == "excerpts" and form in seen_lines):
+            continue
+        sent.add((remedy, form))
+        seen_lines.add(form)
+        # A line costs its quoted text and separator, plus its section's wrapper when it is the first
+        section = sections[remedy]
+        cost = count_tokens(compact_json(line)) + 1
+        if len(section) == 1:
+            cost += count_tokens(compact_json(section)) + 1
+        if kind not in section:
+            cost += count_tokens(f',"{kind}":[]')
+        if cost > remaining:
+            dropped += 1
+            continue
+        section.setdefault(kind, []).append(line)
+        remaining -= cost
+
+    # Remedies in name order, so the same candidates give the same bytes whatever their ranking
+    mm_text = compact_json([sections[r] for r in sorted(sections) if len(sections[r]) > 1])
+    tokens = count_tokens(candidates_text) + count_tokens(mm_text)
+    report = {"full_context": False, "tokens": tokens, "full_tokens": full_tokens,
+              "saved": max(0, full_tokens - tokens), "budget": budget, "dropped_lines": dropped}
+    return candidates_text, mm_text, report
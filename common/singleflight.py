@@ -0,0 +1,249 @@
+"""
+Request coalescing (singleflight)
+Identical requests that arrive while one is already in flight (two users submitting
+the same case, a double-clicked Analyze, the same MM query from concurrent runs) wait
+for that computation and share its result instead of starting their own. Requests
+are keyed by a canonical hash of their inputs; a key is only coalesced while its
+computation runs, so nothing is retained afterwards (see llm_cache / workflow_cache
+for that). `SingleFlight` serves threads, `AsyncSingleFlight` one event loop each.
+"""
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+_registry: List[Any] = []
+
+
+def request_key(*parts) -> str:
+    """Canonical hash of a request's inputs"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def flight_stats() -> Dict[str, Dict]:
+    """Leaders (computations started) and shared (requests coalesced) per flight group"""
+    stats: Dict[str, Dict] = {}
+    for group in _registry:
+        entry = stats.setdefault(group.name, {"leaders": 0, "shared": 0, "in_flight": 0})
+        for name, value in group.stats().items():
+            entry[name] += value
+    return stats
+
+
+class _Flight:
+    def __init__(self, lock: threading.Lock):
+        self.done = threading.Condition(lock)
+        self.finished = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.events: List[Any] = []
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls across threads.
+    `do()` shares a return value; `stream()` shares an event iterator, replaying the
+    events produced so far to late joiners.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        _registry.append(self)
+
+    def do(self, key: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Tuple[Any, bool]:
+        """
+        Result of `fn(*args, **kwargs)` and whether it was shared from an identical
+        in-flight call. Waiters give up after `timeout` seconds with TimeoutError.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                if not flight.done.wait_for(lambda: flight.finished, timeout):
+                    raise TimeoutError(f"{self.name}: identical request still in flight after {timeout}s")
+                if flight.error is not None:
+                    raise flight.error
+                return copy.deepcopy(flight.result), True
+            flight = self._flights[key] = _Flight(self._lock)
+            self.leaders += 1
+
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                flight.finished = True
+                flight.done.notify_all()
+
+    def stream(self, key: str, factory: Callable[[], Iterator]) -> Iterator:
+        """
+        Events of `factory()`, produced once per key by a background thread (in the
+        first caller's context) and handed to every concurrent caller. Production
+        stops early when all callers have gone.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight(self._lock)
+                self.leaders += 1
+                context = contextvars.copy_context()
+                threading.Thread(target=context.run, args=(self._produce, key, flight, factory),
+                                 name=f"singleflight-{self.name}", daemon=True).start()
+            else:
+                self.shared += 1
+            flight.subscribers += 1
+
+        seen = 0
+        try:
+            while True:
+                with self._lock:
+                    flight.done.wait_for(lambda: seen < len(flight.events) or flight.finished)
+                    if seen == len(flight.events):
+                        if flight.error is not None:
+                            raise flight.error
+                        return
+                    event = flight.events[seen]
+                seen += 1
+                yield copy.deepcopy(event)
+        finally:
+            with self._lock:
+                flight.subscribers -= 1
+                if not flight.subscribers and self._flights.get(key) is flight:
+                    del self._flights[key]  # abandoned; a new caller starts afresh
+
+    def _produce(self, key: str, flight: _Flight, factory: Callable[[], Iterator]):
+        events = factory()
+        try:
+            for event in events:
+                with self._lock:
+                    if not flight.subscribers:
+                        break
+                    flight.events.append(event)
+                    flight.done.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.finished = True
+                flight.done.notify_all()
+
+    def stats(self) -> Dict:
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._flights)}
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.events: List[Any] = []
+        self.queues: List[asyncio.Queue] = []
+        self.error: Optional[BaseException] = None
+
+
+_END = object()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent coroutines on an event loop. The shared work runs
+    as its own task, so one caller timing out or being cancelled does not cancel it
+    for the others; it is cancelled once every caller has gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.shared = 0
+        self._flights: Dict[Tuple[int, str], _AsyncFlight] = {}
+        _registry.append(self)
+
+    def _join(self, key: str, start: Callable) -> Tuple[Tuple[int, str], _AsyncFlight, bool]:
+        """The in-flight computation for `key` on this loop (started if none) and whether it was joined"""
+        loop_key = (id(asyncio.get_running_loop()), key)
+        flight = self._flights.get(loop_key)
+        if flight is not None:
+            self.shared += 1
+            return loop_key, flight, True
+        flight = self._flights[loop_key] = _AsyncFlight()
+        flight.task = asyncio.ensure_future(start(loop_key, flight))
+        self.leaders += 1
+        return loop_key, flight, False
+
+    def _leave(self, loop_key: Tuple[int, str], flight: _AsyncFlight):
+        if not flight.waiters and not flight.queues and not flight.task.done():
+            flight.task.cancel()
+            self._forget(loop_key, flight)
+
+    def _forget(self, loop_key: Tuple[int, str], flight: _AsyncFlight):
+        if self._flights.get(loop_key) is flight:
+            del self._flights[loop_key]
+
+    async def do(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Result of `await fn(*args, **kwargs)` and whether it was shared"""
+        async def run(loop_key, flight):
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self._forget(loop_key, flight)
+
+        loop_key, flight, shared = self._join(key, run)
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            self._leave(loop_key, flight)
+        return (copy.deepcopy(result), True) if shared else (result, False)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Events of `factory()`, produced once per key and handed to every concurrent caller"""
+        async def produce(loop_key, flight):
+            try:
+                async for event in factory():
+                    flight.events.append(event)
+                    for q in flight.queues:
+                        q.put_nowait(event)
+            except Exception as e:
+                flight.error = e
+            finally:
+                self._forget(loop_key, flight)
+                for q in flight.queues:
+                    q.put_nowait(_END)
+
+        loop_key, flight, _ = self._join(key, produce)
+        events: asyncio.Queue = asyncio.Queue()
+        for event in flight.events:
+            events.put_nowait(event)
+        flight.queues.append(events)
+        try:
+            while True:
+                event = await events.get()
+                if event is _END:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                yield copy.deepcopy(event)
+        finally:
+            flight.queues.remove(events)
+            self._leave(loop_key, flight)
+
+    def stats(self) -> Dict:
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._flights)}
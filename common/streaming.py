@@ -0,0 +1,132 @@
+"""
+Incremental JSON parsing of streamed LLM replies
+The differential reply is one JSON object; while it streams in, each element of its
+top-level lists (rationale, monitoring, wellness advice) is surfaced as soon as the
+element is complete, instead of after the whole generation
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# Top-level lists whose elements are surfaced one by one
+STREAMED_FIELDS = ("rationale", "monitoring", "wellness_advice")
+
+_WHITESPACE = " \t\r\n"
+_INVALID = object()
+
+
+class IncrementalJSONParser:
+    """
+    Feed text chunks with `feed()`; each call returns the events completed by that chunk:
+        {"type": "item", "field": key, "value": element}   element of a streamed list
+        {"type": "field", "field": key, "value": value}    any completed top-level value
+    Text before the first '{' (a ```json fence, a preamble) is ignored.
+    """
+
+    def __init__(self, fields: Iterable[str] = STREAMED_FIELDS):
+        self.fields = set(fields)
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect = "key"
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.text += chunk
+        events: List[Dict[str, Any]] = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            self._step(text, self._pos, events)
+            self._pos += 1
+        return events
+
+    def _in_list(self) -> bool:
+        return len(self._stack) == 2 and self._stack[-1] == "["
+
+    def _start_value(self, i: int):
+        """Mark where a top-level value or a streamed list element begins"""
+        if len(self._stack) == 1 and self._expect == "value":
+            self._value_start = i
+            self._expect = "separator"
+        elif self._in_list() and self._item_start is None:
+            self._item_start = i
+
+    def _finish_item(self, i: int, events: List[Dict[str, Any]]):
+        if self._item_start is not None and self._key in self.fields:
+            value = self._load(self.text[self._item_start:i])
+            if value is not _INVALID:
+                events.append({"type": "item", "field": self._key, "value": value})
+        self._item_start = None
+
+    def _finish_value(self, i: int, events: List[Dict[str, Any]]):
+        if self._value_start is not None and self._key is not None:
+            value = self._load(self.text[self._value_start:i])
+            if value is not _INVALID:
+                events.append({"type": "field", "field": self._key, "value": value})
+        self._value_start = None
+
+    @staticmethod
+    def _load(fragment: str):
+        try:
+            return json.loads(fragment.strip())
+        except ValueError:
+            return _INVALID
+
+    def _step(self, text: str, i: int, events: List[Dict[str, Any]]):
+        c = text[i]
+        if not self._stack:
+            if c == "{":
+                self._stack.append(c)
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                if len(self._stack) == 1 and self._expect == "key_string":
+                    key = self._load(text[self._key_start:i + 1])
+                    self._key = key if isinstance(key, str) else None
+                    self._expect = "colon"
+            return
+
+        depth = len(self._stack)
+        if c in _WHITESPACE:
+            return
+        if c == '"':
+            self._in_string = True
+            if depth == 1 and self._expect == "key":
+                self._key_start = i
+                self._expect = "key_string"
+            else:
+                self._start_value(i)
+        elif c in "{[":
+            self._start_value(i)
+            self._stack.append(c)
+        elif c in "}]":
+            if c == "]" and self._in_list():
+                self._finish_item(i, events)
+            elif depth == 1:
+                self._finish_value(i, events)
+            self._stack.pop()
+            if not self._stack:
+                self.done = True
+        elif c == ",":
+            if depth == 1:
+                self._finish_value(i, events)
+                self._expect = "key"
+            elif self._in_list():
+                self._finish_item(i, events)
+        elif c == ":":
+            if depth == 1 and self._expect == "colon":
+                self._expect = "value"
+        else:
+            # Number / true / false / null
+            self._start_value(i)
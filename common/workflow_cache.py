@@ -0,0 +1,183 @@
+"""
+Workflow result memoization
+Complete workflow results are stored under a canonical hash of the case (field order,
+whitespace and letter case normalized), so a Streamlit rerun or a repeated Analyze on
+an identical case returns the earlier result without re-running any stage. Keys also
+carry a fingerprint of the repertory, Materia Medica and prompt files (plus the model
+settings); editing any of them invalidates the stored results. The FastAPI server
+loads this module too; both share the SQLite file, each under its own namespace.
+"""
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from .llm_cache import SQLiteCache, digest
+
+# Defaults are anchored at the repository root, so the Streamlit app (run from the root)
+# and the FastAPI server (run from server/) share one file and one data fingerprint
+_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+WORKFLOW_CACHE_PATH = os.getenv("WORKFLOW_CACHE_PATH", os.path.join(_ROOT, "data", "workflow_cache.db"))
+WORKFLOW_CACHE_ENABLED = os.getenv("WORKFLOW_CACHE", "1").lower() not in ("0", "false", "off")
+# Entries older than this many seconds are treated as missing
+WORKFLOW_CACHE_TTL = float(os.getenv("WORKFLOW_CACHE_TTL", 24 * 3600))
+# Least recently used entries are dropped beyond this count
+WORKFLOW_CACHE_MAX_ENTRIES = int(os.getenv("WORKFLOW_CACHE_MAX_ENTRIES", 500))
+# Seconds between re-checks of the data/prompt fingerprint
+VERSION_CHECK_INTERVAL = float(os.getenv("WORKFLOW_CACHE_VERSION_CHECK", 2))
+
+# Files whose contents shape a workflow result
+VERSION_SOURCES = (
+    os.getenv("REPERTORY_PATH", os.path.join(_ROOT, "data", "repertory_mapping.csv")),
+    os.getenv("MM_DIR", os.path.join(_ROOT, "data", "materia_medica")),
+    os.getenv("EMBED_INDEX_PATH", os.path.join(_ROOT, "data", "mm_index.json")),
+    os.path.join(_ROOT, "prompts"),
+    os.path.join(_ROOT, "server", "prompts"),
+)
+# Settings that shape a workflow result
+VERSION_SETTINGS = ("OPENAI_MODEL", "OPENAI_HIGH_REASONING", "FAST_PATH_CONFIDENCE",
+                    "PROMPT_CONTEXT_TOKENS", "PROMPT_FULL_CONTEXT")
+
+# Per-run fields not replayed from the cache
+_RUN_FIELDS = ("trace", "timings", "memo", "stages", "deadline", "degradations")
+# Step statuses of a degraded run, which is not stored
+_DEGRADED = ("error", "timeout")
+
+def _normalize(value: Any) -> Any:
+    """Lowercase, whitespace-collapsed strings; empty values dropped; keys ordered"""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    elif hasattr(value, "to_dict"):
+        value = value.to_dict()
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, dict):
+        normalized = {str(k): _normalize(v) for k, v in value.items()}
+        return {k: normalized[k] for k in sorted(normalized) if normalized[k] not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [item for item in (_normalize(v) for v in value) if item not in (None, "", [], {})]
+    return value
+
+
+def canonical_case(case_data: Dict) -> str:
+    """Canonical JSON of a case: equal for cases that differ only in field order, spacing or case"""
+    return json.dumps(_normalize(case_data), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def case_hash(case_data: Dict) -> str:
+    return digest(canonical_case(case_data))
+
+
+def _files(source: str) -> List[str]:
+    if os.path.isdir(source):
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(source) for name in names)
+    return [source]
+
+
+def data_version(sources: Iterable[str] = VERSION_SOURCES, settings: Iterable[str] = VERSION_SETTINGS) -> str:
+    """Fingerprint of the data/prompt files (path, size, mtime) and the result-shaping settings"""
+    parts = []
+    for source in sources:
+        for path in _files(source):
+            try:
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{path}:missing")
+    parts += [f"{name}={os.getenv(name, '')}" for name in settings]
+    return digest("\n".join(parts))[:16]
+
+
+def cacheable(workflow_result: Dict) -> bool:
+    """Only complete, undegraded runs are stored (no timeouts, deadline fallbacks or LLM-unavailable results)"""
+    final = workflow_result.get("final_result")
+    if not final or workflow_result.get("degradations"):
+        return False
+    for step in workflow_result.get("steps", []):
+        result = step.get("result", {})
+        if result.get("status") in _DEGRADED or result.get("failed_searches"):
+            return False
+    prescription = final.get("prescription") or {}
+    if prescription and not prescription.get("remedy"):
+        return False  # unparseable differential reply
+    return prescription.get("rationale_source") != "clinical"
+
+
+def replay(workflow_result: Dict) -> List[Dict]:
+    """The step and final events of a stored result, for streaming callers"""
+    events = [{"type": "step", "agent": step["agent"], "result": step["result"]}
+              for step in workflow_result.get("steps", [])]
+    events.append({"type": "final", "workflow_result": workflow_result})
+    return events
+
+
+class WorkflowCache(SQLiteCache):
+    """
+    Complete workflow results, with TTL and LRU eviction (see SQLiteCache), per namespace.
+    Results from an older data version are purged on the next store.
+    """
+
+    TABLE = "workflows"
+    PAYLOAD = "result"
+    COLUMNS = {"namespace": "TEXT", "version": "TEXT"}
+
+    def __init__(self, path: str = WORKFLOW_CACHE_PATH, namespace: str = "app",
+                 sources: Iterable[str] = VERSION_SOURCES, ttl: float = WORKFLOW_CACHE_TTL,
+                 max_entries: int = WORKFLOW_CACHE_MAX_ENTRIES):
+        super().__init__(path, ttl, max_entries)
+        self.namespace = namespace
+        self.sources = tuple(sources)
+        self._version = None
+        self._version_checked = 0.0
+
+    def _scope(self):
+        return "namespace = ?", (self.namespace,)
+
+    def version(self) -> str:
+        """Current data version (re-checked at most every VERSION_CHECK_INTERVAL seconds)"""
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > VERSION_CHECK_INTERVAL:
+            self._version = data_version(self.sources)
+            self._version_checked = now
+        return self._version
+
+    def key(self, case_data: Dict, **options) -> str:
+        """Key of one workflow run: namespace, data version, canonical case and run options"""
+        opts = json.dumps(options, sort_keys=True, default=str)
+        return digest(f"{self.namespace}\x00{self.version()}\x00{case_hash(case_data)}\x00{opts}")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Stored result (marked with "memo") or None on a miss"""
+        row = self._get(key)
+        if row is None:
+            return None
+        workflow_result = json.loads(row[0])
+        workflow_result["memo"] = {"hit": True, "key": key[:16], "age_s": round(time.time() - row[1], 1)}
+        return workflow_result
+
+    def put(self, key: str, workflow_result: Dict):
+        """Store a result, then drop other versions, expired and least recently used entries"""
+        stored = {k: v for k, v in workflow_result.items() if k not in _RUN_FIELDS}
+        payload = json.dumps(stored, ensure_ascii=False, default=str)
+        self._put(key, payload, namespace=self.namespace, version=self.version())
+
+    def _evict(self, now: float, columns: Dict) -> int:
+        evicted = self._conn.execute(
+            "DELETE FROM workflows WHERE namespace = ? AND version != ?", (self.namespace, columns["version"])
+        ).rowcount
+        return evicted + super()._evict(now, columns)
+
+    def stats(self) -> Dict:
+        return dict(super().stats(), version=self.version())
+
+
+@lru_cache(maxsize=None)
+def get_workflow_cache(namespace: str = "app") -> Optional[WorkflowCache]:
+    """Process-wide workflow cache for `namespace`, or None when disabled with WORKFLOW_CACHE=0"""
+    return WorkflowCache(namespace=namespace) if WORKFLOW_CACHE_ENABLED else None
+
+
+def workflow_cache_for(use_cache: bool = True, namespace: str = "app") -> Optional[WorkflowCache]:
+    return get_workflow_cache(namespace) if use_cache else None
@@ -0,0 +1,14 @@
+"""
+FastAPI server package
+Modules shared with the Streamlit app (the streaming JSON parser, request coalescing,
+the workflow memo and the SQLite cache it is built on, text normalization and the
+prompt context budget) live in the repository's `common` package and are imported
+explicitly (`from common.streaming import ...`).
+The repository root is appended to the import path, so this package stays first for `src`.
+"""
+import os
+import sys
+
+_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
@@ -1,12 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import json
 import os
 
 from .schema import CaseRecord, SearchQuery
 from .repertory import repertorize
 from .safety import has_red_flags
 from .embeddings import search as mm_search
+from .orchestrator import stream_full_case_workflow
 
 REPERTORY_PATH = os.getenv("REPERTORY_PATH","../data/repertory_mapping.csv")
 
@@ -40,3 +43,21 @@ def api_repertorize(payload: CaseIn):
 def api_mm_search(q: SearchQuery):
     results = mm_search(q.q, k=q.k)
     return {"results": results}
+
+def _sse(events):
+    """Server-Sent Events framing: one `event:`/`data:` block per workflow event"""
+    try:
+        for event in events:
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+@app.post("/analyze/stream")
+def api_analyze_stream(payload: CaseIn):
+    """Full workflow as SSE: step events, differential items as generated, then the final result"""
+    case = payload.case.model_dump()
+    return StreamingResponse(
+        _sse(stream_full_case_workflow(case)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,7 @@
 import os, numpy as np
 from typing import List, Dict
 from .utils import load_materia_medica, save_json, load_json
+from common.singleflight import SingleFlight, request_key
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -36,7 +37,13 @@ def build_index() -> Dict:
 def load_index() -> Dict:
     return load_json(INDEX_PATH, default={"docs": [], "vectors": []})
 
+# Identical concurrent searches share one query embedding
+_searches = SingleFlight("mm_search")
+
 def search(query: str, k: int = 5) -> List[Dict]:
+    return _searches.do(request_key(query, k), _search, query, k)[0]
+
+def _search(query: str, k: int) -> List[Dict]:
     index = load_index()
     if not index["docs"]:
         index = build_index()
@@ -4,7 +4,7 @@ CaseTaker → Repertory → MateriaMedica → Differential → Prescription →
 """
 import os
 import json
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +14,12 @@ try:
 except Exception:
     OpenAI = None
 
+from common.normalize import normalize_text
+from common.prompt_budget import PROMPT_CONTEXT_TOKENS, budget_context
+from common.singleflight import SingleFlight, request_key
+from common.streaming import STREAMED_FIELDS, IncrementalJSONParser
+from common.workflow_cache import cacheable, case_hash, replay, workflow_cache_for
+
 from .repertory import repertorize
 from .safety import has_red_flags
 from .embeddings import search as mm_search
@@ -22,6 +28,12 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_HIGH_REASONING = os.getenv("OPENAI_HIGH_REASONING", "gpt-4o")
 REPERTORY_PATH = os.getenv("REPERTORY_PATH", "../data/repertory_mapping.csv")
+# Workflow memo namespace, apart from the Streamlit app's in the shared cache file
+WORKFLOW_NAMESPACE = "api"
+
+# Identical concurrent LLM calls and workflow runs share one computation
+_llm_flights = SingleFlight("llm")
+_workflow_flights = SingleFlight("workflow")
 
 
 def load_prompt(filename: str) -> str:
@@ -40,19 +52,41 @@ def _client():
 
 
 def call_llm(system_prompt: str, user_message: str, model: str = None, temperature: float = 0.3) -> str:
-    """Call OpenAI Chat Completions API"""
+    """Call OpenAI Chat Completions API (an identical call in flight is awaited and shared)"""
+    model = model or OPENAI_MODEL
+    
+    def complete():
+        response = _client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=temperature
+        )
+        return response.choices[0].message.content
+    
+    return _llm_flights.do(request_key(model, temperature, system_prompt, user_message), complete)[0]
+
+
+def stream_llm(system_prompt: str, user_message: str, model: str = None, temperature: float = 0.3) -> Iterator[str]:
+    """Call OpenAI Chat Completions API with streaming; yields text deltas"""
     client = _client()
     model = model or OPENAI_MODEL
     
-    response = client.chat.completions.create(
+    stream = client.chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ],
-        temperature=temperature
+        temperature=temperature,
+        stream=True
     )
-    return response.choices[0].message.content
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
 
 
 def agent_case_taker(case_data: Dict) -> Dict:
@@ -128,15 +162,45 @@ def agent_materia_medica(candidates: List[Dict], case_summary: str) -> Dict:
     }
 
 
-def agent_differential(case_data: Dict, repertory_result: Dict, mm_context: List[Dict]) -> Dict:
+ANALYSIS_INSTRUCTIONS = """# Task: Differential Analysis
+The user message gives the Materia Medica context, the repertory top candidates and the case.
+Based on classical homeopathy principles (Kent/Boenninghausen/Hering), analyze this case and recommend ONE remedy if ≥3 characteristic keynotes match.
+If insufficient evidence, request clarification.
+Include wellness advice for healthy mind and body."""
+
+
+# Case fields of the prompt's case summary, matched against Materia Medica excerpt lines
+SUMMARY_FIELDS = ("presenting_complaint", "mental_emotional", "generals", "thermal", "cravings", "aversions",
+                  "sleep", "dreams", "past_history", "family_history")
+
+
+def differential_request(case_data: Dict, repertory_result: Dict, mm_context: List[Dict],
+                         context_tokens: int = PROMPT_CONTEXT_TOKENS) -> Dict:
     """
-    DifferentialAgent: Uses LLM to compare top remedies and narrow to one
+    LLM request for the differential stage. Static material (system prompt, dosage
+    policy, instructions) forms the system prompt and per-case data the user message,
+    most stable first, so repeated calls share the provider's cached prompt prefix.
+    Candidates and Materia Medica context are fitted to `context_tokens` (see
+    prompt_budget; the server has no keynote index, so excerpt lines fill it) and the
+    token report is returned as "context".
     """
-    system_prompt = load_prompt("system.txt")
-    dosage_policy = load_prompt("dosage_policy.txt")
+    system_prompt = "\n\n".join(
+        part.strip() for part in (load_prompt("system.txt"), load_prompt("dosage_policy.txt"), ANALYSIS_INSTRUCTIONS)
+        if part
+    )
+    case_tokens = normalize_text(" ".join(
+        " ".join(map(str, value)) if isinstance(value, list) else str(value or "")
+        for value in (case_data.get(field) for field in SUMMARY_FIELDS)
+    ))
+    candidates_text, mm_text, context = budget_context(case_tokens, repertory_result.get('candidates', [])[:5],
+                                                       mm_context, {}, context_tokens)
     
-    # Build comprehensive context
-    user_message = f"""
+    user_message = f"""# Materia Medica Context
+{mm_text}
+
+# Repertory Top Candidates
+{candidates_text}
+
 # Case Summary
 Presenting Complaint: {case_data.get('presenting_complaint', 'N/A')}
 Mental/Emotional: {', '.join(case_data.get('mental_emotional', []))}
@@ -148,24 +212,20 @@ Sleep: {', '.join(case_data.get('sleep', []))}
 Dreams: {', '.join(case_data.get('dreams', []))}
 Past History: {', '.join(case_data.get('past_history', []))}
 Family History: {', '.join(case_data.get('family_history', []))}
+"""
+    return {"system_prompt": system_prompt, "user_message": user_message, "temperature": 0.2, "context": context}
 
-# Repertory Top Candidates
-{json.dumps(repertory_result.get('candidates', [])[:5], indent=2)}
 
-# Materia Medica Context
-{json.dumps(mm_context, indent=2)}
+def finish_differential(response: str, context: Optional[Dict] = None) -> Dict:
+    """Parse the LLM reply to differential_request (keeping its prompt token report as "prompt_context")"""
+    result = _finish_differential(response)
+    if context:
+        result["prompt_context"] = context
+    return result
 
-# Dosage Policy
-{dosage_policy}
 
-Based on classical homeopathy principles (Kent/Boenninghausen/Hering), analyze this case and recommend ONE remedy if ≥3 characteristic keynotes match.
-If insufficient evidence, request clarification.
-Include wellness advice for healthy mind and body.
-"""
-    
+def _finish_differential(response: str) -> Dict:
     try:
-        response = call_llm(system_prompt, user_message, model=OPENAI_HIGH_REASONING, temperature=0.2)
-        
         # Try to parse JSON response
         # Look for JSON block in response
         if "```json" in response:
@@ -198,6 +258,31 @@ Include wellness advice for healthy mind and body.
         }
 
 
+def agent_differential(case_data: Dict, repertory_result: Dict, mm_context: List[Dict]) -> Dict:
+    """
+    DifferentialAgent: Uses LLM to compare top remedies and narrow to one
+    """
+    request = differential_request(case_data, repertory_result, mm_context)
+    response = call_llm(request["system_prompt"], request["user_message"],
+                        model=OPENAI_HIGH_REASONING, temperature=request["temperature"])
+    return finish_differential(response, request["context"])
+
+
+def agent_differential_stream(case_data: Dict, repertory_result: Dict, mm_context: List[Dict]) -> Iterator[Dict]:
+    """
+    Streaming DifferentialAgent: yields rationale / monitoring / wellness_advice items
+    as the LLM generates them, then {"type": "differential", "result": ...}
+    """
+    request = differential_request(case_data, repertory_result, mm_context)
+    parser = IncrementalJSONParser(STREAMED_FIELDS)
+    for delta in stream_llm(request["system_prompt"], request["user_message"],
+                            model=OPENAI_HIGH_REASONING, temperature=request["temperature"]):
+        for event in parser.feed(delta):
+            if event["type"] == "item":
+                yield event
+    yield {"type": "differential", "result": finish_differential(parser.text, request["context"])}
+
+
 def agent_prescription(differential_result: Dict) -> Dict:
     """
     PrescriptionAgent: Formats final prescription with disclaimer
@@ -234,11 +319,38 @@ def agent_prescription(differential_result: Dict) -> Dict:
     }
 
 
-def run_full_case_workflow(case_data: Dict) -> Dict:
+def _step(workflow_result: Dict, agent: str, result: Dict) -> Dict:
+    workflow_result["steps"].append({"agent": agent, "result": result})
+    return {"type": "step", "agent": agent, "result": result}
+
+
+def stream_full_case_workflow(case_data: Dict, use_cache: bool = True) -> Iterator[Dict]:
     """
     Orchestrates the complete workflow:
     CaseTaker → Repertory → MateriaMedica → Differential → Prescription
+    Yields {"type": "step"} as each agent finishes, {"type": "item"} differential list items
+    while the LLM reply streams, and finally {"type": "final", "workflow_result": ...}.
+    An identical case replays the memoized steps and result unless use_cache=False;
+    a run of an identical case already in progress is joined and its events shared.
     """
+    memo = workflow_cache_for(use_cache, WORKFLOW_NAMESPACE)
+    if memo is not None:
+        key = memo.key(case_data)
+        cached = memo.get(key)
+        if cached is not None:
+            yield from replay(cached)
+            return
+    
+    def run():
+        for event in _stream_full_case_workflow(case_data):
+            if memo is not None and event["type"] == "final" and cacheable(event["workflow_result"]):
+                memo.put(key, event["workflow_result"])
+            yield event
+    
+    yield from _workflow_flights.stream(request_key(case_hash(case_data), use_cache), run)
+
+
+def _stream_full_case_workflow(case_data: Dict) -> Iterator[Dict]:
     workflow_result = {
         "steps": [],
         "final_result": None
@@ -246,40 +358,48 @@ def run_full_case_workflow(case_data: Dict) -> Dict:
     
     # Step 1: Case Taking
     case_result = agent_case_taker(case_data)
-    workflow_result["steps"].append({"agent": "CaseTaker", "result": case_result})
+    yield _step(workflow_result, "CaseTaker", case_result)
     
-    if case_result["status"] == "emergency":
+    if case_result["status"] in ("emergency", "incomplete"):
         workflow_result["final_result"] = case_result
-        return workflow_result
-    
-    if case_result["status"] == "incomplete":
-        workflow_result["final_result"] = case_result
-        return workflow_result
+        yield {"type": "final", "workflow_result": workflow_result}
+        return
     
     # Step 2: Repertorization
     repertory_result = agent_repertory(case_data)
-    workflow_result["steps"].append({"agent": "Repertory", "result": repertory_result})
+    yield _step(workflow_result, "Repertory", repertory_result)
     
     if not repertory_result.get("top_candidates"):
         workflow_result["final_result"] = {
             "status": "no_candidates",
             "message": "No matching remedies found. Please provide more detailed symptoms."
         }
-        return workflow_result
+        yield {"type": "final", "workflow_result": workflow_result}
+        return
     
     # Step 3: Materia Medica Search
     case_summary = f"{case_data.get('presenting_complaint', '')} {' '.join(case_data.get('mental_emotional', []))} {' '.join(case_data.get('generals', []))}"
     mm_result = agent_materia_medica(repertory_result["top_candidates"], case_summary)
-    workflow_result["steps"].append({"agent": "MateriaMedica", "result": mm_result})
+    yield _step(workflow_result, "MateriaMedica", mm_result)
     
-    # Step 4: Differential Analysis
-    differential_result = agent_differential(case_data, repertory_result["repertory"], mm_result["mm_context"])
-    workflow_result["steps"].append({"agent": "Differential", "result": differential_result})
+    # Step 4: Differential Analysis (streamed)
+    for event in agent_differential_stream(case_data, repertory_result["repertory"], mm_result["mm_context"]):
+        if event["type"] == "differential":
+            differential_result = event["result"]
+        else:
+            yield event
+    yield _step(workflow_result, "Differential", differential_result)
     
     # Step 5: Prescription
     prescription_result = agent_prescription(differential_result)
-    workflow_result["steps"].append({"agent": "Prescription", "result": prescription_result})
+    yield _step(workflow_result, "Prescription", prescription_result)
     
     workflow_result["final_result"] = prescription_result
-    
-    return workflow_result
+    yield {"type": "final", "workflow_result": workflow_result}
+
+
+def run_full_case_workflow(case_data: Dict, use_cache: bool = True) -> Dict:
+    """Complete workflow result (see stream_full_case_workflow)"""
+    for event in stream_full_case_workflow(case_data, use_cache):
+        if event["type"] == "final":
+            return event["workflow_result"]
@@ -0,0 +1,511 @@
+"""
+Async workflow orchestrator
+The one implementation of the full case workflow (orchestrator.run_full_case_workflow
+is a blocking wrapper over it). Independent stages run concurrently: after
+repertorization, the Materia Medica searches, the completeness analysis and the
+rule-based clinical recommendation are gathered together, so the workflow takes about
+as long as its slowest network call rather than the sum of all.
+"""
+import asyncio
+import atexit
+import queue
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from common.llm_cache import cache_for
+from common.singleflight import AsyncSingleFlight, request_key
+from common.streaming import STREAMED_FIELDS, IncrementalJSONParser
+from common.workflow_cache import cacheable, case_hash, replay, workflow_cache_for
+
+from .case_features import case_features
+from .clinical_engine import get_clinical_recommendation
+from .deadline import (MIN_LLM_BUDGET, MIN_MM_BUDGET, WORKFLOW_DEADLINE, bounded, budget_allows, current_deadline,
+                       deadline, failure_reason, stage_timeout)
+from .embeddings import search_async as mm_search_async
+from .intelligent_questioning import should_ask_more_questions
+from .openai_clients import get_async_client, get_provider
+from .rationale import FAST_PATH_CONFIDENCE, render_differential, use_fast_path
+from .remedy_profiles import load_keynote_index
+from .stages import StageRunner
+from .tracing import span, trace
+from .orchestrator import (
+    OPENAI_MODEL, OPENAI_HIGH_REASONING,
+    agent_case_taker, agent_repertory, agent_prescription, build_case_summary,
+    differential_request, finish_differential, lexical_materia_medica, mm_context_entry, template_differential,
+)
+
+# Identical concurrent LLM calls and workflow runs share one computation
+_llm_flights = AsyncSingleFlight("llm")
+_workflow_flights = AsyncSingleFlight("workflow")
+
+# Seconds each stage may take before it is abandoned
+STAGE_TIMEOUTS = {
+    "repertory": 20.0,
+    "materia_medica": 15.0,
+    "questioning": 10.0,
+    "clinical": 10.0,
+    "differential": 90.0,
+}
+
+
+async def async_call_llm(system_prompt: str, user_message: str, model: str = None, temperature: float = 0.3,
+                         use_cache: bool = True) -> str:
+    """Async form of orchestrator.call_llm, sharing its response cache and coalescing identical calls"""
+    model = model or OPENAI_MODEL
+    with span("llm.chat", model=model) as s:
+        llm_cache = cache_for(temperature, use_cache)
+        if llm_cache is not None:
+            key = llm_cache.key(model, temperature, system_prompt, user_message)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                s.set(cache="hit")
+                return cached
+        s.set(cache="miss" if llm_cache is not None else "bypass")
+
+        async def complete():
+            client = bounded(get_async_client())
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=temperature
+            )
+            return response.choices[0].message.content, response.usage
+
+        (content, usage), shared = await _llm_flights.do(
+            request_key(model, temperature, system_prompt, user_message), complete
+        )
+        if shared:
+            s.set(cache="shared")
+            return content
+        s.usage(usage)
+        if llm_cache is not None and content:
+            llm_cache.put(key, model, temperature, content)
+        return content
+
+
+async def _timed(name: str, awaitable, timeouts: Dict[str, float], timings: Dict[str, float]):
+    """Await a stage under its timeout (capped by the request deadline), recording wall time"""
+    start = time.perf_counter()
+    try:
+        with span(f"stage.{name}"):
+            return await asyncio.wait_for(awaitable, stage_timeout(timeouts.get(name)))
+    finally:
+        timings[name] = round(time.perf_counter() - start, 3)
+
+
+async def agent_materia_medica_async(candidates: List[Dict], case_summary: str) -> Dict:
+    """
+    MateriaMedicaAgent with the candidate searches issued concurrently
+    Falls back to lexical search when the request deadline is short or the searches time out.
+    """
+    if not budget_allows(MIN_MM_BUDGET):
+        return lexical_materia_medica(candidates, case_summary, "budget")
+
+    top = candidates[:3]  # Top 3 only
+    results = await asyncio.gather(
+        *(mm_search_async(f"{c.get('name', '')} {case_summary}", k=2) for c in top),
+        return_exceptions=True
+    )
+    if any(isinstance(found, Exception) and failure_reason(found) == "timeout" for found in results):
+        return lexical_materia_medica(candidates, case_summary, "timeout")
+
+    mm_context = []
+    failed = 0
+    for candidate, found in zip(top, results):
+        if isinstance(found, Exception):
+            failed += 1
+            continue
+        if found:
+            mm_context.append(mm_context_entry(candidate, found))
+
+    message = f"Retrieved Materia Medica context for {len(mm_context)} remedies."
+    if failed:
+        message += f" {failed} search(es) failed."
+    return {"status": "complete", "mm_context": mm_context, "failed_searches": failed, "message": message}
+
+
+async def async_stream_llm(system_prompt: str, user_message: str, model: str = None, temperature: float = 0.3,
+                           use_cache: bool = True) -> AsyncIterator[str]:
+    """Streaming form of async_call_llm: yields text deltas (a cached reply arrives in one piece)"""
+    model = model or OPENAI_MODEL
+    started = time.perf_counter()
+    with span("llm.chat", model=model, stream=True) as s:
+        llm_cache = cache_for(temperature, use_cache)
+        if llm_cache is not None:
+            key = llm_cache.key(model, temperature, system_prompt, user_message)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                s.set(cache="hit")
+                yield cached
+                return
+        s.set(cache="miss" if llm_cache is not None else "bypass")
+
+        client = bounded(get_async_client())
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parts = []
+        async for chunk in stream:
+            # The last chunk carries usage and no choices
+            s.usage(chunk.usage)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    s.set(first_token_ms=round((time.perf_counter() - started) * 1000, 2))
+                parts.append(delta)
+                yield delta
+        content = "".join(parts)
+        if llm_cache is not None and content:
+            llm_cache.put(key, model, temperature, content)
+
+
+async def agent_differential_stream(case_data: Dict, repertory_result: Dict, mm_context: List[Dict],
+                                    clinical_result: Dict, timeout: Optional[float] = None,
+                                    fast_path_confidence: float = FAST_PATH_CONFIDENCE) -> AsyncIterator[Dict]:
+    """
+    DifferentialAgent streaming over AsyncOpenAI. Yields list-item events
+    (rationale, monitoring, wellness_advice) as the reply is generated, then
+    {"type": "differential", "result": ...}. A high-confidence recommendation skips
+    the LLM; one whose enhancement would not fit the request deadline, fails or
+    times out falls back to the template rationale.
+    """
+    if use_fast_path(clinical_result, fast_path_confidence):
+        yield {"type": "differential", "result": render_differential(case_data, clinical_result)}
+        return
+
+    clinical_success = clinical_result.get('status') == 'success'
+    if clinical_success and not budget_allows(MIN_LLM_BUDGET):
+        yield {"type": "differential", "result": template_differential(case_data, clinical_result, "budget")}
+        return
+
+    request = differential_request(case_data, repertory_result, mm_context, clinical_result)
+    loop = asyncio.get_running_loop()
+    timeout = stage_timeout(timeout)
+    expires = loop.time() + timeout if timeout else None
+    parser = IncrementalJSONParser(STREAMED_FIELDS)
+    stream = async_stream_llm(request["system_prompt"], request["user_message"],
+                              model=OPENAI_HIGH_REASONING, temperature=request["temperature"])
+    try:
+        while True:
+            remaining = max(0.0, expires - loop.time()) if expires else None
+            try:
+                delta = await asyncio.wait_for(stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            for event in parser.feed(delta):
+                if event["type"] == "item":
+                    yield event
+    except Exception as e:
+        await stream.aclose()
+        if clinical_success:
+            yield {"type": "differential", "result": template_differential(case_data, clinical_result,
+                                                                           failure_reason(e))}
+            return
+        raise
+    result = finish_differential(clinical_result, parser.text, request.get("context"))
+    yield {"type": "differential", "result": result}
+
+
+async def agent_differential_async(case_data: Dict, repertory_result: Dict, mm_context: List[Dict],
+                                   clinical_result: Dict, timeout: Optional[float] = None,
+                                   fast_path_confidence: float = FAST_PATH_CONFIDENCE) -> Dict:
+    """DifferentialAgent over AsyncOpenAI; a timed-out enhancement falls back to the template rationale"""
+    async for event in agent_differential_stream(case_data, repertory_result, mm_context, clinical_result,
+                                                 timeout, fast_path_confidence):
+        if event["type"] == "differential":
+            return event["result"]
+
+
+def _needs_mm_context(clinical_result: Dict, repertory_result: Dict, mm_context: List[Dict]) -> bool:
+    """
+    The clinical engine only reads MM excerpts for candidates without a monograph.
+    True when such a candidate got excerpts, so the recommendation must be redone.
+    """
+    index = load_keynote_index()
+    with_context = {mm.get("remedy_id") for mm in mm_context}
+    return any(
+        c.get("remedy_id") not in index and c.get("remedy_id") in with_context
+        for c in repertory_result.get("candidates", [])[:5]
+    )
+
+
+def _step(workflow_result: Dict, agent: str, result: Dict) -> Dict:
+    workflow_result["steps"].append({"agent": agent, "result": result})
+    return {"type": "step", "agent": agent, "result": result}
+
+
+def _final(workflow_result: Dict, current, stages: StageRunner) -> Dict:
+    workflow_result["stages"] = stages.report()
+    budget = current_deadline()
+    if budget is not None:
+        budget.attach(workflow_result)
+    if current is not None:
+        workflow_result["trace"] = current.summary()
+    return {"type": "final", "workflow_result": workflow_result}
+
+
+async def stream_full_case_workflow(case_data: Dict, skip_questioning: bool = False,
+                                    timeouts: Optional[Dict[str, float]] = None,
+                                    use_cache: bool = True, deadline_s: Optional[float] = None) -> AsyncIterator[Dict]:
+    """
+    Orchestrates the complete workflow with concurrent independent stages:
+    CaseTaker → Repertory → (MateriaMedica ‖ Questioning ‖ Clinical) → Differential → Prescription
+    Yields {"type": "step"} as each agent finishes, {"type": "item"} differential list items
+    while the LLM reply streams, and finally {"type": "final", "workflow_result": ...}.
+    The trace summary (stage times, tokens, cache hits) is attached as "trace".
+    An identical case replays the memoized steps and result unless use_cache=False;
+    an edited case reuses the stages whose inputs did not change (reported under "stages").
+    Stage timeouts are capped by the run's deadline (`deadline_s`, default WORKFLOW_DEADLINE);
+    fallbacks taken to stay within it are listed under "degradations".
+    A run of an identical case already in progress is joined: its events so far are
+    replayed, then shared as they are produced.
+    """
+    memo = workflow_cache_for(use_cache)
+    if memo is not None:
+        key = memo.key(case_data, skip_questioning=skip_questioning)
+        cached = await asyncio.to_thread(memo.get, key)
+        if cached is not None:
+            for event in replay(cached):
+                yield event
+            return
+
+    async def run():
+        async for event in _stream_full_case_workflow(case_data, skip_questioning, timeouts, use_cache, deadline_s):
+            if memo is not None and event["type"] == "final" and cacheable(event["workflow_result"]):
+                await asyncio.to_thread(memo.put, key, event["workflow_result"])
+            yield event
+
+    # Only runs under the same budget and stage timeouts are shared
+    flight_key = request_key(case_hash(case_data), skip_questioning, use_cache,
+                             float(WORKFLOW_DEADLINE if deadline_s is None else deadline_s), timeouts or {})
+    async for event in _workflow_flights.stream(flight_key, run):
+        yield event
+
+
+async def _stream_full_case_workflow(case_data: Dict, skip_questioning: bool,
+                                     timeouts: Optional[Dict[str, float]], use_cache: bool,
+                                     deadline_s: Optional[float]) -> AsyncIterator[Dict]:
+    with deadline(deadline_s), trace("workflow") as current:
+        timeouts = dict(STAGE_TIMEOUTS, **(timeouts or {}))
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
+        # Normalize once; every stage reads the same features
+        case_data = case_features(case_data)
+        stages = StageRunner(case_data, use_cache)
+        workflow_result = {
+            "steps": [],
+            "final_result": None,
+            "timings": timings
+        }
+
+        # Step 1: Case Taking
+        with span("stage.case_taker"):
+            case_result = stages.run("case_taker", agent_case_taker, case_data)
+        yield _step(workflow_result, "CaseTaker", case_result)
+
+        if case_result["status"] in ("emergency", "incomplete"):
+            workflow_result["final_result"] = case_result
+            yield _final(workflow_result, current, stages)
+            return
+
+        # Step 2: Repertorization (may embed unmatched phrases, so off the event loop)
+        repertory_result = await stages.run_async("repertory", lambda: _timed(
+            "repertory", asyncio.to_thread(agent_repertory, case_data), timeouts, timings))
+        yield _step(workflow_result, "Repertory", repertory_result)
+
+        if not repertory_result.get("top_candidates"):
+            workflow_result["final_result"] = {
+                "status": "no_candidates",
+                "message": "No matching remedies found. Please provide more detailed symptoms."
+            }
+            yield _final(workflow_result, current, stages)
+            return
+
+        top_remedy_names = [r['name'] for r in repertory_result["top_candidates"][:3]]
+
+        # Steps 3-5 inputs: independent of each other
+        async def questioning():
+            if skip_questioning:
+                return None
+            return await stages.run_async("questioning", lambda: asyncio.to_thread(
+                should_ask_more_questions, case_data, 0.5, top_remedy_names))
+
+        mm_result, question_result, clinical_result = await asyncio.gather(
+            stages.run_async("materia_medica", lambda: _timed(
+                "materia_medica", agent_materia_medica_async(repertory_result["top_candidates"],
+                                                             build_case_summary(case_data)), timeouts, timings)),
+            _timed("questioning", questioning(), timeouts, timings),
+            stages.run_async("clinical", lambda: _timed(
+                "clinical", asyncio.to_thread(get_clinical_recommendation, case_data,
+                                              repertory_result["repertory"], []), timeouts, timings),
+                params={"mm_context": []}),
+            return_exceptions=True
+        )
+
+        if isinstance(mm_result, Exception) and failure_reason(mm_result) == "timeout":
+            mm_result = lexical_materia_medica(repertory_result["top_candidates"], build_case_summary(case_data),
+                                               "timeout")
+        elif isinstance(mm_result, Exception):
+            mm_result = {
+                "status": "timeout" if isinstance(mm_result, asyncio.TimeoutError) else "error",
+                "mm_context": [],
+                "message": "Materia Medica search unavailable; continuing without excerpts."
+            }
+        yield _step(workflow_result, "MateriaMedica", mm_result)
+
+        if isinstance(clinical_result, Exception):
+            raise clinical_result
+        if _needs_mm_context(clinical_result, repertory_result["repertory"], mm_result["mm_context"]):
+            clinical_result = stages.run("clinical", get_clinical_recommendation, case_data,
+                                         repertory_result["repertory"], mm_result["mm_context"],
+                                         params={"mm_context": mm_result["mm_context"]})
+
+        # Step 4: Check if more questions needed before differential
+        if question_result is not None and not isinstance(question_result, Exception):
+            should_ask, question_analysis = question_result
+            if should_ask and question_analysis['completeness_score'] < 0.6:
+                workflow_result["final_result"] = {
+                    "status": "needs_more_information",
+                    "message": question_analysis['reason'],
+                    "completeness_score": question_analysis['completeness_score'],
+                    "questions_to_ask": question_analysis['questions_to_ask'],
+                    "estimated_questions": question_analysis['estimated_questions_needed']
+                }
+                yield _step(workflow_result, "IntelligentQuestioner", {
+                    "status": "questions_required",
+                    "message": f"Need {question_analysis['estimated_questions_needed']} clarifying questions"
+                })
+                yield _final(workflow_result, current, stages)
+                return
+
+        # Step 5: Differential Analysis
+        differential_start = time.perf_counter()
+        with span("stage.differential"):
+            differential_result = stages.cached("differential")
+            if differential_result is None:
+                async for event in agent_differential_stream(
+                    case_data, repertory_result["repertory"], mm_result["mm_context"], clinical_result,
+                    timeout=timeouts.get("differential")
+                ):
+                    if event["type"] == "differential":
+                        differential_result = stages.store("differential", event["result"])
+                    else:
+                        yield event
+        timings["differential"] = round(time.perf_counter() - differential_start, 3)
+        yield _step(workflow_result, "Differential", differential_result)
+
+        # Step 6: Check if questions needed after differential
+        if not skip_questioning and differential_result.get("remedy"):
+            confidence = differential_result.get("clinical_confidence", differential_result.get("confidence", 0.5))
+            should_ask_post, post_question_analysis = should_ask_more_questions(
+                case_data,
+                confidence=confidence,
+                top_remedies=top_remedy_names
+            )
+
+            if should_ask_post and confidence < 0.7:
+                differential_result["needs_clarification"] = True
+                differential_result["clarification_questions"] = [
+                    q['question'] for q in post_question_analysis['questions_to_ask'][:5]
+                ]
+                differential_result["clarification_reason"] = post_question_analysis['reason']
+
+        # Step 7: Prescription
+        with span("stage.prescription"):
+            prescription_result = stages.run("prescription", agent_prescription, differential_result,
+                                             params={"clarification": differential_result.get("clarification_questions")})
+        yield _step(workflow_result, "Prescription", prescription_result)
+
+        workflow_result["final_result"] = prescription_result
+        timings["total"] = round(time.perf_counter() - start, 3)
+        yield _final(workflow_result, current, stages)
+
+
+async def run_full_case_workflow_async(case_data: Dict, skip_questioning: bool = False,
+                                       timeouts: Optional[Dict[str, float]] = None,
+                                       use_cache: bool = True, deadline_s: Optional[float] = None) -> Dict:
+    """Complete workflow result (see stream_full_case_workflow)"""
+    async for event in stream_full_case_workflow(case_data, skip_questioning, timeouts, use_cache, deadline_s):
+        if event["type"] == "final":
+            return event["workflow_result"]
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived event loop in a daemon thread, so pooled async connections stay warm across runs"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="workflow-loop", daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+@atexit.register
+def close_background_loop():
+    """Close the background loop's pooled async connections, then stop the loop"""
+    global _loop
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(get_provider().aclose(), loop).result(timeout=5)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def run_full_case_workflow_sync(case_data: Dict, skip_questioning: bool = False,
+                                timeouts: Optional[Dict[str, float]] = None,
+                                use_cache: bool = True, deadline_s: Optional[float] = None) -> Dict:
+    """
+    Blocking entry point for Streamlit and other sync callers. Runs the async
+    workflow on the shared background event loop and waits for the result.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        run_full_case_workflow_async(case_data, skip_questioning, timeouts, use_cache, deadline_s), _background_loop()
+    )
+    return future.result()
+
+
+def stream_full_case_workflow_sync(case_data: Dict, skip_questioning: bool = False,
+                                   timeouts: Optional[Dict[str, float]] = None,
+                                   use_cache: bool = True, deadline_s: Optional[float] = None) -> Iterator[Dict]:
+    """
+    Blocking iterator over stream_full_case_workflow events, for Streamlit. The
+    generator is driven by one task on the background loop (so the workflow's trace
+    context holds across events) and hands events over through a queue.
+    """
+    events: "queue.Queue" = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for event in stream_full_case_workflow(case_data, skip_questioning, timeouts, use_cache, deadline_s):
+                events.put(event)
+        finally:
+            events.put(done)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _background_loop())
+    while True:
+        event = events.get()
+        if event is done:
+            future.result()  # re-raise a workflow error
+            return
+        yield event
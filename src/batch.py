@@ -0,0 +1,205 @@
+"""
+Batch runs over archived cases
+Streams cases from a JSONL file (one case per line, either the case itself or
+{"case_id": ..., "case_data": {...}}) through the workflow on a bounded thread pool,
+and appends one JSON line per case to the output as it finishes. Finished case ids
+go to a checkpoint file, so rerunning the same command after a crash resumes where
+it stopped; failed or degraded cases (LLM errors, timeouts, deadline fallbacks) are
+written with their error and retried on resume. Case starts are paced by a shared
+rate limiter to stay under the API rate limit.
+
+    python -m src.batch cases.jsonl --output results.jsonl --workers 8 --rate 120
+    python -m src.batch cases.jsonl --output audit.jsonl --mode offline --workers 4
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from common.workflow_cache import cacheable, case_hash
+
+from .clinical_engine import get_clinical_recommendation
+from .orchestrator import agent_case_taker, agent_prescription, agent_repertory, run_full_case_workflow
+from .rationale import render_differential
+
+# Cases queued per worker ahead of the pool, so input is read as it is consumed
+QUEUE_PER_WORKER = 2
+
+
+class RateLimiter:
+    """Spaces acquisitions evenly at `per_minute` across threads (0 = unlimited)"""
+
+    def __init__(self, per_minute: float = 0):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def read_cases(path: str) -> Iterator[Tuple[str, Dict]]:
+    """(case id, case data) per non-empty line; ids default to the canonical case hash"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            case_data = record.get("case_data", record)
+            case_id = record.get("case_id") or record.get("id") or case_hash(case_data)[:16]
+            yield str(case_id), case_data
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def run_offline(case_data: Dict) -> Dict:
+    """
+    The workflow without LLM or embeddings calls: case taking, repertory and the
+    clinical engine, written up with the template rationale
+    """
+    workflow_result = {"steps": [], "final_result": None}
+    case_result = agent_case_taker(case_data)
+    workflow_result["steps"].append({"agent": "CaseTaker", "result": case_result})
+    if case_result["status"] in ("emergency", "incomplete"):
+        workflow_result["final_result"] = case_result
+        return workflow_result
+
+    repertory_result = agent_repertory(case_data)
+    workflow_result["steps"].append({"agent": "Repertory", "result": repertory_result})
+    clinical_result = get_clinical_recommendation(case_data, repertory_result["repertory"], [])
+    if clinical_result.get("status") != "success":
+        workflow_result["final_result"] = {"status": clinical_result.get("status"),
+                                           "message": clinical_result.get("message"),
+                                           "top_candidates": repertory_result["top_candidates"]}
+        return workflow_result
+
+    differential_result = render_differential(case_data, clinical_result)
+    workflow_result["steps"].append({"agent": "Differential", "result": differential_result})
+    prescription_result = agent_prescription(differential_result)
+    workflow_result["steps"].append({"agent": "Prescription", "result": prescription_result})
+    workflow_result["final_result"] = prescription_result
+    return workflow_result
+
+
+class BatchRunner:
+    """
+    Runs cases on `workers` threads and appends results to `output` as they finish.
+    Cases already listed in the checkpoint are skipped.
+    """
+
+    def __init__(self, output: str, checkpoint: Optional[str] = None, workers: int = 4,
+                 rate: float = 0, mode: str = "full", use_cache: bool = True,
+                 skip_questioning: bool = True, deadline_s: Optional[float] = None):
+        self.output = output
+        self.checkpoint = checkpoint or f"{output}.checkpoint"
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(rate)
+        self.mode = mode
+        self.use_cache = use_cache
+        self.skip_questioning = skip_questioning
+        self.deadline_s = deadline_s
+        self.counts = {"done": 0, "errors": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def run_case(self, case_data: Dict) -> Dict:
+        if self.mode == "offline":
+            return run_offline(case_data)
+        return run_full_case_workflow(case_data, skip_questioning=self.skip_questioning,
+                                      use_cache=self.use_cache, deadline_s=self.deadline_s)
+
+    def _process(self, case_id: str, case_data: Dict) -> Tuple[Dict, bool]:
+        self.limiter.acquire()
+        start = time.perf_counter()
+        try:
+            result = self.run_case(case_data)
+            ok = cacheable(result)
+            record = {"case_id": case_id, "status": "ok", "result": result}
+            if not ok:
+                # LLM errors, timeouts and deadline fallbacks are kept for inspection but retried on resume
+                record.update(status="error", error="degraded result")
+        except Exception as e:
+            record = {"case_id": case_id, "status": "error", "error": f"{type(e).__name__}: {e}"}
+            ok = False
+        record["elapsed_s"] = round(time.perf_counter() - start, 3)
+        return record, ok
+
+    def _write(self, out, done, record: Dict, ok: bool):
+        """Append the result, then checkpoint it (a crash in between only repeats this case)"""
+        with self._lock:
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            if ok:
+                done.write(record["case_id"] + "\n")
+                done.flush()
+                self.counts["done"] += 1
+            else:
+                self.counts["errors"] += 1
+
+    def run(self, cases: Iterator[Tuple[str, Dict]]) -> Dict:
+        finished = load_checkpoint(self.checkpoint)
+        os.makedirs(os.path.dirname(os.path.abspath(self.output)), exist_ok=True)
+        start = time.perf_counter()
+        with open(self.output, "a", encoding="utf-8") as out, \
+                open(self.checkpoint, "a", encoding="utf-8") as done, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as pool:
+            pending = set()
+            for case_id, case_data in cases:
+                if case_id in finished:
+                    self.counts["skipped"] += 1
+                    continue
+                finished.add(case_id)  # duplicate ids in the input run once
+                pending.add(pool.submit(self._process, case_id, case_data))
+                if len(pending) >= self.workers * QUEUE_PER_WORKER:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        self._write(out, done, *future.result())
+            for future in wait(pending).done:
+                self._write(out, done, *future.result())
+        elapsed = time.perf_counter() - start
+        processed = self.counts["done"] + self.counts["errors"]
+        return dict(self.counts, elapsed_s=round(elapsed, 2),
+                    cases_per_min=round(processed / elapsed * 60, 1) if elapsed else 0.0)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the workflow over a JSONL file of cases")
+    parser.add_argument("cases", help="input JSONL, one case per line")
+    parser.add_argument("--output", required=True, help="results JSONL (appended to)")
+    parser.add_argument("--checkpoint", help="finished case ids (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0, help="case starts per minute (0 = unlimited)")
+    parser.add_argument("--mode", choices=["full", "offline"], default="full",
+                        help="offline: repertory and clinical engine only, no API calls")
+    parser.add_argument("--deadline", type=float, default=None, help="seconds per case (default WORKFLOW_DEADLINE)")
+    parser.add_argument("--questioning", action="store_true", help="stop for clarifying questions")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the workflow and stage caches")
+    args = parser.parse_args(argv)
+
+    runner = BatchRunner(args.output, args.checkpoint, args.workers, args.rate, args.mode,
+                         use_cache=not args.no_cache, skip_questioning=not args.questioning,
+                         deadline_s=args.deadline)
+    summary = runner.run(read_cases(args.cases))
+    print(f"Processed {summary['done'] + summary['errors']} cases ({summary['errors']} failed, "
+          f"{summary['skipped']} already done) in {summary['elapsed_s']:.1f}s · "
+          f"{summary['cases_per_min']:.1f} cases/min")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+"""
+Canonical case features
+A case is normalized once per revision into a CaseFeatures object: normalized fields,
+one lowercase text buffer with per-field spans, normalized tokens and a content hash.
+Every pipeline stage reads these instead of re-stringifying the raw case dict.
+"""
+import hashlib
+import json
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Tuple
+
+from common.normalize import normalize_text
+
+from .utils import LRUCache, as_list
+
+TEXT_FIELDS = ("presenting_complaint", "onset", "duration", "course", "etiology", "thermal")
+LIST_FIELDS = (
+    "mental_emotional", "generals", "cravings", "aversions", "sleep", "dreams",
+    "past_history", "family_history", "lifestyle", "red_flags",
+)
+PARTICULAR_LIST_FIELDS = ("modalities_better", "modalities_worse", "concomitants")
+
+# Feature objects kept per content hash, so re-submitting a case reuses them
+FEATURE_CACHE_SIZE = 256
+_feature_cache = LRUCache(FEATURE_CACHE_SIZE)
+
+
+def _clean(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def normalize_case(case_data: Mapping) -> Dict[str, Any]:
+    """
+    Canonical case dict: text fields as stripped strings, list fields as lists of
+    non-empty strings (a single string becomes a one-item list), particulars with
+    list-valued modalities. Unknown keys are kept unchanged.
+    """
+    case = {k: v for k, v in case_data.items() if k not in TEXT_FIELDS + LIST_FIELDS + ("particulars",)}
+    for field in TEXT_FIELDS:
+        case[field] = _clean(case_data.get(field))
+    for field in LIST_FIELDS:
+        case[field] = [_clean(v) for v in as_list(case_data.get(field)) if _clean(v)]
+
+    particulars = []
+    for p in case_data.get("particulars") or []:
+        if not isinstance(p, Mapping):
+            p = {"description": p}
+        particular = dict(p, section=_clean(p.get("section")), description=_clean(p.get("description")))
+        for field in PARTICULAR_LIST_FIELDS:
+            particular[field] = [_clean(v) for v in as_list(p.get(field)) if _clean(v)]
+        particulars.append(particular)
+    case["particulars"] = particulars
+    return case
+
+
+def _other_strings(value) -> Iterator[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, Mapping):
+        for v in value.values():
+            yield from _other_strings(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _other_strings(v)
+    elif value is not None:
+        yield str(value)
+
+
+class CaseFeatures(Mapping):
+    """
+    Read-only view of a normalized case. Behaves like the case dict (`features.get(...)`)
+    and adds the derived text, spans, tokens and hash. Stages may memoize their own
+    case-level results on it with `cached()`.
+    """
+
+    def __init__(self, case: Dict[str, Any], content_hash: str):
+        self._case = case
+        self.content_hash = content_hash
+        self._memo: Dict[str, Any] = {}
+
+        parts: List[str] = []
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        field_tokens: Dict[str, List[str]] = {}
+        offset = 0
+        for field, text in self._items():
+            lower = text.lower()
+            spans.setdefault(field, []).append((offset, offset + len(lower)))
+            field_tokens.setdefault(field, []).extend(normalize_text(lower))
+            parts.append(lower)
+            offset += len(lower) + 1
+
+        self.text: str = "\n".join(parts)
+        self.spans = spans
+        self.field_tokens: Dict[str, FrozenSet[str]] = {f: frozenset(t) for f, t in field_tokens.items()}
+        self.tokens: List[str] = [t for f in field_tokens for t in field_tokens[f]]
+        self.token_set: FrozenSet[str] = frozenset(self.tokens)
+
+    def _items(self) -> Iterator[Tuple[str, str]]:
+        """(field, text) for every non-empty value, in a fixed field order"""
+        case = self._case
+        for field in TEXT_FIELDS:
+            if case[field]:
+                yield field, case[field]
+        for field in LIST_FIELDS:
+            for value in case[field]:
+                yield field, value
+        for p in case["particulars"]:
+            if p["description"]:
+                yield "particulars.description", p["description"]
+            for field in PARTICULAR_LIST_FIELDS:
+                for value in p[field]:
+                    yield f"particulars.{field}", value
+        for key, value in case.items():
+            if key not in TEXT_FIELDS + LIST_FIELDS + ("particulars",):
+                for text in _other_strings(value):
+                    if text.strip():
+                        yield key, text
+
+    # Mapping interface over the normalized case
+    def __getitem__(self, key):
+        return self._case[key]
+
+    def __iter__(self):
+        return iter(self._case)
+
+    def __len__(self):
+        return len(self._case)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain (JSON-serializable) normalized case"""
+        return json.loads(json.dumps(self._case, ensure_ascii=False, default=str))
+
+    def field_text(self, field: str) -> str:
+        """Lowercase text of one field (items joined by newlines), sliced from the buffer"""
+        return "\n".join(self.text[start:end] for start, end in self.spans.get(field, []))
+
+    def count(self, field: str) -> int:
+        """Number of non-empty items recorded for a field"""
+        return len(self.spans.get(field, []))
+
+    def contains(self, phrase: str) -> bool:
+        """Substring test against the lowercase buffer"""
+        return phrase.lower() in self.text
+
+    def cached(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Memoize a stage's case-level result for this revision"""
+        if key not in self._memo:
+            self._memo[key] = factory()
+        return self._memo[key]
+
+
+def case_hash(case: Mapping) -> str:
+    """Content hash of a normalized case (key order and list/str form do not matter)"""
+    payload = json.dumps(case, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def case_features(case_data) -> CaseFeatures:
+    """Features for a case dict (or pass an existing CaseFeatures through)"""
+    if isinstance(case_data, CaseFeatures):
+        return case_data
+    case = normalize_case(case_data or {})
+    digest = case_hash(case)
+    features = _feature_cache.get(digest)
+    if features is None:
+        features = CaseFeatures(case, digest)
+        _feature_cache.put(digest, features)
+    return features
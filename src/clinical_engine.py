@@ -3,10 +3,25 @@ Advanced Clinical Homeopathy Engine
 Based on classical methodology with modern AI enhancement
 """
 import os
-from typing import Dict, List, Tuple, Optional
+import threading
+from typing import Dict, FrozenSet, List, Tuple, Optional
 from collections import defaultdict
 import json
 
+import numpy as np
+
+from common.normalize import normalize_phrase
+
+from .remedies import get_registry
+from .remedy_profiles import (
+    KeynoteIndex, RemedyProfile, RemedyMatrix, as_profile, load_keynote_index, load_remedy_matrix
+)
+from .modalities import case_modality_bits, modality_score, modality_scores
+from .miasms import MIASMS, get_miasm_classifier
+from .timeline import TimelineStore
+from .case_features import case_features
+from .utils import as_list
+
 class ClinicalScoringEngine:
     """
     Advanced scoring system based on Boenninghausen's methodology
@@ -20,29 +35,61 @@ class ClinicalScoringEngine:
     MODALITY_WEIGHT = 5            # Better/worse factors
     CAUSATION_WEIGHT = 8           # Etiology/causation
     CONCOMITANT_WEIGHT = 4         # Accompanying symptoms
+    CONSTITUTION_WEIGHT = 6        # Constitutional match
+    MIASM_WEIGHT = 4               # Miasmatic layer
     
-    # Miasmatic influences
-    MIASMS = {
-        'psora': ['itching', 'suppression', 'functional', 'deficiency'],
-        'sycosis': ['overgrowth', 'warts', 'tumors', 'excess'],
-        'syphilis': ['destruction', 'ulceration', 'deformity', 'night aggravation'],
-        'tubercular': ['weakness', 'emaciation', 'restlessness', 'changing symptoms']
+    # Miasmatic influences (compiled with extended lexicons in miasms.py)
+    MIASMS = MIASMS
+    
+    # Strong causation indicators
+    CAUSATION_KEYWORDS = {
+        'grief': ['grief', 'loss', 'disappointment', 'bereavement'],
+        'anger': ['anger', 'indignation', 'rage', 'suppressed anger'],
+        'fright': ['fright', 'shock', 'fear', 'trauma'],
+        'cold': ['cold', 'exposure', 'draft', 'chill'],
+        'injury': ['injury', 'trauma', 'accident', 'fall']
     }
     
-    def __init__(self):
+    # General symptom fields and the credit a match earns
+    GENERAL_FIELDS = (('cravings', 1.0), ('aversions', 1.0), ('sleep', 0.5))
+    
+    # Item need that can never be met (empty phrases)
+    _NEVER = 10 ** 9
+    
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
         self.remedy_scores = defaultdict(float)
         self.remedy_evidence = defaultdict(list)
         self.constitutional_markers = {}
-        self.miasmatic_indicators = defaultdict(int)
+        # Per-category overrides of the Kent weights (used by the tuning harness)
+        self.weights = dict(weights or {})
     
-    def calculate_totality_score(self, case_data: Dict, remedy_data: Dict) -> float:
+    def category_weights(self) -> Dict[str, float]:
+        """Kent-hierarchy weight of each subscore"""
+        weights = {
+            'mental': self.MENTAL_EMOTIONAL_WEIGHT,
+            'generals': self.GENERAL_SYMPTOMS_WEIGHT,
+            'causation': self.CAUSATION_WEIGHT,
+            'modalities': self.MODALITY_WEIGHT,
+            'particulars': self.PARTICULAR_SYMPTOMS_WEIGHT,
+            'constitution': self.CONSTITUTION_WEIGHT,
+            'miasm': self.MIASM_WEIGHT,
+        }
+        weights.update((k, v) for k, v in self.weights.items() if k in weights)
+        return weights
+    
+    def calculate_totality_score(self, case_data: Dict, remedy_data) -> float:
         """
         Calculate comprehensive totality score based on:
         1. Kent's hierarchy of symptoms
         2. Boenninghausen's characteristic symptoms
         3. Constitutional match
         4. Miasmatic layer
+        
+        remedy_data is a RemedyProfile (preferred) or a legacy remedy dict.
         """
+        case_data = case_features(case_data)
+        remedy_data = as_profile(remedy_data)
+        weights = self.category_weights()
         total_score = 0.0
         
         # 1. Mental/Emotional Symptoms (Highest Weight)
@@ -50,152 +97,178 @@ class ClinicalScoringEngine:
             case_data.get('mental_emotional', []),
             remedy_data
         )
-        total_score += mental_score * self.MENTAL_EMOTIONAL_WEIGHT
+        total_score += mental_score * weights['mental']
         
         # 2. General Symptoms
         general_score = self._score_generals(case_data, remedy_data)
-        total_score += general_score * self.GENERAL_SYMPTOMS_WEIGHT
+        total_score += general_score * weights['generals']
         
         # 3. Causation/Etiology
         causation_score = self._score_causation(
             case_data.get('etiology', ''),
             remedy_data
         )
-        total_score += causation_score * self.CAUSATION_WEIGHT
+        total_score += causation_score * weights['causation']
         
         # 4. Modalities
         modality_score = self._score_modalities(case_data, remedy_data)
-        total_score += modality_score * self.MODALITY_WEIGHT
+        total_score += modality_score * weights['modalities']
         
         # 5. Particulars (Lower weight)
         particular_score = self._score_particulars(
             case_data.get('particulars', []),
             remedy_data
         )
-        total_score += particular_score * self.PARTICULAR_SYMPTOMS_WEIGHT
+        total_score += particular_score * weights['particulars']
         
         # 6. Constitutional Match
         constitutional_score = self._score_constitution(case_data, remedy_data)
-        total_score += constitutional_score * 6
+        total_score += constitutional_score * weights['constitution']
         
         # 7. Miasmatic Layer
         miasmatic_score = self._assess_miasm(case_data, remedy_data)
-        total_score += miasmatic_score * 4
+        total_score += miasmatic_score * weights['miasm']
         
         return total_score
     
-    def _score_mental_symptoms(self, mental_symptoms: List[str], remedy_data: Dict) -> float:
+    def score_all(self, case_data: Dict, matrix: RemedyMatrix = None) -> List[Dict]:
+        """
+        Totality table for every remedy at once.
+        
+        Case symptoms are encoded as a (case item x token) matrix and multiplied
+        against the compiled (remedy x token) matrix, so each Kent subscore is
+        computed for all remedies in one product. Returns rows sorted by total.
+        """
+        matrix = matrix if matrix is not None else load_remedy_matrix()
+        n = len(matrix)
+        if n == 0:
+            return []
+        
+        items = self._kent_items(case_data)
+        all_items = [item for category in items.values() for item in category]
+        subscores = {}
+        
+        if all_items:
+            query = matrix.encode([form for form, _, _ in all_items])
+            need = np.array([need for _, need, _ in all_items], dtype=np.float32)
+            credit = np.array([credit for _, _, credit in all_items], dtype=np.float32)
+            hits = ((query @ matrix.matrix.T) >= need[:, None]) * credit[:, None]
+        
+        row = 0
+        for category, category_items in items.items():
+            if not category_items:
+                subscores[category] = np.zeros(n, dtype=np.float32)
+                continue
+            block = hits[row:row + len(category_items)]
+            row += len(category_items)
+            if category == 'causation':
+                subscores[category] = block.max(axis=0)
+            else:
+                subscores[category] = block.sum(axis=0) / len(category_items)
+        
+        subscores['modalities'] = modality_scores(case_modality_bits(case_data), matrix.modality_bits)
+        subscores['constitution'] = np.full(n, 0.5, dtype=np.float32)
+        classifier = get_miasm_classifier()
+        subscores['miasm'] = classifier.scores(classifier.classify(case_data), matrix.miasm_affinity)
+        
+        weights = self.category_weights()
+        total = sum(subscores[c] * w for c, w in weights.items())
+        
+        order = np.argsort(-total, kind='stable')
+        return [
+            {
+                'remedy_id': matrix.remedy_ids[i],
+                'name': matrix.profiles[i].name,
+                'totality': round(float(total[i]), 3),
+                'subscores': {c: round(float(subscores[c][i]), 3) for c in weights},
+            }
+            for i in order
+        ]
+    
+    def _kent_items(self, case_data: Dict) -> Dict[str, List[Tuple[FrozenSet[str], int, float]]]:
+        """_case_items memoized on the case features"""
+        case = case_features(case_data)
+        return case.cached('kent_items', lambda: self._case_items(case))
+    
+    def _phrase_item(self, text: str, credit: float = 1.0) -> Tuple[FrozenSet[str], int, float]:
+        """Case item matched when every token of the phrase is in the remedy"""
+        form = normalize_phrase(str(text or ''))
+        return form, (len(form) or self._NEVER), credit
+    
+    def _case_items(self, case_data: Dict) -> Dict[str, List[Tuple[FrozenSet[str], int, float]]]:
+        """
+        Case symptoms as (token set, tokens needed, credit) items per Kent category.
+        Shared by the single-remedy scorers and the all-remedy matrix product.
+        """
+        items = {'mental': [], 'generals': [], 'particulars': [], 'causation': []}
+        
+        for symptom in as_list(case_data.get('mental_emotional')):
+            # Any significant keyword of a mental symptom counts
+            keywords = frozenset(k for k in normalize_phrase(symptom) if len(k) > 3)
+            items['mental'].append((keywords, 1, 1.0))
+        
+        if case_data.get('thermal'):
+            items['generals'].append(self._phrase_item(case_data['thermal']))
+        for field, credit in self.GENERAL_FIELDS:
+            for value in as_list(case_data.get(field)):
+                items['generals'].append(self._phrase_item(value, credit))
+        
+        for particular in case_data.get('particulars', []) or []:
+            items['particulars'].append(self._phrase_item(particular.get('description', '')))
+        
+        etiology = normalize_phrase(str(case_data.get('etiology') or ''))
+        if etiology:
+            for cause_type, keywords in self.CAUSATION_KEYWORDS.items():
+                forms = [normalize_phrase(kw) for kw in keywords]
+                if any(form and form <= etiology for form in forms):
+                    items['causation'].extend((form, len(form), 1.0) for form in forms if form)
+        
+        return items
+    
+    @staticmethod
+    def _item_hits(items: List[Tuple[FrozenSet[str], int, float]], remedy_tokens: FrozenSet[str]) -> List[float]:
+        return [credit if len(form & remedy_tokens) >= need else 0.0 for form, need, credit in items]
+    
+    def _score_mental_symptoms(self, mental_symptoms: List[str], remedy_data: RemedyProfile) -> float:
         """Score mental/emotional symptoms - highest priority"""
-        if not mental_symptoms:
+        items = self._case_items({'mental_emotional': mental_symptoms})['mental']
+        if not items:
             return 0.0
-        
-        remedy_text = str(remedy_data).lower()
-        matches = 0
-        total = len(mental_symptoms)
-        
-        for symptom in mental_symptoms:
-            symptom_lower = symptom.lower()
-            # Check for keyword matches
-            keywords = symptom_lower.split()
-            if any(keyword in remedy_text for keyword in keywords if len(keyword) > 3):
-                matches += 1
-        
-        return matches / total if total > 0 else 0.0
+        return sum(self._item_hits(items, remedy_data.tokens)) / len(items)
     
-    def _score_generals(self, case_data: Dict, remedy_data: Dict) -> float:
+    def _score_generals(self, case_data: Dict, remedy_data: RemedyProfile) -> float:
         """Score general symptoms (thermal, cravings, aversions, sleep)"""
-        score = 0.0
-        count = 0
-        
-        remedy_text = str(remedy_data).lower()
-        
-        # Thermal state
-        thermal = case_data.get('thermal', '').lower()
-        if thermal and thermal in remedy_text:
-            score += 1.0
-            count += 1
-        
-        # Cravings
-        for craving in case_data.get('cravings', []):
-            if craving.lower() in remedy_text:
-                score += 1.0
-            count += 1
-        
-        # Aversions
-        for aversion in case_data.get('aversions', []):
-            if aversion.lower() in remedy_text:
-                score += 1.0
-            count += 1
-        
-        # Sleep
-        for sleep_symptom in case_data.get('sleep', []):
-            if sleep_symptom.lower() in remedy_text:
-                score += 0.5
-            count += 1
-        
-        return score / count if count > 0 else 0.0
-    
-    def _score_causation(self, etiology: str, remedy_data: Dict) -> float:
-        """Score causation/etiology - very important"""
-        if not etiology:
+        items = self._kent_items(case_data)['generals']
+        if not items:
             return 0.0
-        
-        remedy_text = str(remedy_data).lower()
-        etiology_lower = etiology.lower()
-        
-        # Strong causation indicators
-        causation_keywords = {
-            'grief': ['grief', 'loss', 'disappointment', 'bereavement'],
-            'anger': ['anger', 'indignation', 'rage', 'suppressed anger'],
-            'fright': ['fright', 'shock', 'fear', 'trauma'],
-            'cold': ['cold', 'exposure', 'draft', 'chill'],
-            'injury': ['injury', 'trauma', 'accident', 'fall']
-        }
-        
-        for cause_type, keywords in causation_keywords.items():
-            if any(kw in etiology_lower for kw in keywords):
-                if any(kw in remedy_text for kw in keywords):
-                    return 1.0
-        
-        return 0.0
+        return sum(self._item_hits(items, remedy_data.tokens)) / len(items)
     
-    def _score_modalities(self, case_data: Dict, remedy_data: Dict) -> float:
-        """Score modalities (better/worse conditions)"""
-        # This would need more sophisticated parsing
-        # For now, basic implementation
-        return 0.5
+    def _score_causation(self, etiology: str, remedy_data: RemedyProfile) -> float:
+        """Score causation/etiology - very important"""
+        items = self._case_items({'etiology': etiology})['causation']
+        return max(self._item_hits(items, remedy_data.tokens), default=0.0)
+    
+    def _score_modalities(self, case_data: Dict, remedy_data: RemedyProfile) -> float:
+        """Score modalities (better/worse conditions); contradictions count against"""
+        return modality_score(case_modality_bits(case_data), remedy_data.modality_bits)
     
-    def _score_particulars(self, particulars: List, remedy_data: Dict) -> float:
+    def _score_particulars(self, particulars: List, remedy_data: RemedyProfile) -> float:
         """Score particular/local symptoms"""
-        if not particulars:
+        items = self._case_items({'particulars': particulars})['particulars']
+        if not items:
             return 0.0
-        
-        remedy_text = str(remedy_data).lower()
-        matches = 0
-        
-        for particular in particulars:
-            desc = particular.get('description', '').lower()
-            if desc and desc in remedy_text:
-                matches += 1
-        
-        return matches / len(particulars) if particulars else 0.0
+        return sum(self._item_hits(items, remedy_data.tokens)) / len(items)
     
-    def _score_constitution(self, case_data: Dict, remedy_data: Dict) -> float:
+    def _score_constitution(self, case_data: Dict, remedy_data: RemedyProfile) -> float:
         """Assess constitutional match"""
         # Basic implementation - would need more data
         return 0.5
     
-    def _assess_miasm(self, case_data: Dict, remedy_data: Dict) -> float:
-        """Assess miasmatic layer"""
-        # Basic miasmatic assessment
-        case_text = str(case_data).lower()
-        
-        for miasm, indicators in self.MIASMS.items():
-            for indicator in indicators:
-                if indicator in case_text:
-                    self.miasmatic_indicators[miasm] += 1
-        
-        return 0.5
+    def _assess_miasm(self, case_data: Dict, remedy_data: RemedyProfile) -> float:
+        """Assess miasmatic layer: case miasm profile against the remedy's affinity"""
+        classifier = get_miasm_classifier()
+        affinity = classifier.remedy_affinity(remedy_data.remedy_id, remedy_data.tokens)
+        return classifier.score(classifier.classify(case_data), affinity)
 
 
 class DifferentialAnalyzer:
@@ -204,8 +277,29 @@ class DifferentialAnalyzer:
     Compares top remedies using characteristic symptoms
     """
     
-    def __init__(self):
+    # Case fields checked against keynotes: (field, label, implicit context words)
+    CHARACTERISTIC_FIELDS = (
+        ('mental_emotional', 'Mental', ''),
+        ('thermal', 'General', ''),
+        ('cravings', 'General', 'desire'),
+        ('aversions', 'General', 'aversion'),
+        ('etiology', 'Causation', ''),
+    )
+    
+    # Confidence formula: matches for full confidence, gap scale and cap
+    CONFIDENCE_FULL_MATCHES = 5.0
+    CONFIDENCE_GAP_SCALE = 3.0
+    CONFIDENCE_GAP_CAP = 0.3
+    # Share of the repertory score added to totality when ranking ties on matches
+    REPERTORY_WEIGHT = 0.1
+    
+    def __init__(self, params: Optional[Dict[str, float]] = None):
         self.comparison_matrix = {}
+        # Overrides of the class tunables above (used by the tuning harness)
+        for name, value in (params or {}).items():
+            if not hasattr(type(self), name):
+                raise ValueError(f"Unknown differential parameter: {name}")
+            setattr(self, name, value)
     
     def compare_remedies(self, case_data: Dict, top_remedies: List[Dict], 
                         mm_context: List[Dict]) -> Dict:
@@ -217,34 +311,49 @@ class DifferentialAnalyzer:
             if top_remedies:
                 return {
                     'selected_remedy': top_remedies[0]['name'],
+                    'selected_remedy_id': top_remedies[0].get('remedy_id'),
                     'confidence': 0.7,
                     'differential': [],
                     'reasoning': 'Single clear indication'
                 }
             return {'selected_remedy': None, 'confidence': 0.0}
         
-        # Compare top 3 remedies
+        # Join MM context on interned remedy ids rather than display strings
+        registry = get_registry()
+        mm_by_id = {}
+        for mm in mm_context:
+            mm_id = mm.get('remedy_id', registry.resolve(mm.get('remedy')))
+            mm_by_id.setdefault(mm_id, mm)
+        
+        # Every candidate is compared through the keynote index; retrieved
+        # excerpts only stand in for remedies that have no monograph
+        index = load_keynote_index()
         comparisons = []
-        for remedy in top_remedies[:3]:
+        for remedy in top_remedies:
             remedy_name = remedy['name']
+            remedy_id = remedy.get('remedy_id', registry.resolve(remedy_name))
             
-            # Find MM context for this remedy
-            remedy_mm = next((mm for mm in mm_context if mm['remedy'] == remedy_name), None)
+            remedy_index = index
+            if remedy_id not in index and mm_by_id.get(remedy_id):
+                remedy_index = KeynoteIndex({remedy_id: as_profile(mm_by_id[remedy_id])})
             
-            if remedy_mm:
-                characteristic_matches = self._find_characteristic_symptoms(
-                    case_data, remedy_mm
-                )
-                
-                comparisons.append({
-                    'remedy': remedy_name,
-                    'score': remedy['score'],
-                    'characteristic_matches': characteristic_matches,
-                    'match_count': len(characteristic_matches)
-                })
-        
-        # Sort by characteristic matches (quality over quantity)
-        comparisons.sort(key=lambda x: (x['match_count'], x['score']), reverse=True)
+            matches = self._find_characteristic_symptoms(case_data, remedy_id, remedy_index)
+            comparisons.append({
+                'remedy': remedy_name,
+                'remedy_id': remedy_id,
+                'score': remedy['score'],
+                'totality': remedy.get('totality', 0.0),
+                'characteristic_matches': [m['symptom'] for m in matches],
+                'matched_keynotes': matches,
+                'match_count': len(matches),
+                'overlap': round(sum(m['overlap'] for m in matches), 3)
+            })
+        
+        # Sort by characteristic matches (quality over quantity), then overlap and totality
+        comparisons.sort(
+            key=lambda x: (x['match_count'], x['overlap'], x['totality'] + self.REPERTORY_WEIGHT * x['score']),
+            reverse=True
+        )
         
         if comparisons:
             best = comparisons[0]
@@ -252,35 +361,36 @@ class DifferentialAnalyzer:
             
             return {
                 'selected_remedy': best['remedy'],
+                'selected_remedy_id': best['remedy_id'],
                 'confidence': confidence,
                 'characteristic_matches': best['characteristic_matches'],
+                'matched_keynotes': best['matched_keynotes'],
                 'differential': comparisons[1:],
                 'reasoning': f"Selected based on {best['match_count']} characteristic symptoms"
             }
         
         return {'selected_remedy': None, 'confidence': 0.0}
     
-    def _find_characteristic_symptoms(self, case_data: Dict, remedy_mm: Dict) -> List[str]:
+    def _find_characteristic_symptoms(self, case_data: Dict, remedy_id: Optional[int],
+                                      index: KeynoteIndex) -> List[Dict]:
         """
         Identify characteristic (pathognomonic) symptoms
-        These are the symptoms that strongly indicate a specific remedy
+        These are the case symptoms that overlap one of the remedy's keynotes
         """
-        characteristics = []
-        
-        # Check mental/emotional characteristics
-        for mental in case_data.get('mental_emotional', []):
-            if mental.lower() in str(remedy_mm).lower():
-                characteristics.append(f"Mental: {mental}")
-        
-        # Check generals
-        thermal = case_data.get('thermal')
-        if thermal and thermal.lower() in str(remedy_mm).lower():
-            characteristics.append(f"General: {thermal}")
+        if remedy_id is None or remedy_id not in index:
+            return []
         
-        # Check causation
-        etiology = case_data.get('etiology')
-        if etiology and etiology.lower() in str(remedy_mm).lower():
-            characteristics.append(f"Causation: {etiology}")
+        characteristics = []
+        for field, label, context in self.CHARACTERISTIC_FIELDS:
+            for symptom in as_list(case_data.get(field)):
+                form = normalize_phrase(str(symptom), context)
+                hit = index.match(form, remedy_ids={remedy_id}).get(remedy_id) if form else None
+                if hit:
+                    characteristics.append({
+                        'symptom': f"{label}: {symptom}",
+                        'keynote': hit[1],
+                        'overlap': hit[0]
+                    })
         
         return characteristics
     
@@ -295,14 +405,14 @@ class DifferentialAnalyzer:
             return 0.5
         
         # Base confidence on characteristic matches
-        match_confidence = min(best['match_count'] / 5.0, 1.0)  # 5+ matches = full confidence
+        match_confidence = min(best['match_count'] / self.CONFIDENCE_FULL_MATCHES, 1.0)
         
         # Adjust based on gap to second remedy
         if len(all_comparisons) > 1:
             gap = best['match_count'] - all_comparisons[1]['match_count']
-            gap_confidence = min(gap / 3.0, 0.3)  # Max 0.3 boost from gap
+            gap_confidence = min(gap / self.CONFIDENCE_GAP_SCALE, self.CONFIDENCE_GAP_CAP)
         else:
-            gap_confidence = 0.3
+            gap_confidence = self.CONFIDENCE_GAP_CAP
         
         total_confidence = min(match_confidence + gap_confidence, 1.0)
         
@@ -387,6 +497,10 @@ class FollowUpAnalyzer:
     """
     Analyze follow-up responses and guide next steps
     Based on Hahnemann's observations and Kent's guidelines
+    
+    Visits are appended to a per-patient TimelineStore. Each stored visit keeps the
+    full symptom state and its delta against the previous visit, so recording a
+    new visit only analyzes that visit against the latest row.
     """
     
     RESPONSE_PATTERNS = {
@@ -398,6 +512,10 @@ class FollowUpAnalyzer:
             'description': 'Initial aggravation followed by improvement',
             'action': 'Good sign, wait and observe'
         },
+        'aggravation': {
+            'description': 'Symptoms worse since the remedy',
+            'action': 'Wait if the aggravation is mild and the mental state is better; reassess if it persists'
+        },
         'no_response': {
             'description': 'No change after appropriate time',
             'action': 'Consider different remedy or potency'
@@ -412,29 +530,236 @@ class FollowUpAnalyzer:
         }
     }
     
+    # Hering's direction of cure: from within outward
+    LEVELS = ('mental', 'general', 'particular')
+    LEVEL_FIELDS = (
+        ('mental_emotional', 'mental'),
+        ('thermal', 'general'),
+        ('generals', 'general'),
+        ('cravings', 'general'),
+        ('aversions', 'general'),
+        ('sleep', 'general'),
+    )
+    DEFAULT_INTENSITY = 5
+    
+    # Relative change below which the case counts as unchanged
+    NO_CHANGE_THRESHOLD = 0.1
+    # Relative improvement counted as a full response
+    IDEAL_THRESHOLD = 0.6
+    
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+    
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = TimelineStore()
+        return self._store
+    
     def analyze_response(self, initial_case: Dict, follow_up: Dict) -> Dict:
-        """Analyze patient response to remedy"""
-        # This would need actual follow-up data structure
-        # Placeholder for future implementation
+        """Analyze patient response to remedy between two snapshots (no storage)"""
+        before = self._next_state({}, initial_case, 1)
+        after = self._next_state(before, follow_up, 2)
+        return self._analyze(before, after, None)
+    
+    def record_visit(self, patient_id: str, visit: Dict, remedy: Optional[str] = None) -> Dict:
+        """
+        Append a visit to the patient's timeline and analyze it against the previous one.
+        `visit` is a case dict (first visit or follow-up) or {'symptoms': [...]} with
+        explicit {'text', 'level', 'intensity'} entries; intensity 0 means resolved.
+        """
+        with self._lock:
+            previous = self.store.latest(patient_id)
+            visit_no = previous['visit_no'] + 1 if previous else 1
+            prev_state = previous['state'] if previous else {}
+            state = self._next_state(prev_state, visit, visit_no)
+            analysis = None
+            if previous:
+                analysis = self._analyze(prev_state, state, previous['analysis'])
+            self.store.append(patient_id, state, analysis, remedy=remedy)
+        
+        return dict(analysis or {'pattern': None, 'recommendation': 'Baseline visit recorded', 'next_steps': []},
+                    visit_no=visit_no)
+    
+    def history(self, patient_id: str) -> List[Dict]:
+        """Patient timeline, oldest visit first"""
+        return self.store.history(patient_id)
+    
+    def _visit_symptoms(self, visit: Dict) -> List[Tuple[str, str, float]]:
+        """(text, level, intensity) entries of a visit"""
+        if 'symptoms' in visit:
+            return [
+                (str(s['text']), s.get('level', 'particular'), float(s.get('intensity', self.DEFAULT_INTENSITY)))
+                for s in visit['symptoms']
+            ]
+        entries = []
+        for field, level in self.LEVEL_FIELDS:
+            for text in as_list(visit.get(field)):
+                entries.append((str(text), level, float(self.DEFAULT_INTENSITY)))
+        for particular in visit.get('particulars', []) or []:
+            if particular.get('description'):
+                entries.append((str(particular['description']), 'particular', float(self.DEFAULT_INTENSITY)))
+        return entries
+    
+    def _next_state(self, prev_state: Dict, visit: Dict, visit_no: int) -> Dict:
+        """
+        Symptom state after a visit, keyed by normalized symptom form.
+        Symptoms from earlier visits that are not reported again count as resolved
+        (intensity 0) but keep their first-seen visit for Hering's chronology.
+        """
+        state = {key: dict(entry, intensity=0.0) for key, entry in prev_state.items()}
+        for text, level, intensity in self._visit_symptoms(visit):
+            key = ' '.join(sorted(normalize_phrase(text))) or text.lower()
+            first_seen = prev_state.get(key, {}).get('first_seen', visit_no)
+            state[key] = {'text': text, 'level': level, 'intensity': intensity, 'first_seen': first_seen}
+        return state
+    
+    def _deltas(self, prev_state: Dict, state: Dict) -> List[Dict]:
+        deltas = []
+        for key, entry in state.items():
+            prev = prev_state.get(key)
+            before = prev['intensity'] if prev else 0.0
+            after = entry['intensity']
+            if prev is None:
+                status = 'new' if after > 0 else 'unchanged'
+            elif before == 0 and after > 0:
+                status = 'returned'  # old symptom reappearing
+            elif after < before:
+                status = 'resolved' if after == 0 else 'improved'
+            elif after > before:
+                status = 'worse'
+            else:
+                status = 'unchanged'
+            deltas.append({
+                'symptom': entry['text'],
+                'level': entry['level'],
+                'first_seen': entry['first_seen'],
+                'before': before,
+                'after': after,
+                'change': after - before,
+                'status': status
+            })
+        return deltas
+    
+    def _check_hering(self, deltas: List[Dict]) -> Dict:
+        """
+        Hering's law: cure proceeds from mental to general to particular, and from
+        the most recent symptoms back to the oldest
+        """
+        relief = {}
+        for level in self.LEVELS:
+            changes = [(d['before'] - d['after']) / d['before'] for d in deltas
+                       if d['level'] == level and d['before'] > 0]
+            if changes:
+                relief[level] = round(sum(changes) / len(changes), 3)
+        
+        present = [relief[level] for level in self.LEVELS if level in relief]
+        level_order = all(a >= b for a, b in zip(present, present[1:]))
+        
+        existing = [d for d in deltas if d['before'] > 0]
+        chronology = True
+        if existing:
+            latest = max(d['first_seen'] for d in existing)
+            recent = [(d['before'] - d['after']) / d['before'] for d in existing if d['first_seen'] == latest]
+            older = [(d['before'] - d['after']) / d['before'] for d in existing if d['first_seen'] < latest]
+            if recent and older:
+                chronology = sum(recent) / len(recent) >= sum(older) / len(older)
+        
         return {
-            'pattern': 'ideal',
-            'recommendation': 'Continue observation',
-            'next_steps': []
+            'follows_hering': level_order and chronology,
+            'level_order': level_order,
+            'recent_to_old': chronology,
+            'relief_by_level': relief,
+            'old_symptoms_returned': [d['symptom'] for d in deltas if d['status'] == 'returned']
         }
+    
+    def _analyze(self, prev_state: Dict, state: Dict, prev_analysis: Optional[Dict]) -> Dict:
+        deltas = self._deltas(prev_state, state)
+        hering = self._check_hering(deltas)
+        
+        baseline = sum(d['before'] for d in deltas)
+        net = sum(d['before'] - d['after'] for d in deltas) / baseline if baseline else 0.0
+        new = [d['symptom'] for d in deltas if d['status'] == 'new']
+        
+        if new:
+            pattern = 'new_symptoms'
+        elif net <= -self.NO_CHANGE_THRESHOLD:
+            pattern = 'aggravation'
+        elif net < self.NO_CHANGE_THRESHOLD:
+            pattern = 'no_response'
+        elif prev_analysis and prev_analysis.get('pattern') == 'aggravation':
+            pattern = 'aggravation_then_improvement'
+        elif net >= self.IDEAL_THRESHOLD and hering['follows_hering']:
+            pattern = 'ideal'
+        else:
+            pattern = 'partial_response'
+        
+        next_steps = [self.RESPONSE_PATTERNS[pattern]['action']]
+        if net > 0 and not hering['level_order']:
+            next_steps.append("Particulars improving ahead of the mental/general state: watch for suppression")
+        if hering['old_symptoms_returned']:
+            next_steps.append("Old symptoms returning: consistent with Hering's law, do not antidote")
+        if new:
+            next_steps.append("Record onset and intensity of the new symptoms at the next visit")
+        
+        return {
+            'pattern': pattern,
+            'description': self.RESPONSE_PATTERNS[pattern]['description'],
+            'recommendation': self.RESPONSE_PATTERNS[pattern]['action'],
+            'next_steps': next_steps,
+            'net_improvement': round(net, 3),
+            'hering': hering,
+            'deltas': deltas
+        }
+
+
+# Top totality remedies added to the repertory candidates for differentiation
+TOTALITY_CANDIDATES = 5
+
+
+def matched_keynotes(case_data: Dict, remedy_id: Optional[int]) -> List[Dict]:
+    """Keynotes of one remedy matched by the case's characteristic symptoms"""
+    return DifferentialAnalyzer()._find_characteristic_symptoms(
+        case_features(case_data), remedy_id, load_keynote_index()
+    )
 
 
 def get_clinical_recommendation(case_data: Dict, repertory_result: Dict, 
-                                mm_context: List[Dict]) -> Dict:
+                                mm_context: List[Dict],
+                                scorer: Optional[ClinicalScoringEngine] = None,
+                                differentiator: Optional[DifferentialAnalyzer] = None) -> Dict:
     """
     Main function to get clinical recommendation using advanced engines
     """
-    # Initialize engines
-    scorer = ClinicalScoringEngine()
-    differentiator = DifferentialAnalyzer()
+    case_data = case_features(case_data)
+    
+    # Initialize engines (callers may pass tuned ones)
+    scorer = scorer or ClinicalScoringEngine()
+    differentiator = differentiator or DifferentialAnalyzer()
     potency_selector = PotencySelector()
     
-    # Get top candidates from repertory
-    top_candidates = repertory_result.get('candidates', [])[:5]
+    # Totality table over every remedy, then the candidate pool: repertory
+    # leaders plus the strongest totality matches the repertory missed
+    totality_table = scorer.score_all(case_data)
+    totality_by_id = {row['remedy_id']: row['totality'] for row in totality_table}
+    
+    top_candidates = []
+    seen = set()
+    for cand in repertory_result.get('candidates', [])[:5]:
+        top_candidates.append(dict(cand, totality=totality_by_id.get(cand.get('remedy_id'), 0.0)))
+        seen.add(cand.get('remedy_id'))
+    if top_candidates:
+        for row in totality_table[:TOTALITY_CANDIDATES]:
+            if row['remedy_id'] not in seen:
+                top_candidates.append({
+                    'name': row['name'],
+                    'remedy_id': row['remedy_id'],
+                    'score': 0.0,
+                    'totality': row['totality'],
+                    'reasons': ['totality']
+                })
+                seen.add(row['remedy_id'])
     
     if not top_candidates:
         return {
@@ -461,12 +786,15 @@ def get_clinical_recommendation(case_data: Dict, repertory_result: Dict,
     return {
         'status': 'success',
         'remedy': differential['selected_remedy'],
+        'remedy_id': differential.get('selected_remedy_id'),
         'potency': potency,
         'confidence': differential['confidence'],
         'repetition': repetition,
         'characteristic_symptoms': differential.get('characteristic_matches', []),
+        'keynote_matches': differential.get('matched_keynotes', []),
         'differential_diagnosis': differential.get('differential', []),
         'reasoning': differential.get('reasoning', ''),
+        'totality_ranking': totality_table[:10],
         'clinical_notes': _generate_clinical_notes(case_data, differential)
     }
 
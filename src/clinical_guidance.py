@@ -5,6 +5,8 @@ Detailed instructions for dosage, diet, lifestyle, and healing timeline
 from typing import Dict, List, Tuple
 from datetime import datetime, timedelta
 
+from .remedies import get_registry
+
 class DosingProtocol:
     """
     Detailed dosing protocols based on condition severity and patient vitality
@@ -195,7 +197,12 @@ class DietaryGuidance:
             'Phosphorus': ['Avoid very cold drinks despite craving', 'Light, easily digestible food'],
             'Natrum muriaticum': ['Reduce salt intake despite craving', 'Avoid bread and starchy foods']
         }
-        return remedy_diets.get(remedy, ['Follow general dietary guidelines'])
+        registry = get_registry()
+        remedy_id = registry.resolve(remedy)
+        for name, notes in remedy_diets.items():
+            if remedy_id is not None and registry.resolve(name) == remedy_id:
+                return notes
+        return ['Follow general dietary guidelines']
 
 
 class LifestyleGuidance:
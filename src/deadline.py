@@ -0,0 +1,120 @@
+"""
+Request-scoped deadlines
+A workflow run gets one overall time budget. The deadline is carried in a context
+variable, so every stage and client call can read the remaining budget: OpenAI calls
+use it as their request timeout, and optional stages switch to a cheaper fallback
+(lexical Materia Medica search, template rationale) when too little remains. Each
+fallback taken is recorded as a degradation and reported on the workflow result.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Overall budget of one workflow run, in seconds
+WORKFLOW_DEADLINE = float(os.getenv("WORKFLOW_DEADLINE", 60))
+# Remaining seconds needed to start a semantic MM search or an LLM enhancement
+MIN_MM_BUDGET = float(os.getenv("MIN_MM_BUDGET", 3))
+MIN_LLM_BUDGET = float(os.getenv("MIN_LLM_BUDGET", 8))
+# Below this many remaining seconds client calls are not retried
+MIN_RETRY_BUDGET = float(os.getenv("MIN_RETRY_BUDGET", 20))
+
+_current: ContextVar[Optional["Deadline"]] = ContextVar("deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, seconds: float = WORKFLOW_DEADLINE):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.degradations: List[Dict] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def allows(self, seconds: float) -> bool:
+        """Whether at least `seconds` of the budget remain"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Remaining budget, capped at `cap` (a stage's own timeout)"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(cap, remaining)
+
+    def degrade(self, stage: str, fallback: str, reason: str):
+        """Record that `stage` fell back to `fallback` ("budget" or "timeout"/"error")"""
+        self.degradations.append({
+            "stage": stage,
+            "fallback": fallback,
+            "reason": reason,
+            "remaining_s": round(self.remaining(), 2),
+        })
+
+    def report(self) -> Dict:
+        return {"budget_s": self.seconds, "elapsed_s": round(self.seconds - self.remaining(), 2)}
+
+    def attach(self, workflow_result: Dict) -> Dict:
+        """Add the budget report and the degradations taken to a workflow result"""
+        workflow_result["deadline"] = self.report()
+        workflow_result["degradations"] = list(self.degradations)
+        return workflow_result
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline(seconds: Optional[float] = None):
+    """Run the enclosed block under a deadline (joins an active one instead of nesting)"""
+    active = _current.get()
+    if active is not None:
+        yield active
+        return
+
+    current = Deadline(WORKFLOW_DEADLINE if seconds is None else seconds)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Ended from another context (e.g. an abandoned generator)
+            _current.set(None)
+
+
+def budget_allows(seconds: float) -> bool:
+    """True outside a deadline, else whether `seconds` remain"""
+    current = _current.get()
+    return current is None or current.allows(seconds)
+
+
+def degrade(stage: str, fallback: str, reason: str):
+    current = _current.get()
+    if current is not None:
+        current.degrade(stage, fallback, reason)
+
+
+def failure_reason(exc: BaseException) -> str:
+    """Degradation reason for a failed call: timeout (asyncio, OpenAI, HTTP) or error"""
+    return "timeout" if isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__ else "error"
+
+
+def stage_timeout(cap: Optional[float]) -> Optional[float]:
+    """A stage's timeout, capped by the remaining budget"""
+    current = _current.get()
+    return cap if current is None else current.timeout(cap)
+
+
+def bounded(client):
+    """An OpenAI client whose request timeout (and retries) fit the remaining budget"""
+    current = _current.get()
+    if current is None:
+        return client
+    remaining = current.remaining()
+    cap = client.timeout if isinstance(client.timeout, (int, float)) else getattr(client.timeout, "read", None)
+    options = {"timeout": remaining if cap is None else min(cap, remaining)}
+    if remaining < MIN_RETRY_BUDGET:
+        options["max_retries"] = 0
+    return client.with_options(**options)
@@ -1,30 +1,41 @@
 import os
+import math
+import asyncio
+import hashlib
 import numpy as np
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Tuple
 from .utils import load_materia_medica, save_json, load_json
+from .remedies import get_registry
+from .openai_clients import get_client, get_async_client
+from .tracing import span
+from .deadline import bounded, stage_timeout
+from common.normalize import normalize_text
+from common.singleflight import AsyncSingleFlight, SingleFlight, request_key
 from dotenv import load_dotenv
 
 load_dotenv()
 
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
-
 API_BASE = os.getenv("API_BASE", "https://api.openai.com/v1")
 EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
 INDEX_PATH = os.getenv("EMBED_INDEX_PATH", "data/mm_index.json")
 MM_DIR = os.getenv("MM_DIR", "data/materia_medica")
-
-def _client():
-    if OpenAI is None:
-        raise RuntimeError("openai package not installed")
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+RUBRIC_INDEX_PATH = os.getenv("RUBRIC_INDEX_PATH", "data/rubric_index.json")
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """Generate embeddings using OpenAI API"""
-    client = _client()
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
+    with span("embeddings", model=EMBED_MODEL, texts=len(texts)) as s:
+        client = bounded(get_client())
+        resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
+        s.usage(resp.usage)
+    return [d.embedding for d in resp.data]
+
+async def embed_texts_async(texts: List[str]) -> List[List[float]]:
+    """Async form of embed_texts"""
+    with span("embeddings", model=EMBED_MODEL, texts=len(texts)) as s:
+        client = bounded(get_async_client())
+        resp = await client.embeddings.create(model=EMBED_MODEL, input=texts)
+        s.usage(resp.usage)
     return [d.embedding for d in resp.data]
 
 def build_index() -> Dict:
@@ -40,31 +51,125 @@ def load_index() -> Dict:
     """Load existing embeddings index"""
     return load_json(INDEX_PATH, default={"docs": [], "vectors": []})
 
-def search(query: str, k: int = 5) -> List[Dict]:
-    """Semantic search over materia medica using embeddings"""
-    index = load_index()
-    if not index["docs"]:
-        index = build_index()
-    
-    qvec = np.array(embed_texts([query])[0])
-    scores = []
-    
-    for i, v in enumerate(index["vectors"]):
-        vec = np.array(v)
-        # cosine similarity
-        sim = float(qvec @ vec / (np.linalg.norm(qvec) * np.linalg.norm(vec) + 1e-8))
-        scores.append((i, sim))
-    
-    scores.sort(key=lambda x: x[1], reverse=True)
+def compile_vectors(vectors: List[List[float]]) -> np.ndarray:
+    """Row-normalized float32 matrix, so cosine similarity is a single matrix product"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / (norms + 1e-8)
+
+@lru_cache(maxsize=8)
+def _load_compiled(path: str, mtime: float) -> Tuple[Dict, np.ndarray]:
+    index = load_json(path, default={"docs": [], "vectors": []})
+    return index, compile_vectors(index["vectors"])
+
+def load_compiled_index(path: str = INDEX_PATH) -> Tuple[Dict, np.ndarray]:
+    """Load a {docs, vectors} index once per file version, with its compiled matrix"""
+    if not os.path.exists(path):
+        return {"docs": [], "vectors": []}, compile_vectors([])
+    return _load_compiled(path, os.path.getmtime(path))
+
+def similarities(matrix: np.ndarray, query_vecs: List[List[float]]) -> np.ndarray:
+    """Cosine similarity of each query (rows) against each compiled vector (columns)"""
+    return compile_vectors(query_vecs) @ matrix.T
+
+def rubric_source_hash(rubric_texts: List[str]) -> str:
+    return hashlib.sha256("\n".join(rubric_texts).encode("utf-8")).hexdigest()
+
+def build_rubric_index(rubric_texts: List[Dict], path: str = RUBRIC_INDEX_PATH) -> Dict:
+    """
+    Embed every rubric once (rubric name + keywords) into the MM index format.
+    `rubric_texts` items are {"id": rubric, "text": "..."} in repertory order.
+    """
+    docs = [{"id": r["id"], "title": r["id"], "text": r["text"]} for r in rubric_texts]
+    vecs = embed_texts([d["text"] for d in docs]) if docs else []
+    index = {
+        "source_hash": rubric_source_hash([d["text"] for d in docs]),
+        "docs": docs,
+        "vectors": vecs,
+    }
+    save_json(path, index)
+    return index
+
+def load_rubric_matrix(rubric_texts: List[Dict], path: str = RUBRIC_INDEX_PATH) -> np.ndarray:
+    """Compiled rubric vectors, rebuilt when the repertory no longer matches the index"""
+    index, matrix = load_compiled_index(path)
+    if index.get("source_hash") != rubric_source_hash([r["text"] for r in rubric_texts]):
+        build_rubric_index(rubric_texts, path)
+        index, matrix = load_compiled_index(path)
+    return matrix
+
+def _ranked(index: Dict, matrix: np.ndarray, query_vec: List[float], k: int) -> List[Dict]:
+    return _results(index, similarities(matrix, [query_vec])[0], k)
+
+def _results(index: Dict, sims: np.ndarray, k: int) -> List[Dict]:
+    order = np.argsort(-sims)[:k]
+    registry = get_registry()
     out = []
     
-    for i, sim in scores[:k]:
+    for i in order:
         doc = index["docs"][i]
         out.append({
             "id": doc["id"],
+            "remedy_id": registry.resolve(doc["title"]),
             "title": doc["title"],
-            "similarity": sim,
+            "similarity": float(sims[i]),
             "excerpt": doc["text"][:600]
         })
     
     return out
+
+# Identical concurrent searches share one query embedding
+_searches = SingleFlight("mm_search")
+_async_searches = AsyncSingleFlight("mm_search")
+
+def search(query: str, k: int = 5) -> List[Dict]:
+    """Semantic search over materia medica using embeddings (identical concurrent searches coalesce)"""
+    return _searches.do(request_key(query, k), _search, query, k, timeout=stage_timeout(None))[0]
+
+def _search(query: str, k: int) -> List[Dict]:
+    index, matrix = load_compiled_index(INDEX_PATH)
+    if not index["docs"]:
+        index = build_index()
+        index, matrix = load_compiled_index(INDEX_PATH)
+    
+    return _ranked(index, matrix, embed_texts([query])[0], k)
+
+@lru_cache(maxsize=8)
+def _lexical_index(path: str, mtime: float) -> Tuple[List[frozenset], Dict[str, float]]:
+    """Token sets of the indexed docs and the tokens' inverse document frequencies"""
+    index, _ = load_compiled_index(path)
+    doc_tokens = [frozenset(normalize_text(d["text"])) for d in index["docs"]]
+    counts: Dict[str, int] = {}
+    for tokens in doc_tokens:
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+    n = len(doc_tokens)
+    return doc_tokens, {t: math.log(1 + n / c) for t, c in counts.items()}
+
+def lexical_search(query: str, k: int = 5) -> List[Dict]:
+    """
+    Materia Medica search by idf-weighted token overlap, without an embeddings call.
+    Cheaper, rougher fallback for search() when the request deadline is short.
+    """
+    index, _ = load_compiled_index(INDEX_PATH)
+    if not index["docs"]:
+        return []
+    doc_tokens, idf = _lexical_index(INDEX_PATH, os.path.getmtime(INDEX_PATH))
+    query_tokens = set(normalize_text(query))
+    sims = np.array([sum(idf[t] for t in query_tokens & tokens) / math.sqrt(len(tokens) or 1)
+                     for tokens in doc_tokens], dtype=np.float32)
+    return _results(index, sims, k)
+
+async def search_async(query: str, k: int = 5) -> List[Dict]:
+    """Async form of search; only the query embedding goes over the network"""
+    return (await _async_searches.do(request_key(query, k), _search_async, query, k))[0]
+
+async def _search_async(query: str, k: int) -> List[Dict]:
+    index, matrix = load_compiled_index(INDEX_PATH)
+    if not index["docs"]:
+        await asyncio.to_thread(build_index)
+        index, matrix = load_compiled_index(INDEX_PATH)
+    
+    return _ranked(index, matrix, (await embed_texts_async([query]))[0], k)
@@ -9,10 +9,8 @@ from io import BytesIO
 from PIL import Image
 import json
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+from .openai_clients import OpenAI, get_client
+from .tracing import span, trace
 
 
 class MedicalImageAnalyzer:
@@ -80,7 +78,7 @@ Be thorough and clinically accurate. Focus on features relevant to homeopathic p
         if OpenAI:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key:
-                self.client = OpenAI(api_key=api_key)
+                self.client = get_client()
     
     def analyze_image(self, image_data: bytes, image_format: str = "jpeg") -> Dict:
         """
@@ -97,29 +95,31 @@ Be thorough and clinically accurate. Focus on features relevant to homeopathic p
             base64_image = base64.b64encode(image_data).decode('utf-8')
             
             # Call OpenAI Vision API
-            response = self.client.chat.completions.create(
-                model="gpt-4o",  # Vision-capable model
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": self.ANALYSIS_PROMPT
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/{image_format};base64,{base64_image}",
-                                    "detail": "high"
+            with trace("image_analysis"), span("llm.vision", model="gpt-4o") as s:
+                response = self.client.chat.completions.create(
+                    model="gpt-4o",  # Vision-capable model
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": self.ANALYSIS_PROMPT
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/{image_format};base64,{base64_image}",
+                                        "detail": "high"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1500,
-                temperature=0.3
-            )
+                            ]
+                        }
+                    ],
+                    max_tokens=1500,
+                    temperature=0.3
+                )
+                s.usage(response.usage)
             
             # Parse response
             content = response.choices[0].message.content
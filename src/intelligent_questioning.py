@@ -6,6 +6,10 @@ Ensures complete totality before prescribing
 from typing import Dict, List, Optional, Tuple
 import json
 
+from common.normalize import keyword_form
+
+from .case_features import CaseFeatures, case_features
+
 
 class IntelligentQuestioner:
     """
@@ -235,15 +239,43 @@ class IntelligentQuestioner:
         ]
     }
     
+    # Case fields that answer each essential category
+    CATEGORY_FIELDS = {
+        'mental_emotional': ('mental_emotional',),
+        'thermal_state': ('thermal',),
+        'modalities': ('particulars.modalities_better', 'particulars.modalities_worse'),
+        'food_preferences': ('cravings', 'aversions'),
+        'sleep': ('sleep', 'dreams'),
+        'causation': ('etiology',),
+        'past_suppression': ('past_history',),
+    }
+    
+    # Categories answered by words anywhere in the case
+    CATEGORY_TERMS = {
+        'laterality': ['left', 'right'],
+        'discharges': ['discharge', 'mucus', 'sweat', 'perspiration', 'leucorrhea'],
+        'menstrual': ['menses', 'menopause'],
+    }
+    
     def __init__(self):
         self.questions_asked = []
         self.information_gaps = []
     
+    def _info_count(self, case: CaseFeatures, category: str) -> int:
+        """How many pieces of information the case holds for a category"""
+        if category in self.CATEGORY_FIELDS:
+            return sum(case.count(field) for field in self.CATEGORY_FIELDS[category])
+        if category in self.CATEGORY_TERMS:
+            terms = {t for term in self.CATEGORY_TERMS[category] for t in keyword_form(term)}
+            return len(terms & case.token_set)
+        return case.count(category)
+    
     def analyze_case_completeness(self, case_data: Dict) -> Dict:
         """
         Analyze case data to identify information gaps
         Returns priority questions to ask
         """
+        case = case_features(case_data)
         gaps = []
         priority_questions = []
         
@@ -255,13 +287,7 @@ class IntelligentQuestioner:
                 pass
             
             # Check if category has sufficient information
-            category_data = case_data.get(category, [])
-            if isinstance(category_data, list):
-                info_count = len([x for x in category_data if x])
-            elif isinstance(category_data, str):
-                info_count = 1 if category_data else 0
-            else:
-                info_count = 0
+            info_count = self._info_count(case, category)
             
             min_required = details.get('min_required', 1)
             
@@ -281,11 +307,12 @@ class IntelligentQuestioner:
         for gap in gaps[:5]:  # Top 5 most important gaps
             priority_questions.extend(gap['questions'][:2])  # 2 questions per gap
         
+        completeness = self._calculate_completeness(case)
         return {
-            'completeness_score': self._calculate_completeness(case_data),
+            'completeness_score': completeness,
             'information_gaps': gaps,
             'priority_questions': priority_questions[:10],  # Max 10 questions
-            'ready_for_prescription': len(gaps) <= 2 and self._calculate_completeness(case_data) >= 0.7
+            'ready_for_prescription': len(gaps) <= 2 and completeness >= 0.7
         }
     
     def generate_differential_questions(self, top_remedies: List[str]) -> List[str]:
@@ -326,16 +353,18 @@ class IntelligentQuestioner:
         """
         questions = []
         
+        case = case_features(case_data)
+        
         # Check presenting complaint for key symptom types
-        complaint = case_data.get('presenting_complaint', '').lower()
+        complaint = case.field_text('presenting_complaint')
         
         for symptom_type, symptom_questions in self.SYMPTOM_CLARIFICATIONS.items():
             if symptom_type in complaint:
                 questions.extend(symptom_questions[:3])
         
         # Check particulars
-        for particular in case_data.get('particulars', []):
-            desc = particular.get('description', '').lower()
+        for start, end in case.spans.get('particulars.description', []):
+            desc = case.text[start:end]
             for symptom_type, symptom_questions in self.SYMPTOM_CLARIFICATIONS.items():
                 if symptom_type in desc:
                     questions.extend(symptom_questions[:2])
@@ -349,10 +378,7 @@ class IntelligentQuestioner:
         questions = []
         
         # Check if modalities are well documented
-        modality_count = 0
-        for particular in case_data.get('particulars', []):
-            modality_count += len(particular.get('modalities_better', []))
-            modality_count += len(particular.get('modalities_worse', []))
+        modality_count = self._info_count(case_features(case_data), 'modalities')
         
         if modality_count < 3:
             questions = [
@@ -391,6 +417,8 @@ class IntelligentQuestioner:
         """
         Generate comprehensive set of questions based on case analysis
         """
+        case_data = case_features(case_data)
+        
         # Analyze completeness
         completeness = self.analyze_case_completeness(case_data)
         
@@ -467,6 +495,7 @@ class IntelligentQuestioner:
         """
         Calculate overall case completeness score (0-1)
         """
+        case = case_features(case_data)
         total_weight = 0
         achieved_weight = 0
         
@@ -476,13 +505,7 @@ class IntelligentQuestioner:
             total_weight += weight
             
             # Check category data
-            category_data = case_data.get(category, [])
-            if isinstance(category_data, list):
-                info_count = len([x for x in category_data if x])
-            elif isinstance(category_data, str):
-                info_count = 1 if category_data else 0
-            else:
-                info_count = 0
+            info_count = self._info_count(case, category)
             
             if info_count >= min_required:
                 achieved_weight += weight
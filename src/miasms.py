@@ -0,0 +1,152 @@
+"""
+Miasm classifier
+The miasm indicator lexicons are compiled once into an indicator matrix. Cases are
+classified into miasm profiles (one case or a batch in a single matrix pass) and
+scored against precomputed remedy affinities.
+The classifier holds no mutable state, so one instance is shared across threads.
+"""
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Tuple
+
+import numpy as np
+
+from common.normalize import keyword_form
+
+from .case_features import case_features
+from .remedies import get_registry
+
+# Core indicators per miasm (Hahnemann / Kent)
+MIASMS: Dict[str, List[str]] = {
+    "psora": ["itching", "suppression", "functional", "deficiency"],
+    "sycosis": ["overgrowth", "warts", "tumors", "excess"],
+    "syphilis": ["destruction", "ulceration", "deformity", "night aggravation"],
+    "tubercular": ["weakness", "emaciation", "restlessness", "changing symptoms"],
+}
+
+# Extended lexicons on top of the core indicators
+EXTENDED_INDICATORS: Dict[str, List[str]] = {
+    "psora": ["burning", "dry skin", "eruption", "suppressed eruptions", "anxiety", "hunger", "periodicity", "offensive", "dirty"],
+    "sycosis": ["catarrh", "discharge", "cysts", "polyps", "secretive", "fixed ideas", "damp", "gonorrhea", "growths", "hurry"],
+    "syphilis": ["ulcers", "bone pains", "destructive", "suicidal", "fissures", "worse night", "gangrene", "obsessive"],
+    "tubercular": ["desire change", "travel", "dissatisfied", "emaciated", "tuberculosis", "recurrent", "glands", "ringworm", "wanderlust"],
+}
+
+# Classical nosode / anchor remedies, added on top of the lexical affinity
+ANCHOR_REMEDIES: Dict[str, str] = {
+    "Psorinum": "psora",
+    "Sulphur": "psora",
+    "Thuja": "sycosis",
+    "Medorrhinum": "sycosis",
+    "Mercurius Solubilis": "syphilis",
+    "Syphilinum": "syphilis",
+    "Aurum Metallicum": "syphilis",
+    "Tuberculinum": "tubercular",
+    "Phosphorus": "tubercular",
+    "Calcarea Phosphorica": "tubercular",
+}
+ANCHOR_WEIGHT = 3.0
+
+# Score when the case carries no miasmatic indicator (neutral for every remedy)
+NEUTRAL_SCORE = 0.5
+
+
+class MiasmClassifier:
+    """
+    Compiled miasm matcher. Indicator phrases are normalized once into an
+    (indicator x token) matrix over the lexicon's vocabulary; classifying a batch of
+    cases is a (case x token) matrix product with it, an indicator matching when all
+    of its tokens are present.
+    """
+
+    def __init__(self, lexicon: Dict[str, List[str]]):
+        self.miasms: Tuple[str, ...] = tuple(lexicon)
+        forms = []
+        for mi, miasm in enumerate(self.miasms):
+            for indicator in dict.fromkeys(lexicon[miasm]):
+                form = keyword_form(indicator)
+                if form:
+                    forms.append((mi, form))
+        self._vocab: Dict[str, int] = {}
+        for _, form in forms:
+            for token in sorted(form):
+                self._vocab.setdefault(token, len(self._vocab))
+        self._indicator_tokens = np.zeros((len(forms), len(self._vocab)), dtype=np.float32)
+        self._indicator_miasm = np.zeros((len(forms), len(self.miasms)), dtype=np.float32)
+        for ii, (mi, form) in enumerate(forms):
+            self._indicator_tokens[ii, [self._vocab[t] for t in form]] = 1.0
+            self._indicator_miasm[ii, mi] = 1.0
+        self._indicator_sizes = self._indicator_tokens.sum(axis=1)
+
+    def __len__(self) -> int:
+        return len(self.miasms)
+
+    def encode(self, token_sets: List[FrozenSet[str]]) -> np.ndarray:
+        """Binary case x vocabulary matrix; tokens outside the lexicon are dropped"""
+        out = np.zeros((len(token_sets), len(self._vocab)), dtype=np.float32)
+        for row, tokens in enumerate(token_sets):
+            columns = [self._vocab[t] for t in tokens if t in self._vocab]
+            out[row, columns] = 1.0
+        return out
+
+    def counts_many(self, token_sets: List[FrozenSet[str]]) -> np.ndarray:
+        """Matched indicator count per miasm, one row per normalized token set"""
+        shared = self.encode(token_sets) @ self._indicator_tokens.T
+        matched = (shared == self._indicator_sizes).astype(np.float32)
+        return matched @ self._indicator_miasm
+
+    def counts(self, tokens: FrozenSet[str]) -> np.ndarray:
+        """Matched indicator count per miasm for a normalized token set"""
+        return self.counts_many([tokens])[0]
+
+    @staticmethod
+    def _distribution(counts: np.ndarray) -> np.ndarray:
+        total = counts.sum()
+        return counts / total if total else counts
+
+    def classify(self, case_data: Dict) -> np.ndarray:
+        """Miasm profile of a case: share of matched indicators per miasm (zeros if none)"""
+        case = case_features(case_data)
+        return case.cached(f"miasm_profile:{id(self)}", lambda: self._distribution(self.counts(case.token_set)))
+
+    def classify_many(self, cases: List[Dict]) -> np.ndarray:
+        """Batch form of classify: one row per case, from a single matrix pass"""
+        counts = self.counts_many([case_features(case).token_set for case in cases])
+        totals = counts.sum(axis=1, keepdims=True)
+        return counts / np.where(totals, totals, 1.0)
+
+    def remedy_affinity(self, remedy_id: int, tokens: FrozenSet[str]) -> np.ndarray:
+        """Miasm affinity of a remedy from its monograph tokens plus anchor remedies"""
+        counts = self.counts(tokens)
+        anchor = _anchor_ids().get(remedy_id)
+        if anchor in self.miasms:
+            counts[self.miasms.index(anchor)] += ANCHOR_WEIGHT
+        return self._distribution(counts)
+
+    def scores(self, case_profile: np.ndarray, affinities: np.ndarray) -> np.ndarray:
+        """Miasm match of one case profile against a (remedy x miasm) affinity matrix"""
+        if not case_profile.any():
+            return np.full(len(affinities), NEUTRAL_SCORE, dtype=np.float32)
+        norms = np.linalg.norm(affinities, axis=1) * np.linalg.norm(case_profile)
+        norms[norms == 0] = 1.0
+        return (affinities @ case_profile / norms).astype(np.float32)
+
+    def score(self, case_profile: np.ndarray, affinity: np.ndarray) -> float:
+        return float(self.scores(case_profile, affinity[None, :])[0])
+
+
+@lru_cache(maxsize=1)
+def _anchor_ids() -> Dict[int, str]:
+    registry = get_registry()
+    ids = {}
+    for name, miasm in ANCHOR_REMEDIES.items():
+        remedy_id = registry.resolve(name)
+        if remedy_id is not None:
+            ids[remedy_id] = miasm
+    return ids
+
+
+@lru_cache(maxsize=1)
+def get_miasm_classifier() -> MiasmClassifier:
+    """Process-wide classifier over the core plus extended lexicons"""
+    lexicon = {m: MIASMS[m] + EXTENDED_INDICATORS.get(m, []) for m in MIASMS}
+    return MiasmClassifier(lexicon)
@@ -0,0 +1,175 @@
+"""
+Structured modality engine
+Case and Materia Medica modalities are parsed against a trigger x direction lexicon
+into compact bit vectors, so comparing a case with every remedy is a few bit operations
+"""
+import re
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from common.normalize import keyword_form, normalize_phrase
+
+from .case_features import case_features
+from .utils import as_list
+
+# Trigger -> phrases that express it. A trigger fires when every token of one of
+# its phrases appears in a modality clause.
+MODALITY_LEXICON: Dict[str, List[str]] = {
+    "heat": ["heat", "summer", "stuffy", "closed room", "wrapping", "covering", "bed heat"],
+    "cold": ["cold", "cool", "winter", "draft", "uncovering", "wind", "ice"],
+    "damp": ["damp", "wet", "rain", "humid", "bathing", "washing"],
+    "weather_change": ["storm", "thunder", "change weather", "changes"],
+    "open_air": ["open air", "fresh air", "outdoors", "fanning"],
+    "sun": ["sun", "seashore", "sea"],
+    "motion": ["motion", "exertion", "ascending", "riding", "boat", "jar"],
+    "rest": ["rest", "sitting", "standing", "keeping still"],
+    "lying": ["lying", "turning bed", "position"],
+    "touch": ["touch", "rubbing"],
+    "pressure": ["pressure", "bending double", "tight clothing"],
+    "morning": ["morning", "waking", "wake"],
+    "afternoon": ["afternoon"],
+    "evening": ["evening", "twilight"],
+    "night": ["night", "midnight", "dark", "darkness"],
+    "sleep": ["sleep"],
+    "eating": ["eating", "food", "meal", "milk", "fat", "sweet", "drink"],
+    "consolation": ["consolation"],
+    "company": ["company"],
+    "sensory": ["noise", "music", "light", "odor", "smell"],
+    "emotion": ["emotion", "anger", "grief", "fright", "excitement", "anxiety", "mental exertion", "bad news", "indignation"],
+    "menses": ["menses", "menopause"],
+    "stimulants": ["coffee", "stimulant", "wine", "alcohol", "tobacco"],
+    "discharge": ["discharge", "flow", "eruption"],
+    "left_side": ["left side"],
+    "right_side": ["right side"],
+}
+
+TRIGGERS = list(MODALITY_LEXICON)
+
+# Clock times ("4 pm" normalizes to the token 4pm) fire the time-of-day trigger of their hour
+_CLOCK_TOKEN_RE = re.compile(r"^(\d{1,2})(am|pm)$")
+_CLOCK_PERIODS = (("night", 0, 5), ("morning", 5, 12), ("afternoon", 12, 18),
+                  ("evening", 18, 21), ("night", 21, 24))
+
+# Bit layout: trigger i sets bit i when worse, bit i + DIRECTION_SHIFT when better
+DIRECTION_SHIFT = 32
+WORSE = "worse"
+BETTER = "better"
+_LOW_MASK = (1 << DIRECTION_SHIFT) - 1
+
+# Weight of a contradicted modality (case worse, remedy better or vice versa)
+CONTRADICTION_PENALTY = 1.0
+
+assert len(TRIGGERS) <= DIRECTION_SHIFT, "modality lexicon exceeds the bit layout"
+
+_TRIGGER_FORMS = [
+    (i, keyword_form(phrase))
+    for i, trigger in enumerate(TRIGGERS)
+    for phrase in MODALITY_LEXICON[trigger]
+]
+_TRIGGER_INDEX = {trigger: i for i, trigger in enumerate(TRIGGERS)}
+_WORSE_TOKEN = next(iter(keyword_form(WORSE)))
+_BETTER_TOKEN = next(iter(keyword_form(BETTER)))
+
+
+def _clock_trigger(token: str) -> Optional[int]:
+    """Trigger index of a clock-time token (4pm -> afternoon, 3am -> night), None otherwise"""
+    match = _CLOCK_TOKEN_RE.match(token)
+    if not match or not 1 <= int(match.group(1)) <= 12:
+        return None
+    hour = int(match.group(1)) % 12 + (12 if match.group(2) == "pm" else 0)
+    return next(_TRIGGER_INDEX[t] for t, start, end in _CLOCK_PERIODS if start <= hour < end)
+
+
+def _clause_bits(text: str, direction: Optional[str]) -> int:
+    tokens = normalize_phrase(text)
+    # A direction word inside the clause overrides the field it came from
+    if _WORSE_TOKEN in tokens:
+        direction = WORSE
+    elif _BETTER_TOKEN in tokens:
+        direction = BETTER
+    if direction is None:
+        return 0
+
+    shift = DIRECTION_SHIFT if direction == BETTER else 0
+    bits = 0
+    for i, form in _TRIGGER_FORMS:
+        if form <= tokens:
+            bits |= 1 << (i + shift)
+    for token in tokens:
+        i = _clock_trigger(token)
+        if i is not None:
+            bits |= 1 << (i + shift)
+    return bits
+
+
+def encode_modalities(texts: Iterable[str], direction: Optional[str] = None) -> int:
+    """
+    Bit vector for modality texts. `direction` is the default for clauses that
+    carry no 'worse'/'better' word; without one such clauses are ignored.
+    """
+    bits = 0
+    for text in texts:
+        for clause in str(text).split(","):
+            bits |= _clause_bits(clause, direction)
+    return bits
+
+
+def case_modality_bits(case_data: Dict) -> int:
+    """Modalities of a case: particulars' better/worse lists plus thermal and general statements"""
+    case = case_features(case_data)
+    return case.cached("modality_bits", lambda: _case_bits(case))
+
+
+def _case_bits(case) -> int:
+    bits = 0
+    for particular in case["particulars"]:
+        bits |= encode_modalities(particular["modalities_worse"], WORSE)
+        bits |= encode_modalities(particular["modalities_better"], BETTER)
+    bits |= encode_modalities(as_list(case["thermal"]))
+    bits |= encode_modalities(case["generals"])
+    return bits
+
+
+def _swap_directions(bits):
+    """Worse bits become better bits and vice versa (int or uint64 array)"""
+    if isinstance(bits, np.ndarray):
+        shift = np.uint64(DIRECTION_SHIFT)
+        return ((bits & np.uint64(_LOW_MASK)) << shift) | (bits >> shift)
+    return ((bits & _LOW_MASK) << DIRECTION_SHIFT) | (bits >> DIRECTION_SHIFT)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits per uint64 (np.bitwise_count needs NumPy 2.0; unpack the bytes on 1.26)"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1, dtype=np.uint8)
+
+
+def modality_scores(case_bits: int, remedy_bits: np.ndarray) -> np.ndarray:
+    """
+    Modality agreement of one case with every remedy, in [-1, 1].
+    Shared trigger/direction bits count for, contradicted ones against.
+    """
+    total = bin(case_bits).count("1")
+    if not total:
+        return np.zeros(len(remedy_bits), dtype=np.float32)
+    case = np.uint64(case_bits)
+    agree = _popcount(remedy_bits & case)
+    contradict = _popcount(remedy_bits & np.uint64(_swap_directions(case_bits)))
+    scores = (agree - CONTRADICTION_PENALTY * contradict) / total
+    return np.clip(scores, -1.0, 1.0).astype(np.float32)
+
+
+def modality_score(case_bits: int, remedy_bits: int) -> float:
+    """Single-remedy form of modality_scores"""
+    return float(modality_scores(case_bits, np.array([remedy_bits], dtype=np.uint64))[0])
+
+
+def describe(bits: int) -> Dict[str, List[str]]:
+    """Readable triggers of a bit vector: {'worse': [...], 'better': [...]}"""
+    return {
+        WORSE: [t for i, t in enumerate(TRIGGERS) if bits >> i & 1],
+        BETTER: [t for i, t in enumerate(TRIGGERS) if bits >> (i + DIRECTION_SHIFT) & 1],
+    }
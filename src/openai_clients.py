@@ -0,0 +1,143 @@
+"""
+Shared OpenAI clients
+One process-wide provider hands out a sync client and one async client per event loop,
+each on a pooled HTTP connection with keep-alive, so warm requests reuse an open TLS
+connection instead of paying the handshake again
+"""
+import asyncio
+import os
+import threading
+import weakref
+from typing import Optional
+
+try:
+    from openai import OpenAI, AsyncOpenAI
+except Exception:
+    OpenAI = None
+    AsyncOpenAI = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 5))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", 10))
+# Seconds an idle connection stays open for reuse
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 120))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+
+
+class ClientProvider:
+    """
+    Builds OpenAI clients once and reuses them. `base_url` (or OPENAI_BASE_URL) points
+    the clients elsewhere, e.g. at a local stand-in server in tests; `http_client` /
+    `async_http_client_factory` replace the pooled transports entirely.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = OPENAI_TIMEOUT, connect_timeout: float = OPENAI_CONNECT_TIMEOUT,
+                 max_connections: int = OPENAI_MAX_CONNECTIONS, max_keepalive: int = OPENAI_MAX_KEEPALIVE,
+                 keepalive_expiry: float = OPENAI_KEEPALIVE_EXPIRY, max_retries: int = OPENAI_MAX_RETRIES,
+                 http_client=None, async_http_client_factory=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.max_retries = max_retries
+        self._http_client = http_client
+        self._async_http_client_factory = async_http_client_factory
+        self._lock = threading.Lock()
+        self._sync = None
+        # Async connections belong to the loop that opened them
+        self._async = weakref.WeakKeyDictionary()
+
+    def _options(self) -> dict:
+        return {
+            "api_key": self.api_key or os.getenv("OPENAI_API_KEY"),
+            "base_url": self.base_url or os.getenv("OPENAI_BASE_URL") or None,
+            "max_retries": self.max_retries,
+        }
+
+    def _pool_options(self) -> dict:
+        return {
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            "limits": httpx.Limits(max_connections=self.max_connections,
+                                   max_keepalive_connections=self.max_keepalive,
+                                   keepalive_expiry=self.keepalive_expiry),
+        }
+
+    def client(self):
+        """The shared sync client (thread-safe)"""
+        if OpenAI is None:
+            raise RuntimeError("openai package not installed")
+        if self._sync is None:
+            with self._lock:
+                if self._sync is None:
+                    http_client = self._http_client
+                    if http_client is None and httpx is not None:
+                        http_client = httpx.Client(**self._pool_options())
+                    self._sync = OpenAI(http_client=http_client, **self._options())
+        return self._sync
+
+    def async_client(self):
+        """The async client of the running event loop"""
+        if AsyncOpenAI is None:
+            raise RuntimeError("openai package not installed")
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async.get(loop)
+            if client is None:
+                if self._async_http_client_factory is not None:
+                    http_client = self._async_http_client_factory()
+                elif httpx is not None:
+                    http_client = httpx.AsyncClient(**self._pool_options())
+                else:
+                    http_client = None
+                client = AsyncOpenAI(http_client=http_client, **self._options())
+                self._async[loop] = client
+        return client
+
+    async def aclose(self):
+        """Close the running event loop's async client (call before the loop goes away)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async.pop(loop, None)
+        if client is not None:
+            await client.close()
+
+    def close(self):
+        """Close the sync client; async clients are closed on their own loop with aclose()"""
+        with self._lock:
+            if self._sync is not None:
+                self._sync.close()
+                self._sync = None
+
+
+_provider = ClientProvider()
+
+
+def get_provider() -> ClientProvider:
+    return _provider
+
+
+def set_provider(provider: ClientProvider) -> ClientProvider:
+    """Install a provider (e.g. one pointed at a test server); returns the previous one"""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
+
+
+def get_client():
+    """Shared sync OpenAI client"""
+    return _provider.client()
+
+
+def get_async_client():
+    """Shared AsyncOpenAI client for the running event loop"""
+    return _provider.async_client()
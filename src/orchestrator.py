@@ -4,57 +4,95 @@ CaseTaker → Repertory → MateriaMedica → Differential → Prescription →
 """
 import os
 import json
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+from common.llm_cache import cache_for
+from common.normalize import normalize_text
+from common.prompt_budget import PROMPT_CONTEXT_TOKENS, budget_context
+from common.singleflight import SingleFlight, request_key
 
 from .repertory import repertorize
 from .safety import has_red_flags
-from .embeddings import search as mm_search
-from .clinical_engine import get_clinical_recommendation
-from .intelligent_questioning import should_ask_more_questions, IntelligentQuestioner
+from .embeddings import search as mm_search, lexical_search
+from .clinical_engine import get_clinical_recommendation, matched_keynotes
+from .intelligent_questioning import IntelligentQuestioner
+from .remedies import get_registry
+from .case_features import case_features
+from .utils import as_list
+from .openai_clients import get_client
+from .rationale import FAST_PATH_CONFIDENCE, render_differential, use_fast_path
+from .deadline import (MIN_LLM_BUDGET, MIN_MM_BUDGET, bounded, budget_allows, deadline, degrade, failure_reason,
+                       stage_timeout)
+from .tracing import span
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_HIGH_REASONING = os.getenv("OPENAI_HIGH_REASONING", "gpt-4o")
 REPERTORY_PATH = os.getenv("REPERTORY_PATH", "data/repertory_mapping.csv")
 
+# Identical concurrent LLM calls share one computation
+_llm_flights = SingleFlight("llm")
 
-def load_prompt(filename: str) -> str:
-    """Load prompt from prompts/ directory"""
-    path = os.path.join("prompts", filename)
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
-    return ""
+
+@lru_cache(maxsize=32)
+def _read_prompt(path: str, mtime: float) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
 
 
-def _client():
-    if OpenAI is None:
-        raise RuntimeError("openai package not installed")
-    return OpenAI(api_key=OPENAI_API_KEY)
+def load_prompt(filename: str) -> str:
+    """Load prompt from prompts/ directory (read once per file version)"""
+    path = os.path.join("prompts", filename)
+    try:
+        return _read_prompt(path, os.path.getmtime(path))
+    except OSError:
+        return ""
 
 
-def call_llm(system_prompt: str, user_message: str, model: str = None, temperature: float = 0.3) -> str:
-    """Call OpenAI Chat Completions API"""
-    client = _client()
+def call_llm(system_prompt: str, user_message: str, model: str = None, temperature: float = 0.3,
+             use_cache: bool = True) -> str:
+    """
+    Call OpenAI Chat Completions API (through the response cache unless use_cache=False).
+    An identical call already in flight is awaited and its reply shared.
+    """
     model = model or OPENAI_MODEL
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ],
-        temperature=temperature
-    )
-    return response.choices[0].message.content
+    with span("llm.chat", model=model) as s:
+        llm_cache = cache_for(temperature, use_cache)
+        if llm_cache is not None:
+            key = llm_cache.key(model, temperature, system_prompt, user_message)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                s.set(cache="hit")
+                return cached
+        s.set(cache="miss" if llm_cache is not None else "bypass")
+        
+        def complete():
+            client = bounded(get_client())
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=temperature
+            )
+            return response.choices[0].message.content, response.usage
+        
+        (content, usage), shared = _llm_flights.do(
+            request_key(model, temperature, system_prompt, user_message), complete,
+            timeout=stage_timeout(None)
+        )
+        if shared:
+            s.set(cache="shared")
+            return content
+        s.usage(usage)
+        if llm_cache is not None and content:
+            llm_cache.put(key, model, temperature, content)
+        return content
 
 
 def agent_case_taker(case_data: Dict) -> Dict:
@@ -62,6 +100,8 @@ def agent_case_taker(case_data: Dict) -> Dict:
     CaseTakerAgent: Validates and structures case data
     Returns structured case with any missing critical fields flagged
     """
+    case_data = case_features(case_data)
+    
     # Check for red flags first
     flags = has_red_flags(case_data)
     if flags:
@@ -85,7 +125,7 @@ def agent_case_taker(case_data: Dict) -> Dict:
     
     return {
         "status": "complete",
-        "case": case_data,
+        "case": case_data.to_dict(),
         "message": "Case data validated successfully."
     }
 
@@ -104,24 +144,59 @@ def agent_repertory(case_data: Dict) -> Dict:
     }
 
 
+def build_case_summary(case_data: Dict) -> str:
+    """Query text for Materia Medica searches"""
+    return f"{case_data.get('presenting_complaint', '')} {' '.join(case_data.get('mental_emotional', []))} {' '.join(case_data.get('generals', []))}"
+
+
+def mm_context_entry(candidate: Dict, results: List[Dict]) -> Dict:
+    return {
+        "remedy": candidate.get("name", ""),
+        "remedy_id": candidate.get("remedy_id"),
+        "score": candidate.get("score", 0),
+        "mm_excerpts": [r.get("excerpt", "") for r in results]
+    }
+
+
+def lexical_materia_medica(candidates: List[Dict], case_summary: str, reason: str) -> Dict:
+    """MateriaMedicaAgent fallback: lexical search only (deadline short or searches timed out)"""
+    degrade("materia_medica", "lexical", reason)
+    mm_context = []
+    for candidate in candidates[:3]:
+        results = lexical_search(f"{candidate.get('name', '')} {case_summary}", k=2)
+        if results:
+            mm_context.append(mm_context_entry(candidate, results))
+    return {
+        "status": "complete",
+        "mm_context": mm_context,
+        "degraded": reason,
+        "message": f"Retrieved Materia Medica context for {len(mm_context)} remedies (lexical search)."
+    }
+
+
 def agent_materia_medica(candidates: List[Dict], case_summary: str) -> Dict:
     """
     MateriaMedicaAgent: Cross-checks candidates with MM using embeddings
+    Falls back to lexical search when the request deadline is short.
     """
+    if not budget_allows(MIN_MM_BUDGET):
+        return lexical_materia_medica(candidates, case_summary, "budget")
+    
     # Search MM for each top candidate
     mm_context = []
     
     for candidate in candidates[:3]:  # Top 3 only
         remedy_name = candidate.get("name", "")
         search_query = f"{remedy_name} {case_summary}"
-        results = mm_search(search_query, k=2)
+        try:
+            results = mm_search(search_query, k=2)
+        except Exception as e:
+            if failure_reason(e) != "timeout":
+                raise
+            return lexical_materia_medica(candidates, case_summary, "timeout")
         
         if results:
-            mm_context.append({
-                "remedy": remedy_name,
-                "score": candidate.get("score", 0),
-                "mm_excerpts": [r.get("excerpt", "") for r in results]
-            })
+            mm_context.append(mm_context_entry(candidate, results))
     
     return {
         "status": "complete",
@@ -130,66 +205,160 @@ def agent_materia_medica(candidates: List[Dict], case_summary: str) -> Dict:
     }
 
 
-def agent_differential(case_data: Dict, repertory_result: Dict, mm_context: List[Dict]) -> Dict:
+def _parse_json_response(response: str) -> Dict:
+    """Extract the JSON object from an LLM reply (fenced or bare)"""
+    if "```json" in response:
+        json_start = response.find("```json") + 7
+        json_end = response.find("```", json_start)
+        json_str = response[json_start:json_end].strip()
+    elif "{" in response:
+        json_start = response.find("{")
+        json_end = response.rfind("}") + 1
+        json_str = response[json_start:json_end]
+    else:
+        json_str = response
+    return json.loads(json_str)
+
+
+# Static instructions of the differential stage (see differential_prefix)
+ENHANCE_INSTRUCTIONS = """# Task: Enhance the Clinical Recommendation
+The clinical engine has selected a remedy for the case in the user message.
+Please provide:
+1. Detailed rationale for why the selected remedy is indicated
+2. Key monitoring points specific to this remedy
+3. Wellness advice (diet, lifestyle, mental health) tailored to this case
+4. Expected timeline for response
+
+Return as JSON with fields: rationale (list), monitoring (list), wellness_advice (list), expected_response (string)"""
+
+ANALYSIS_INSTRUCTIONS = """# Task: Differential Analysis
+The user message gives the Materia Medica context, the top repertory candidates and the case.
+Based on classical homeopathy principles, analyze and recommend ONE remedy if ≥3 characteristic keynotes match.
+If insufficient evidence, request clarification."""
+
+
+def differential_prefix(instructions: str) -> str:
     """
-    DifferentialAgent: Uses advanced clinical engine + LLM for analysis
+    System prompt of the differential stage: system prompt, dosage policy and task
+    instructions, identical for every case so the provider can cache the prefix
+    """
+    parts = (load_prompt("system.txt"), load_prompt("dosage_policy.txt"), instructions)
+    return "\n\n".join(part.strip() for part in parts if part)
+
+
+def _case_summary(case_data: Dict, fields) -> str:
+    lines = []
+    for field, label in fields:
+        value = case_data.get(field)
+        text = value if isinstance(value, str) else ', '.join(as_list(value))
+        lines.append(f"{label}: {text or 'N/A'}")
+    return "\n".join(lines)
+
+
+ENHANCE_CASE_FIELDS = (
+    ("presenting_complaint", "Presenting Complaint"), ("mental_emotional", "Mental/Emotional"),
+    ("generals", "Generals"), ("thermal", "Thermal"), ("past_history", "Past History"),
+    ("family_history", "Family History"), ("lifestyle", "Lifestyle"),
+)
+ANALYSIS_CASE_FIELDS = (
+    ("presenting_complaint", "Presenting Complaint"), ("mental_emotional", "Mental/Emotional"),
+    ("generals", "Generals"), ("thermal", "Thermal"), ("cravings", "Cravings"), ("aversions", "Aversions"),
+    ("sleep", "Sleep"), ("past_history", "Past History"), ("family_history", "Family History"),
+)
+
+
+def differential_request(case_data: Dict, repertory_result: Dict, mm_context: List[Dict],
+                         clinical_result: Dict, context_tokens: int = PROMPT_CONTEXT_TOKENS,
+                         full_context: Optional[bool] = None) -> Dict:
+    """
+    LLM request for the differential stage: enhancement of a clear clinical
+    recommendation, or a full analysis when the clinical engine couldn't decide.
+    Static material forms the system prompt and per-case data the user message,
+    ordered from most to least stable (MM context, candidates, case), so repeated
+    calls share the longest possible cached prefix.
+    The analysis prompt's candidates and Materia Medica context are fitted to
+    `context_tokens` (see prompt_budget; `full_context=True` sends them whole), and
+    the token report is returned as "context".
     """
-    # First, use clinical engine for rule-based analysis
-    clinical_result = get_clinical_recommendation(case_data, repertory_result, mm_context)
-    
     if clinical_result.get('status') == 'success':
         # We have a clear clinical recommendation
         # Now enhance with LLM for wellness advice and detailed rationale
-        system_prompt = load_prompt("system.txt")
-        dosage_policy = load_prompt("dosage_policy.txt")
-        
-        user_message = f"""
-# Clinical Analysis Complete
-
+        user_message = f"""# Clinical Analysis Complete
 Selected Remedy: {clinical_result['remedy']}
 Potency: {clinical_result['potency']}
 Confidence: {clinical_result['confidence']}
 Characteristic Symptoms: {', '.join(clinical_result.get('characteristic_symptoms', []))}
 
 # Case Summary
-Presenting Complaint: {case_data.get('presenting_complaint', 'N/A')}
-Mental/Emotional: {', '.join(case_data.get('mental_emotional', []))}
-Generals: {', '.join(case_data.get('generals', []))}
-Thermal: {case_data.get('thermal', 'N/A')}
-Past History: {', '.join(case_data.get('past_history', []))}
-Family History: {', '.join(case_data.get('family_history', []))}
-Lifestyle: {', '.join(case_data.get('lifestyle', []))}
+{_case_summary(case_data, ENHANCE_CASE_FIELDS)}
+"""
+        return {"system_prompt": differential_prefix(ENHANCE_INSTRUCTIONS), "user_message": user_message,
+                "temperature": 0.3}
+    
+    # Clinical engine couldn't decide - use LLM for analysis
+    candidates = repertory_result.get('candidates', [])[:5]
+    case_tokens = normalize_text(" ".join(
+        str(item) for field, _ in ANALYSIS_CASE_FIELDS for item in as_list(case_data.get(field))
+    ))
+    keynotes = {
+        entry.get("remedy", ""): [m["keynote"] for m in matched_keynotes(case_data, entry.get("remedy_id"))]
+        for entry in mm_context
+    }
+    candidates_text, mm_text, context = budget_context(case_tokens, candidates, mm_context, keynotes,
+                                                       context_tokens, full_context)
+    user_message = f"""# Materia Medica Context
+{mm_text}
 
-Please provide:
-1. Detailed rationale for why {clinical_result['remedy']} is indicated
-2. Key monitoring points specific to this remedy
-3. Wellness advice (diet, lifestyle, mental health) tailored to this case
-4. Expected timeline for response
+# Top Candidates
+{candidates_text}
 
-Return as JSON with fields: rationale (list), monitoring (list), wellness_advice (list), expected_response (string)
+# Case Summary
+{_case_summary(case_data, ANALYSIS_CASE_FIELDS)}
 """
-        
+    return {"system_prompt": differential_prefix(ANALYSIS_INSTRUCTIONS), "user_message": user_message,
+            "temperature": 0.2, "context": context}
+
+
+def _clinical_only_result(clinical_result: Dict) -> Dict:
+    """Differential result from the clinical engine alone (LLM unavailable)"""
+    return {
+        "status": "complete",
+        "remedy": clinical_result['remedy'],
+        "remedy_id": clinical_result.get('remedy_id'),
+        "potency": clinical_result['potency'],
+        "confidence": clinical_result['confidence'],
+        "rationale": [clinical_result.get('reasoning', '')],
+        "matched_keynotes": clinical_result.get('characteristic_symptoms', []),
+        "monitoring": clinical_result.get('clinical_notes', []),
+        "needs_clarification": False,
+        "clarification_questions": [],
+        "wellness_advice": ["Maintain regular sleep schedule", "Eat fresh, wholesome foods", "Practice stress management"],
+        "expected_response": clinical_result.get('repetition', ''),
+        "rationale_source": "clinical"
+    }
+
+
+def finish_differential(clinical_result: Dict, response: str, context: Optional[Dict] = None) -> Dict:
+    """
+    Combine the clinical recommendation with the LLM reply to differential_request
+    (whose prompt token report, if any, is kept as "prompt_context")
+    """
+    result = _finish_differential(clinical_result, response)
+    if context:
+        result["prompt_context"] = context
+    return result
+
+
+def _finish_differential(clinical_result: Dict, response: str) -> Dict:
+    if clinical_result.get('status') == 'success':
         try:
-            response = call_llm(system_prompt, user_message, model=OPENAI_HIGH_REASONING, temperature=0.3)
-            
-            # Parse JSON
-            if "```json" in response:
-                json_start = response.find("```json") + 7
-                json_end = response.find("```", json_start)
-                json_str = response[json_start:json_end].strip()
-            elif "{" in response:
-                json_start = response.find("{")
-                json_end = response.rfind("}") + 1
-                json_str = response[json_start:json_end]
-            else:
-                json_str = response
-            
-            llm_enhancement = json.loads(json_str)
+            llm_enhancement = _parse_json_response(response)
             
             # Combine clinical + LLM results
             return {
                 "status": "complete",
                 "remedy": clinical_result['remedy'],
+                "remedy_id": clinical_result.get('remedy_id'),
                 "potency": clinical_result['potency'],
                 "confidence": clinical_result['confidence'],
                 "rationale": llm_enhancement.get('rationale', [clinical_result.get('reasoning', '')]),
@@ -200,83 +369,75 @@ Return as JSON with fields: rationale (list), monitoring (list), wellness_advice
                 "wellness_advice": llm_enhancement.get('wellness_advice', []),
                 "expected_response": llm_enhancement.get('expected_response', clinical_result.get('repetition', '')),
                 "differential": clinical_result.get('differential_diagnosis', []),
-                "clinical_confidence": clinical_result['confidence']
-            }
-            
-        except Exception as e:
-            # If LLM fails, return clinical result alone
-            return {
-                "status": "complete",
-                "remedy": clinical_result['remedy'],
-                "potency": clinical_result['potency'],
-                "confidence": clinical_result['confidence'],
-                "rationale": [clinical_result.get('reasoning', '')],
-                "matched_keynotes": clinical_result.get('characteristic_symptoms', []),
-                "monitoring": clinical_result.get('clinical_notes', []),
-                "needs_clarification": False,
-                "clarification_questions": [],
-                "wellness_advice": ["Maintain regular sleep schedule", "Eat fresh, wholesome foods", "Practice stress management"],
-                "expected_response": clinical_result.get('repetition', '')
+                "clinical_confidence": clinical_result['confidence'],
+                "rationale_source": "llm"
             }
+        except Exception:
+            # If the reply is unusable, return clinical result alone
+            return _clinical_only_result(clinical_result)
     
-    else:
-        # Clinical engine couldn't decide - use LLM for analysis
-        system_prompt = load_prompt("system.txt")
-        dosage_policy = load_prompt("dosage_policy.txt")
+    try:
+        result = _parse_json_response(response)
+        # The LLM may answer "Nat Mur" or "Natrum mur. 200C" - intern to the registry name
+        registry = get_registry()
+        remedy_id = registry.resolve(result.get("remedy"))
+        if remedy_id is not None:
+            result["remedy"] = registry.name(remedy_id)
+        result["remedy_id"] = remedy_id
+        result["status"] = "complete"
+        result["clinical_confidence"] = 0.5  # Lower confidence when clinical engine couldn't decide
+        return result
         
-        user_message = f"""
-# Case Summary
-Presenting Complaint: {case_data.get('presenting_complaint', 'N/A')}
-Mental/Emotional: {', '.join(case_data.get('mental_emotional', []))}
-Generals: {', '.join(case_data.get('generals', []))}
-Thermal: {case_data.get('thermal', 'N/A')}
-Cravings: {', '.join(case_data.get('cravings', []))}
-Aversions: {', '.join(case_data.get('aversions', []))}
-Sleep: {', '.join(case_data.get('sleep', []))}
-Past History: {', '.join(case_data.get('past_history', []))}
-Family History: {', '.join(case_data.get('family_history', []))}
+    except json.JSONDecodeError:
+        return {
+            "status": "complete",
+            "remedy": None,
+            "potency": None,
+            "rationale": ["Unable to determine clear remedy. More symptoms needed."],
+            "matched_keynotes": [],
+            "monitoring": [],
+            "needs_clarification": True,
+            "clarification_questions": ["Please provide more detailed mental/emotional symptoms", "Describe modalities (what makes symptoms better or worse)"],
+            "wellness_advice": []
+        }
 
-# Top Candidates
-{json.dumps(repertory_result.get('candidates', [])[:5], indent=2)}
 
-# Materia Medica Context
-{json.dumps(mm_context, indent=2)}
+def template_differential(case_data: Dict, clinical_result: Dict, reason: str) -> Dict:
+    """Template rationale in place of the LLM enhancement (deadline short or LLM failed)"""
+    degrade("differential", "template", reason)
+    return dict(render_differential(case_data, clinical_result), degraded=reason)
 
-Based on classical homeopathy principles, analyze and recommend ONE remedy if ≥3 characteristic keynotes match.
-If insufficient evidence, request clarification.
-"""
-        
-        try:
-            response = call_llm(system_prompt, user_message, model=OPENAI_HIGH_REASONING, temperature=0.2)
-            
-            if "```json" in response:
-                json_start = response.find("```json") + 7
-                json_end = response.find("```", json_start)
-                json_str = response[json_start:json_end].strip()
-            elif "{" in response:
-                json_start = response.find("{")
-                json_end = response.rfind("}") + 1
-                json_str = response[json_start:json_end]
-            else:
-                json_str = response
-            
-            result = json.loads(json_str)
-            result["status"] = "complete"
-            result["clinical_confidence"] = 0.5  # Lower confidence when clinical engine couldn't decide
-            return result
-            
-        except json.JSONDecodeError:
-            return {
-                "status": "complete",
-                "remedy": None,
-                "potency": None,
-                "rationale": ["Unable to determine clear remedy. More symptoms needed."],
-                "matched_keynotes": [],
-                "monitoring": [],
-                "needs_clarification": True,
-                "clarification_questions": ["Please provide more detailed mental/emotional symptoms", "Describe modalities (what makes symptoms better or worse)"],
-                "wellness_advice": []
-            }
+
+def agent_differential(case_data: Dict, repertory_result: Dict, mm_context: List[Dict],
+                       clinical_result: Dict = None,
+                       fast_path_confidence: float = FAST_PATH_CONFIDENCE) -> Dict:
+    """
+    DifferentialAgent: Uses advanced clinical engine + LLM for analysis.
+    A clinical recommendation at or above `fast_path_confidence` is written up
+    from templates without calling the LLM (see enhance_differential); so is one
+    whose LLM enhancement would not fit the request deadline or fails.
+    """
+    # First, use clinical engine for rule-based analysis
+    if clinical_result is None:
+        clinical_result = get_clinical_recommendation(case_data, repertory_result, mm_context)
+    
+    if use_fast_path(clinical_result, fast_path_confidence):
+        return render_differential(case_data, clinical_result)
+    
+    clinical_success = clinical_result.get('status') == 'success'
+    if clinical_success and not budget_allows(MIN_LLM_BUDGET):
+        return template_differential(case_data, clinical_result, "budget")
+    
+    request = differential_request(case_data, repertory_result, mm_context, clinical_result)
+    try:
+        response = call_llm(request["system_prompt"], request["user_message"],
+                            model=OPENAI_HIGH_REASONING, temperature=request["temperature"])
+    except Exception as e:
+        if clinical_success:
+            return template_differential(case_data, clinical_result, failure_reason(e))
+        raise
+    
+    return finish_differential(clinical_result, response, request.get("context"))
 
 
 def agent_prescription(differential_result: Dict) -> Dict:
@@ -304,108 +465,55 @@ def agent_prescription(differential_result: Dict) -> Dict:
         "status": "complete",
         "prescription": {
             "remedy": remedy,
+            "remedy_id": differential_result.get("remedy_id"),
             "potency": differential_result.get("potency"),
             "rationale": differential_result.get("rationale", []),
             "matched_keynotes": differential_result.get("matched_keynotes", []),
             "monitoring": differential_result.get("monitoring", []),
-            "wellness_advice": differential_result.get("wellness_advice", [])
+            "wellness_advice": differential_result.get("wellness_advice", []),
+            "expected_response": differential_result.get("expected_response"),
+            "clinical_confidence": differential_result.get("clinical_confidence", differential_result.get("confidence")),
+            "differential": differential_result.get("differential", []),
+            "rationale_source": differential_result.get("rationale_source", "llm")
         },
         "disclaimer": disclaimer,
         "message": f"Prescription: {remedy} {differential_result.get('potency', '')}"
     }
 
 
-def run_full_case_workflow(case_data: Dict, skip_questioning: bool = False) -> Dict:
+def run_full_case_workflow(case_data: Dict, skip_questioning: bool = False, use_cache: bool = True,
+                           deadline_s: float = None) -> Dict:
     """
     Orchestrates the complete workflow:
-    CaseTaker → Repertory → MateriaMedica → Differential → Prescription
+    CaseTaker → Repertory → (MateriaMedica ‖ Questioning ‖ Clinical) → Differential → Prescription
+    Blocking form of async_orchestrator.run_full_case_workflow_async, which holds the one
+    implementation (memo, stage reuse, deadline, trace and coalescing of identical runs).
     """
-    workflow_result = {
-        "steps": [],
-        "final_result": None
-    }
-    
-    # Step 1: Case Taking
-    case_result = agent_case_taker(case_data)
-    workflow_result["steps"].append({"agent": "CaseTaker", "result": case_result})
-    
-    if case_result["status"] == "emergency":
-        workflow_result["final_result"] = case_result
-        return workflow_result
-    
-    if case_result["status"] == "incomplete":
-        workflow_result["final_result"] = case_result
-        return workflow_result
-    
-    # Step 2: Repertorization
-    repertory_result = agent_repertory(case_data)
-    workflow_result["steps"].append({"agent": "Repertory", "result": repertory_result})
-    
-    if not repertory_result.get("top_candidates"):
-        workflow_result["final_result"] = {
-            "status": "no_candidates",
-            "message": "No matching remedies found. Please provide more detailed symptoms."
-        }
+    from .async_orchestrator import run_full_case_workflow_sync
+    return run_full_case_workflow_sync(case_data, skip_questioning, use_cache=use_cache, deadline_s=deadline_s)
+
+
+def enhance_differential(case_data: Dict, workflow_result: Dict, deadline_s: float = None) -> Dict:
+    """
+    Fetch the LLM-written rationale for a workflow answered from templates.
+    Re-runs the differential with the LLM (within `deadline_s`) and returns a copy
+    of the workflow result with its Differential and Prescription steps replaced.
+    """
+    steps = {step["agent"]: step["result"] for step in workflow_result.get("steps", [])}
+    if "Repertory" not in steps:
         return workflow_result
     
-    # Step 3: Materia Medica Search
-    case_summary = f"{case_data.get('presenting_complaint', '')} {' '.join(case_data.get('mental_emotional', []))} {' '.join(case_data.get('generals', []))}"
-    mm_result = agent_materia_medica(repertory_result["top_candidates"], case_summary)
-    workflow_result["steps"].append({"agent": "MateriaMedica", "result": mm_result})
-    
-    # Step 4: Check if more questions needed before differential (unless skipped for test cases)
-    top_remedy_names = [r['name'] for r in repertory_result["top_candidates"][:3]]
-    
-    if not skip_questioning:
-        should_ask, question_analysis = should_ask_more_questions(
-            case_data, 
-            confidence=0.5,  # Initial confidence before differential
-            top_remedies=top_remedy_names
-        )
-        
-        if should_ask and question_analysis['completeness_score'] < 0.6:
-            # Case too incomplete - ask questions first
-            workflow_result["final_result"] = {
-                "status": "needs_more_information",
-                "message": question_analysis['reason'],
-                "completeness_score": question_analysis['completeness_score'],
-                "questions_to_ask": question_analysis['questions_to_ask'],
-                "estimated_questions": question_analysis['estimated_questions_needed']
-            }
-            workflow_result["steps"].append({
-                "agent": "IntelligentQuestioner",
-                "result": {
-                    "status": "questions_required",
-                    "message": f"Need {question_analysis['estimated_questions_needed']} clarifying questions"
-                }
-            })
-            return workflow_result
-    
-    # Step 5: Differential Analysis
-    differential_result = agent_differential(case_data, repertory_result["repertory"], mm_result["mm_context"])
-    workflow_result["steps"].append({"agent": "Differential", "result": differential_result})
-    
-    # Step 6: Check if questions needed after differential (skip for test cases)
-    if not skip_questioning and differential_result.get("remedy"):
-        confidence = differential_result.get("clinical_confidence", differential_result.get("confidence", 0.5))
-        should_ask_post, post_question_analysis = should_ask_more_questions(
-            case_data,
-            confidence=confidence,
-            top_remedies=top_remedy_names
-        )
-        
-        if should_ask_post and confidence < 0.7:
-            # Add clarifying questions to result
-            differential_result["needs_clarification"] = True
-            differential_result["clarification_questions"] = [
-                q['question'] for q in post_question_analysis['questions_to_ask'][:5]
-            ]
-            differential_result["clarification_reason"] = post_question_analysis['reason']
-    
-    # Step 7: Prescription
+    mm_context = steps.get("MateriaMedica", {}).get("mm_context", [])
+    with deadline(deadline_s):
+        differential_result = agent_differential(case_data, steps["Repertory"]["repertory"], mm_context,
+                                                 fast_path_confidence=float("inf"))
     prescription_result = agent_prescription(differential_result)
-    workflow_result["steps"].append({"agent": "Prescription", "result": prescription_result})
-    
-    workflow_result["final_result"] = prescription_result
     
-    return workflow_result
+    replaced = {"Differential": differential_result, "Prescription": prescription_result}
+    enhanced = dict(workflow_result)
+    enhanced["steps"] = [
+        {"agent": step["agent"], "result": replaced.get(step["agent"], step["result"])}
+        for step in workflow_result["steps"]
+    ]
+    enhanced["final_result"] = prescription_result
+    return enhanced
@@ -0,0 +1,94 @@
+"""
+Template-rendered prescription text
+For a clear, high-confidence clinical recommendation the rationale, monitoring and
+wellness text are rendered from the matched keynotes, the remedy's Materia Medica
+profile and the clinical guidance tables, without an LLM call
+"""
+import os
+from typing import Dict, List
+
+from .clinical_guidance import generate_comprehensive_guidance
+from .modalities import case_modality_bits, describe
+from .remedy_profiles import get_profile
+
+# Clinical confidence at or above which the differential skips the LLM
+# (set above 1 to always call it)
+FAST_PATH_CONFIDENCE = float(os.getenv("FAST_PATH_CONFIDENCE", 0.8))
+
+MAX_KEYNOTE_LINES = 5
+MAX_PROFILE_LINES = 2
+
+
+def use_fast_path(clinical_result: Dict, threshold: float = FAST_PATH_CONFIDENCE) -> bool:
+    return clinical_result.get('status') == 'success' and clinical_result.get('confidence', 0) >= threshold
+
+
+def _rationale(case_data: Dict, clinical_result: Dict) -> List[str]:
+    remedy = clinical_result['remedy']
+    symptoms = clinical_result.get('characteristic_symptoms', [])
+    lines = [f"{remedy} covers {len(symptoms)} characteristic symptoms of this case "
+             f"(clinical confidence {int(clinical_result.get('confidence', 0) * 100)}%)"]
+
+    for match in clinical_result.get('keynote_matches', [])[:MAX_KEYNOTE_LINES]:
+        lines.append(f"{match['symptom']} - matches the {remedy} keynote \"{match['keynote']}\"")
+
+    profile = get_profile(clinical_result.get('remedy_id') or remedy)
+    if profile is not None:
+        shared = describe(case_modality_bits(case_data) & profile.modality_bits)
+        modalities = [f"worse {t.replace('_', ' ')}" for t in shared['worse']]
+        modalities += [f"better {t.replace('_', ' ')}" for t in shared['better']]
+        if modalities:
+            lines.append(f"Modalities agree with {remedy}: {', '.join(modalities)}")
+        picture = (profile.mental or profile.keynotes)[:MAX_PROFILE_LINES]
+        if picture:
+            lines.append(f"Materia Medica picture of {remedy}: {'; '.join(picture)}")
+
+    differential = clinical_result.get('differential_diagnosis', [])
+    if differential:
+        runner_up = differential[0]
+        lines.append(f"Preferred over {runner_up['remedy']} "
+                     f"({len(symptoms)} vs {runner_up.get('match_count', 0)} characteristic matches)")
+    return lines
+
+
+def render_differential(case_data: Dict, clinical_result: Dict) -> Dict:
+    """
+    Differential result (same shape as the LLM-enhanced one) rendered from templates.
+    `rationale_source` is "template" so callers can offer the LLM text on demand.
+    """
+    remedy = clinical_result['remedy']
+    potency = clinical_result['potency']
+    guidance = generate_comprehensive_guidance(case_data, remedy, potency, 'general',
+                                               clinical_result.get('confidence', 0.5))
+    dosing = guidance['dosing_protocol']
+    timeline = guidance['healing_timeline']['timeline']
+    lifestyle = guidance['lifestyle_modifications']['general']
+
+    monitoring = list(clinical_result.get('clinical_notes', []))
+    monitoring += dosing['signs_remedy_working'][:3]
+    monitoring += dosing['when_to_repeat'][:2]
+    monitoring.append(f"Follow-up: {dosing['follow_up']}")
+
+    wellness = [note for note in guidance['dietary_guidance']['remedy_specific_notes']
+                if note != 'Follow general dietary guidelines']
+    wellness += [lifestyle['sleep'][1], lifestyle['exercise'][0], lifestyle['stress_management'][0]]
+
+    expected = ", ".join(f"{stage.replace('_', ' ')}: {span}" for stage, span in timeline.items())
+
+    return {
+        "status": "complete",
+        "remedy": remedy,
+        "remedy_id": clinical_result.get('remedy_id'),
+        "potency": potency,
+        "confidence": clinical_result['confidence'],
+        "rationale": _rationale(case_data, clinical_result),
+        "matched_keynotes": clinical_result.get('characteristic_symptoms', []),
+        "monitoring": monitoring,
+        "needs_clarification": False,
+        "clarification_questions": [],
+        "wellness_advice": wellness,
+        "expected_response": f"{clinical_result.get('repetition', '')}. Expected: {expected}".lstrip(". "),
+        "differential": clinical_result.get('differential_diagnosis', []),
+        "clinical_confidence": clinical_result['confidence'],
+        "rationale_source": "template"
+    }
@@ -0,0 +1,196 @@
+"""
+Canonical remedy registry
+Interns every remedy name (repertory, Materia Medica, LLM output) to a stable integer id
+"""
+import os
+import re
+from functools import lru_cache
+from itertools import product
+from typing import Dict, List, Optional, Iterable
+
+from .utils import load_materia_medica, load_repertory
+
+MM_DIR = os.getenv("MM_DIR", "data/materia_medica")
+REPERTORY_PATH = os.getenv("REPERTORY_PATH", "data/repertory_mapping.csv")
+
+# Classical abbreviations that cannot be derived from word prefixes alone
+ABBREVIATIONS = {
+    "calc": "Calcarea Carbonica",
+    "calc carb": "Calcarea Carbonica",
+    "merc": "Mercurius Solubilis",
+    "merc sol": "Mercurius Solubilis",
+    "nux": "Nux vomica",
+    "lyc": "Lycopodium",
+    "sil": "Silicea",
+    "carbo": "Carbo Vegetabilis",
+    "cinchona": "China Officinalis",
+    "hepar": "Hepar Sulphuris",
+    "tub": "Tuberculinum",
+    "ign": "Ignatia",
+}
+
+# Suffixes that never belong to a remedy name (potencies, scales)
+_POTENCY_RE = re.compile(r"\b\d+\s*(c|ch|x|d|m|lm|q)\b|\b(lm|q)\s*\d+\b")
+_PAREN_RE = re.compile(r"\(([^)]*)\)")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# Shortest prefix of the first word accepted as an abbreviation ("Ars", "Lyc", "Sep")
+MIN_ABBREV_LEN = 3
+
+
+def normalize_remedy_name(name: str) -> str:
+    """Lowercase, drop parentheticals and potencies, collapse punctuation to single spaces"""
+    text = _PAREN_RE.sub(" ", str(name).lower())
+    text = _POTENCY_RE.sub(" ", text)
+    return _NON_ALNUM_RE.sub(" ", text).strip()
+
+
+class RemedyRegistry:
+    """
+    Interned remedy identifiers with alias and abbreviation resolution.
+
+    Every spelling seen in the data is registered once into a hash index
+    (normalized alias -> id). Abbreviations such as "Nat Mur", "Nat-m", "Ars"
+    or "Puls" resolve through a second prebuilt index of word-prefix
+    combinations, so lookups never scan the remedy list.
+    """
+
+    def __init__(self):
+        self._names: List[str] = []
+        self._aliases: Dict[str, int] = {}
+        self._abbrev_index: Dict[str, Optional[int]] = {}
+        self._frozen = False
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def register(self, name: str, aliases: Iterable[str] = ()) -> int:
+        """Register a remedy (or return its existing id) and attach aliases"""
+        key = normalize_remedy_name(name)
+        if not key:
+            raise ValueError(f"Invalid remedy name: {name!r}")
+
+        remedy_id = self._aliases.get(key)
+        if remedy_id is None:
+            remedy_id = len(self._names)
+            self._names.append(_PAREN_RE.sub("", str(name)).strip())
+            self._aliases[key] = remedy_id
+            self._frozen = False
+
+        for alias in aliases:
+            alias_key = normalize_remedy_name(alias)
+            if alias_key:
+                self._aliases.setdefault(alias_key, remedy_id)
+        return remedy_id
+
+    def freeze(self) -> "RemedyRegistry":
+        """Build the abbreviation index; call once after all names are registered"""
+        index: Dict[str, Optional[int]] = {}
+        for alias, remedy_id in self._aliases.items():
+            for key in _prefix_keys(alias.split()):
+                if index.get(key, remedy_id) != remedy_id:
+                    index[key] = None  # ambiguous prefix, never resolved
+                else:
+                    index[key] = remedy_id
+
+        # Unique genus names ("Coffea", "Arnica") are valid aliases on their own
+        genus_ids: Dict[str, set] = {}
+        for alias, remedy_id in self._aliases.items():
+            genus_ids.setdefault(alias.split()[0], set()).add(remedy_id)
+        for genus, ids in genus_ids.items():
+            if len(ids) == 1:
+                self._aliases.setdefault(genus, next(iter(ids)))
+
+        for abbrev, target in ABBREVIATIONS.items():
+            target_id = self._aliases.get(normalize_remedy_name(target))
+            if target_id is not None:
+                index[abbrev] = target_id
+
+        self._abbrev_index = index
+        self._frozen = True
+        return self
+
+    def resolve(self, name: str) -> Optional[int]:
+        """Resolve any spelling, alias or abbreviation to a remedy id"""
+        if name is None:
+            return None
+        key = normalize_remedy_name(name)
+        if not key:
+            return None
+
+        remedy_id = self._aliases.get(key)
+        if remedy_id is not None:
+            return remedy_id
+
+        if not self._frozen:
+            self.freeze()
+        return self._abbrev_index.get(key)
+
+    def name(self, remedy_id: int) -> str:
+        """Canonical display name for an id"""
+        return self._names[remedy_id]
+
+    def canonical(self, name: str) -> str:
+        """Canonical display name for any spelling; unknown names pass through unchanged"""
+        remedy_id = self.resolve(name)
+        return self._names[remedy_id] if remedy_id is not None else name
+
+    def names(self) -> List[str]:
+        """Canonical names, indexed by remedy id"""
+        return list(self._names)
+
+
+def _prefix_keys(words: List[str]) -> Iterable[str]:
+    """All abbreviation keys for a tokenized name: 'nat m', 'nat mur', 'natr muriat', ..."""
+    if not words:
+        return []
+    first = [words[0][:i] for i in range(min(MIN_ABBREV_LEN, len(words[0])), len(words[0]) + 1)]
+    rest = [[w[:i] for i in range(1, len(w) + 1)] for w in words[1:3]]
+
+    keys = set(first)
+    for depth in range(1, len(rest) + 1):
+        for combo in product(first, *rest[:depth]):
+            keys.add(" ".join(combo))
+    return keys
+
+
+def build_registry(mm_dir: str = MM_DIR, repertory_path: str = REPERTORY_PATH) -> RemedyRegistry:
+    """
+    Build the registry from the MM monographs (canonical names) and the repertory
+    """
+    registry = RemedyRegistry()
+
+    if os.path.isdir(mm_dir):
+        for doc in sorted(load_materia_medica(mm_dir), key=lambda d: d["id"]):
+            header = remedy_header(doc["text"]) or doc["title"]
+            genus = normalize_remedy_name(header).split(" ")[0]
+            # "Tuberculinum (Tuberculinum Bovinum)" is a synonym, "Pulsatilla (Extended)" is not
+            synonyms = [p for p in _PAREN_RE.findall(header) if normalize_remedy_name(p).startswith(genus)]
+            aliases = [doc["title"]] + synonyms
+            registry.register(header, aliases)
+
+    if os.path.exists(repertory_path):
+        for row in load_repertory(repertory_path):
+            for rem in row["remedies"].split(";"):
+                rem = rem.strip()
+                if rem and registry.resolve(rem) is None:
+                    registry.register(rem)
+
+    return registry.freeze()
+
+
+def remedy_header(text: str) -> Optional[str]:
+    """Remedy name from the 'Remedy:' line of an MM monograph"""
+    match = re.search(r"^\s*Remedy:\s*(.+)$", text, re.MULTILINE)
+    return match.group(1).strip() if match else None
+
+
+@lru_cache(maxsize=4)
+def get_registry(mm_dir: str = MM_DIR, repertory_path: str = REPERTORY_PATH) -> RemedyRegistry:
+    """Process-wide registry, built once per (mm_dir, repertory_path)"""
+    return build_registry(mm_dir, repertory_path)
+
+
+def resolve_remedy(name: str) -> Optional[int]:
+    """Shortcut: resolve a remedy name against the default registry"""
+    return get_registry().resolve(name)
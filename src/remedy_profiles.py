@@ -0,0 +1,317 @@
+"""
+Precomputed remedy profiles
+Each Materia Medica monograph is parsed once into an immutable RemedyProfile
+"""
+import os
+import re
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Tuple, Union
+
+from common.normalize import normalize_text
+from common.workflow_cache import VERSION_CHECK_INTERVAL
+
+from .utils import load_materia_medica
+from .remedies import get_registry, remedy_header, MM_DIR
+from .modalities import BETTER, WORSE, encode_modalities
+from .miasms import get_miasm_classifier
+
+# "Keynotes:", "Mental/Emotional:", "Modalities: Worse heat; better open air."
+_SECTION_RE = re.compile(r"^([A-Z][A-Za-z /]+):\s*(.*)$")
+# "Worse: heat, sun", "worse heat, standing", "aggravation in warm rooms", "Better: open air"
+_MODALITY_RE = re.compile(r"\b(worse|aggravation|agg|better|amelioration|amel)\b\.?:?\s*(?:from|in|by|with)?\s*([^;.]*)", re.IGNORECASE)
+_WORSE_WORDS = {"worse", "aggravation", "agg"}
+
+SECTION_ALIASES = {
+    "keynotes": "keynotes",
+    "mental/emotional": "mental",
+    "mental": "mental",
+    "physical generals": "generals",
+    "generals": "generals",
+    "particulars": "particulars",
+    "modalities": "modalities",
+    "constitution": "constitution",
+    "clinical uses": "clinical_uses",
+    "additional clinical": "clinical_uses",
+    "relationship": "relationship",
+}
+
+
+@dataclass(frozen=True)
+class RemedyProfile:
+    """
+    Immutable, preprocessed view of one remedy's monograph(s).
+    Scorers read these fields directly instead of re-serializing remedy dicts.
+    """
+    remedy_id: int
+    name: str
+    text: str
+    tokens: FrozenSet[str]
+    keynotes: Tuple[str, ...] = ()
+    mental: Tuple[str, ...] = ()
+    generals: Tuple[str, ...] = ()
+    particulars: Tuple[str, ...] = ()
+    constitution: Tuple[str, ...] = ()
+    clinical_uses: Tuple[str, ...] = ()
+    worse: Tuple[str, ...] = ()
+    better: Tuple[str, ...] = ()
+    keynote_tokens: Tuple[FrozenSet[str], ...] = field(default=(), repr=False)
+    mental_tokens: FrozenSet[str] = field(default=frozenset(), repr=False)
+    general_tokens: FrozenSet[str] = field(default=frozenset(), repr=False)
+    modality_bits: int = field(default=0, repr=False)
+
+    @classmethod
+    def from_text(cls, remedy_id: int, name: str, text: str) -> "RemedyProfile":
+        sections = parse_monograph(text)
+        worse, better = parse_modalities(text)
+        keynotes = tuple(sections.get("keynotes", []))
+        mental = tuple(sections.get("mental", []))
+        generals = tuple(sections.get("generals", []))
+        return cls(
+            remedy_id=remedy_id,
+            name=name,
+            text=text.lower(),
+            tokens=frozenset(normalize_text(text)),
+            keynotes=keynotes,
+            mental=mental,
+            generals=generals,
+            particulars=tuple(sections.get("particulars", [])),
+            constitution=tuple(sections.get("constitution", [])),
+            clinical_uses=tuple(sections.get("clinical_uses", [])),
+            worse=tuple(worse),
+            better=tuple(better),
+            keynote_tokens=tuple(frozenset(normalize_text(k)) for k in keynotes),
+            # Short monographs put mental keynotes under Keynotes only
+            mental_tokens=frozenset(normalize_text(" ".join(mental or keynotes))),
+            general_tokens=frozenset(normalize_text(" ".join(generals + keynotes))),
+            modality_bits=encode_modalities(worse, WORSE) | encode_modalities(better, BETTER),
+        )
+
+    @classmethod
+    def from_dict(cls, remedy_data: Dict) -> "RemedyProfile":
+        """Profile for an ad-hoc remedy dict (e.g. an mm_context entry with excerpts)"""
+        registry = get_registry()
+        name = remedy_data.get("remedy") or remedy_data.get("name") or ""
+        remedy_id = remedy_data.get("remedy_id")
+        if remedy_id is None:
+            remedy_id = registry.resolve(name)
+        excerpts = remedy_data.get("mm_excerpts") or []
+        text = "\n".join(excerpts) if excerpts else str(remedy_data)
+        return cls.from_text(-1 if remedy_id is None else remedy_id, name, text)
+
+
+def parse_monograph(text: str) -> Dict[str, List[str]]:
+    """Split a monograph into named sections of items (bullets or inline text)"""
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("-"):
+            if current:
+                sections.setdefault(current, []).append(line.lstrip("- ").strip())
+            continue
+        match = _SECTION_RE.match(line)
+        if match:
+            name = match.group(1).strip().lower()
+            current = SECTION_ALIASES.get(name, name.replace(" ", "_"))
+            inline = match.group(2).strip()
+            if inline:
+                sections.setdefault(current, []).append(inline)
+    return sections
+
+
+def parse_modalities(text: str) -> Tuple[List[str], List[str]]:
+    """Worse/better items from every 'Worse: ...' / 'better ...' mention in a monograph"""
+    worse, better = [], []
+    for line in text.splitlines():
+        for match in _MODALITY_RE.finditer(line):
+            items = [i.strip() for i in match.group(2).split(",") if i.strip()]
+            target = worse if match.group(1).lower() in _WORSE_WORDS else better
+            for item in items:
+                if item.lower() not in (t.lower() for t in target):
+                    target.append(item)
+    return worse, better
+
+
+# MM directory -> (version, monotonic time it was checked)
+_versions: Dict[str, Tuple[float, float]] = {}
+
+
+def _mm_version(mm_dir: str) -> float:
+    """Latest monograph mtime, re-checked every VERSION_CHECK_INTERVAL seconds"""
+    now = time.monotonic()
+    version, checked = _versions.get(mm_dir, (None, 0.0))
+    if version is None or now - checked > VERSION_CHECK_INTERVAL:
+        version = _scan_mm_version(mm_dir)
+        _versions[mm_dir] = (version, now)
+    return version
+
+
+def _scan_mm_version(mm_dir: str) -> float:
+    if not os.path.isdir(mm_dir):
+        return 0.0
+    return max([os.path.getmtime(mm_dir)] + [os.path.getmtime(os.path.join(mm_dir, f)) for f in os.listdir(mm_dir)])
+
+
+@lru_cache(maxsize=4)
+def _load_profiles(mm_dir: str, version: float) -> Dict[int, RemedyProfile]:
+    registry = get_registry(mm_dir)
+    texts: Dict[int, List[str]] = {}
+    for doc in sorted(load_materia_medica(mm_dir), key=lambda d: d["id"]):
+        remedy_id = registry.resolve(remedy_header(doc["text"]) or doc["title"])
+        if remedy_id is not None:
+            texts.setdefault(remedy_id, []).append(doc["text"])
+    # Several monographs for one remedy (pulsatilla.md, pulsatilla_nigricans.md) merge
+    return {
+        remedy_id: RemedyProfile.from_text(remedy_id, registry.name(remedy_id), "\n\n".join(parts))
+        for remedy_id, parts in texts.items()
+    }
+
+
+def load_profiles(mm_dir: str = MM_DIR) -> Dict[int, RemedyProfile]:
+    """All remedy profiles keyed by remedy id, parsed once per MM directory version"""
+    version = _mm_version(mm_dir)
+    if not version:
+        return {}
+    return _load_profiles(mm_dir, version)
+
+
+def get_profile(remedy: Union[int, str], mm_dir: str = MM_DIR):
+    """Profile for a remedy id or any remedy name; None when there is no monograph"""
+    remedy_id = remedy if isinstance(remedy, int) else get_registry().resolve(remedy)
+    return load_profiles(mm_dir).get(remedy_id)
+
+
+def as_profile(remedy_data: Union[RemedyProfile, Dict]) -> RemedyProfile:
+    """Accept either a prebuilt profile or a legacy remedy dict"""
+    if isinstance(remedy_data, RemedyProfile):
+        return remedy_data
+    return RemedyProfile.from_dict(remedy_data)
+
+
+class RemedyMatrix:
+    """
+    Remedy x token incidence matrix compiled from all profiles.
+    Case features multiply against it to score every remedy in one product.
+    """
+
+    def __init__(self, profiles: Dict[int, RemedyProfile]):
+        self.profiles = [profiles[k] for k in sorted(profiles)]
+        self.remedy_ids = [p.remedy_id for p in self.profiles]
+        vocab = sorted(set().union(*(p.tokens for p in self.profiles))) if self.profiles else []
+        self.vocab = {tok: i for i, tok in enumerate(vocab)}
+        self.matrix = np.zeros((len(self.profiles), len(vocab)), dtype=np.float32)
+        for row, profile in enumerate(self.profiles):
+            self.matrix[row, [self.vocab[t] for t in profile.tokens]] = 1.0
+        self.modality_bits = np.array([p.modality_bits for p in self.profiles], dtype=np.uint64)
+        classifier = get_miasm_classifier()
+        self.miasm_affinity = np.array(
+            [classifier.remedy_affinity(p.remedy_id, p.tokens) for p in self.profiles],
+            dtype=np.float32
+        ).reshape(len(self.profiles), len(classifier))
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def encode(self, token_sets: List[FrozenSet[str]]) -> np.ndarray:
+        """Binary item x vocabulary matrix; tokens unknown to every remedy are dropped"""
+        out = np.zeros((len(token_sets), len(self.vocab)), dtype=np.float32)
+        for row, tokens in enumerate(token_sets):
+            cols = [self.vocab[t] for t in tokens if t in self.vocab]
+            out[row, cols] = 1.0
+        return out
+
+    def has_any(self, tokens: List[str]) -> np.ndarray:
+        """Per remedy: does the monograph contain any of these tokens"""
+        cols = [self.vocab[t] for t in tokens if t in self.vocab]
+        if not cols:
+            return np.zeros(len(self.profiles), dtype=bool)
+        return self.matrix[:, cols].any(axis=1)
+
+
+@lru_cache(maxsize=4)
+def _load_matrix(mm_dir: str, version: float) -> RemedyMatrix:
+    return RemedyMatrix(_load_profiles(mm_dir, version))
+
+
+def load_remedy_matrix(mm_dir: str = MM_DIR) -> RemedyMatrix:
+    """Compiled matrix over all profiles, built once per MM directory version"""
+    version = _mm_version(mm_dir)
+    if not version:
+        return RemedyMatrix({})
+    return _load_matrix(mm_dir, version)
+
+
+# Keynote overlap needed to count as a characteristic match
+KEYNOTE_MIN_OVERLAP = 0.4
+# Keynote bullets often pack several symptoms ("Mild, yielding; weepy; seeks consolation")
+_KEYNOTE_SPLIT_RE = re.compile(r"[;.]\s*")
+
+
+class KeynoteIndex:
+    """
+    Normalized keynotes per remedy with an inverted token -> (remedy, keynote) postings list.
+    Keynotes are the Keynotes, Mental/Emotional and Physical Generals items of a monograph,
+    split into single symptoms at ';' and '.'.
+    """
+
+    def __init__(self, profiles: Dict[int, RemedyProfile]):
+        # remedy id -> [(keynote text, token set)]
+        self.keynotes: Dict[int, List[Tuple[str, FrozenSet[str]]]] = {}
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        for remedy_id, profile in profiles.items():
+            entries, seen = [], set()
+            items = profile.keynotes + profile.mental + profile.generals
+            for text in (t.strip() for item in items for t in _KEYNOTE_SPLIT_RE.split(item)):
+                form = frozenset(normalize_text(text))
+                if form and form not in seen:
+                    seen.add(form)
+                    entries.append((text, form))
+            self.keynotes[remedy_id] = entries
+            for ki, (_, form) in enumerate(entries):
+                for token in form:
+                    self._postings.setdefault(token, []).append((remedy_id, ki))
+
+    def __contains__(self, remedy_id: int) -> bool:
+        return remedy_id in self.keynotes
+
+    def match(self, phrase: FrozenSet[str], remedy_ids=None,
+              min_overlap: float = KEYNOTE_MIN_OVERLAP) -> Dict[int, Tuple[float, str]]:
+        """
+        Best keynote per remedy for one normalized case phrase.
+        Overlap is the cosine of the two token sets; unless either side is a
+        single token, two shared tokens are required.
+        Returns remedy id -> (overlap, keynote text).
+        """
+        counts: Dict[Tuple[int, int], int] = {}
+        for token in phrase:
+            for key in self._postings.get(token, ()):
+                if remedy_ids is None or key[0] in remedy_ids:
+                    counts[key] = counts.get(key, 0) + 1
+
+        best: Dict[int, Tuple[float, str]] = {}
+        for (remedy_id, ki), shared in counts.items():
+            text, form = self.keynotes[remedy_id][ki]
+            if shared < min(2, len(phrase), len(form)):
+                continue
+            overlap = shared / (len(phrase) * len(form)) ** 0.5
+            if overlap >= min_overlap and overlap > best.get(remedy_id, (0.0, ""))[0]:
+                best[remedy_id] = (round(overlap, 3), text)
+        return best
+
+
+@lru_cache(maxsize=4)
+def _load_keynotes(mm_dir: str, version: float) -> KeynoteIndex:
+    return KeynoteIndex(_load_profiles(mm_dir, version))
+
+
+def load_keynote_index(mm_dir: str = MM_DIR) -> KeynoteIndex:
+    """Keynote index over all profiles, built once per MM directory version"""
+    version = _mm_version(mm_dir)
+    if not version:
+        return KeynoteIndex({})
+    return _load_keynotes(mm_dir, version)
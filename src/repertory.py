@@ -1,46 +1,255 @@
 import os
-from typing import Dict
-from .utils import load_repertory
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
-def repertorize(case_json: Dict, repertory_path: str) -> Dict:
+from common.normalize import normalize_phrase, keyword_form
+
+from .utils import load_repertory, LRUCache
+from .case_features import CaseFeatures, case_features
+from .remedies import get_registry
+
+# Semantic fallback for phrases with no lexical hit: "auto" enables it when an API key is set
+SEMANTIC_REPERTORY = os.getenv("SEMANTIC_REPERTORY", "auto").lower()
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_RUBRIC_THRESHOLD", "0.5"))
+SEMANTIC_TOP_K = int(os.getenv("SEMANTIC_RUBRIC_TOP_K", "2"))
+
+# Case fields scanned for symptoms, with the implicit words each field carries
+# (a craving of "Salt" is the symptom "desire salt")
+TEXT_FIELDS = {"presenting_complaint": "", "etiology": "", "thermal": ""}
+LIST_FIELDS = {
+    "mental_emotional": "",
+    "generals": "",
+    "cravings": "desire",
+    "aversions": "aversion",
+    "sleep": "sleep",
+    "dreams": "dream",
+    "past_history": "",
+    "family_history": "family history",
+    "lifestyle": "",
+}
+PARTICULAR_FIELDS = {"modalities_better": "better", "modalities_worse": "worse", "concomitants": ""}
+
+
+# Score a matched rubric adds to each of its remedies, by the rubric's grade (the CSV weight)
+GRADE_WEIGHTS: Dict[int, float] = {1: 1.0, 2: 2.0, 3: 3.0}
+
+
+# Distinct normalized phrases remembered across cases
+PHRASE_CACHE_SIZE = int(os.getenv("REPERTORY_PHRASE_CACHE_SIZE", "4096"))
+
+
+class CompiledRepertory:
+    """
+    Repertory with every rubric keyword normalized once.
+    A keyword matches a symptom phrase when its token set is contained in the phrase's.
+    Matches are computed per phrase and memoized, so a case's hit set is the union
+    of cached phrase results.
+    """
+
+    def __init__(self, rows: List[Dict], repertory_path: str):
+        registry = get_registry(repertory_path=repertory_path)
+        self.rubrics = []
+        # token -> [(rubric index, keyword index)] for every keyword containing it
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._form_sizes: Dict[Tuple[int, int], int] = {}
+        self.phrase_cache = LRUCache(PHRASE_CACHE_SIZE)
+        self.semantic_cache = LRUCache(PHRASE_CACHE_SIZE)
+
+        for ri, row in enumerate(rows):
+            keywords = [k.strip() for k in row["keywords"].split(",") if k.strip()]
+            forms = [(k.lower(), keyword_form(k)) for k in keywords]
+            forms = [(k, form) for k, form in forms if form]
+            remedy_ids = [registry.resolve(rem) for rem in row["remedies"].split(";")]
+            self.rubrics.append({
+                "rubric": row["rubric"],
+                "weight": row["weight"],
+                "remedies": row["remedies"],
+                "remedy_ids": [r for r in remedy_ids if r is not None],
+                "keywords": forms,
+            })
+            for ki, (_, form) in enumerate(forms):
+                self._form_sizes[(ri, ki)] = len(form)
+                for token in form:
+                    self._postings[token].append((ri, ki))
+
+    def match_phrase(self, phrase: FrozenSet[str]) -> Tuple[Tuple[int, int], ...]:
+        """(rubric index, keyword index) pairs matched by one normalized phrase"""
+        cached = self.phrase_cache.get(phrase)
+        if cached is not None:
+            return cached
+
+        counts: Dict[Tuple[int, int], int] = defaultdict(int)
+        for token in phrase:
+            for key in self._postings.get(token, ()):
+                counts[key] += 1
+        matched = tuple(sorted(k for k, n in counts.items() if n == self._form_sizes[k]))
+
+        self.phrase_cache.put(phrase, matched)
+        return matched
+
+    def match(self, phrases: List[FrozenSet[str]]) -> List[Tuple[Dict, List[str]]]:
+        """Rubrics hit by any phrase, with the keywords that matched"""
+        hit_keys = set()
+        for phrase in phrases:
+            hit_keys.update(self.match_phrase(phrase))
+
+        by_rubric: Dict[int, List[int]] = defaultdict(list)
+        for ri, ki in sorted(hit_keys):
+            by_rubric[ri].append(ki)
+
+        return [
+            (self.rubrics[ri], [self.rubrics[ri]["keywords"][ki][0] for ki in kis])
+            for ri, kis in by_rubric.items()
+        ]
+
+    def rubric_texts(self) -> List[Dict]:
+        """Text embedded for each rubric, in repertory order"""
+        return [
+            {"id": r["rubric"], "text": f"{r['rubric']}: {', '.join(k for k, _ in r['keywords'])}"}
+            for r in self.rubrics
+        ]
+
+    def match_semantic(self, phrases: List[Tuple[str, FrozenSet[str]]],
+                       threshold: float = SEMANTIC_THRESHOLD,
+                       top_k: int = SEMANTIC_TOP_K) -> Dict[int, Tuple[float, str]]:
+        """
+        Nearest rubrics for phrases by embedding similarity.
+        All uncached phrases of a case go to the embeddings API in one batch.
+        Returns rubric index -> (best similarity, phrase text).
+        """
+        from .embeddings import embed_texts, load_rubric_matrix, similarities
+
+        results: Dict[int, Tuple[float, str]] = {}
+        pending = []
+        for text, form in phrases:
+            cached = self.semantic_cache.get(form)
+            if cached is None:
+                pending.append((text, form))
+                continue
+            for ri, sim in cached:
+                if sim > results.get(ri, (0.0, ""))[0]:
+                    results[ri] = (sim, text)
+
+        if pending:
+            matrix = load_rubric_matrix(self.rubric_texts())
+            sims = similarities(matrix, embed_texts([text for text, _ in pending]))
+            for (text, form), row in zip(pending, sims):
+                best = [(int(ri), float(row[ri])) for ri in row.argsort()[::-1][:top_k] if row[ri] >= threshold]
+                self.semantic_cache.put(form, tuple(best))
+                for ri, sim in best:
+                    if sim > results.get(ri, (0.0, ""))[0]:
+                        results[ri] = (sim, text)
+        return results
+
+
+@lru_cache(maxsize=4)
+def _compile(repertory_path: str, mtime: float) -> CompiledRepertory:
+    return CompiledRepertory(load_repertory(repertory_path), repertory_path)
+
+
+def compile_repertory(repertory_path: str) -> CompiledRepertory:
+    """Compiled repertory, rebuilt only when the CSV changes on disk"""
+    return _compile(repertory_path, os.path.getmtime(repertory_path))
+
+
+def case_phrases(case_json: Dict) -> List[Tuple[str, FrozenSet[str]]]:
+    """Normalize each symptom phrase of a case once: (raw text, normalized form)"""
+    features = case_features(case_json)
+    return features.cached("repertory_phrases", lambda: _case_phrases(features))
+
+
+def _case_phrases(case: CaseFeatures) -> List[Tuple[str, FrozenSet[str]]]:
+    phrases = []
+    for key, context in TEXT_FIELDS.items():
+        if case.get(key):
+            phrases.append((case[key], context))
+
+    for key, context in LIST_FIELDS.items():
+        for v in case.get(key, []):
+            phrases.append((v, context))
+
+    for p in case["particulars"]:
+        phrases.append((p["description"], ""))
+        for key, context in PARTICULAR_FIELDS.items():
+            for v in p.get(key, []):
+                phrases.append((v, context))
+
+    out = []
+    for text, context in phrases:
+        form = normalize_phrase(text, context)
+        if form:
+            out.append((f"{context} {text}".strip(), form))
+    return out
+
+
+def _semantic_enabled(semantic) -> bool:
+    if semantic is not None:
+        return semantic
+    if SEMANTIC_REPERTORY == "auto":
+        return bool(os.getenv("OPENAI_API_KEY"))
+    return SEMANTIC_REPERTORY in ("1", "true", "yes", "on")
+
+
+def repertorize(case_json: Dict, repertory_path: str, semantic: bool = None,
+                grade_weights: Optional[Dict[int, float]] = None) -> Dict:
     """
-    Rule-based repertorization: map symptoms to rubrics and score remedies
+    Rule-based repertorization: map symptoms to rubrics and score remedies.
+    Lexical keyword matching is the fast path; phrases with no lexical hit are
+    matched to their nearest rubrics by embedding similarity when `semantic` is on.
+    Each matched rubric adds its grade's weight (`grade_weights`, default GRADE_WEIGHTS)
+    to its remedies.
     """
-    repertory = load_repertory(repertory_path)
-    texts = []
-    
-    # Collect all text from case
-    fields = ["presenting_complaint", "etiology", "thermal"]
-    for k in fields:
-        if case_json.get(k):
-            texts.append(str(case_json[k]).lower())
-    
-    for key in ["mental_emotional", "generals", "cravings", "aversions", "sleep", "dreams", "past_history", "family_history", "lifestyle"]:
-        for v in case_json.get(key, []):
-            texts.append(str(v).lower())
-    
-    for p in case_json.get("particulars", []):
-        texts.append(str(p.get("description", "")).lower())
-        texts += [s.lower() for s in p.get("modalities_better", []) + p.get("modalities_worse", []) + p.get("concomitants", [])]
-    
-    full_text = " ".join(texts)
+    grade_weights = GRADE_WEIGHTS if grade_weights is None else grade_weights
+    repertory = compile_repertory(repertory_path)
+    registry = get_registry(repertory_path=repertory_path)
+    phrases = case_phrases(case_json)
+
     hits = []
-    remedy_scores = {}
-    
-    for row in repertory:
-        kws = [k.strip().lower() for k in row["keywords"].split(",")]
-        matched = [k for k in kws if k and k in full_text]
-        if matched:
+    matched_rows = []
+
+    for row, matched in repertory.match([form for _, form in phrases]):
+        hits.append(dict(
+            rubric=row["rubric"],
+            weight=row["weight"],
+            remedies=row["remedies"],
+            matched_keywords=matched,
+            match_type="lexical"
+        ))
+        matched_rows.append(row)
+
+    unmatched = [(text, form) for text, form in phrases if not repertory.match_phrase(form)]
+    if unmatched and _semantic_enabled(semantic):
+        try:
+            semantic_hits = repertory.match_semantic(unmatched)
+        except Exception:
+            semantic_hits = {}  # embeddings unavailable: lexical result stands
+        lexical = {h["rubric"] for h in hits}
+        for ri, (sim, text) in sorted(semantic_hits.items()):
+            row = repertory.rubrics[ri]
+            if row["rubric"] in lexical:
+                continue
             hits.append(dict(
                 rubric=row["rubric"],
                 weight=row["weight"],
                 remedies=row["remedies"],
-                matched_keywords=matched
+                matched_keywords=[],
+                match_type="semantic",
+                matched_phrase=text,
+                similarity=round(sim, 3)
             ))
-            for rem in row["remedies"].split(";"):
-                remedy_scores[rem.strip()] = remedy_scores.get(rem.strip(), 0) + row["weight"]
-    
+            matched_rows.append(row)
+
+    remedy_scores = {}
+    for row in matched_rows:
+        score = grade_weights.get(row["weight"], row["weight"])
+        for remedy_id in row["remedy_ids"]:
+            remedy_scores[remedy_id] = remedy_scores.get(remedy_id, 0) + score
+
     ranked = sorted(remedy_scores.items(), key=lambda x: x[1], reverse=True)
-    candidates = [{"name": r, "score": float(s), "reasons": []} for r, s in ranked[:10]]
-    
+    candidates = [
+        {"name": registry.name(r), "remedy_id": r, "score": float(s), "reasons": []}
+        for r, s in ranked[:10]
+    ]
+
     return {"hits": hits, "candidates": candidates}
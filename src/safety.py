@@ -1,4 +1,5 @@
 from typing import Dict, List
+from .case_features import case_features
 
 RED_FLAGS = [
     "severe chest pain",
@@ -14,5 +15,5 @@ RED_FLAGS = [
 
 def has_red_flags(case_json: Dict) -> List[str]:
     """Check case for emergency red flags"""
-    text = str(case_json).lower()
-    return [rf for rf in RED_FLAGS if rf in text]
+    features = case_features(case_json)
+    return [rf for rf in RED_FLAGS if features.contains(rf)]
@@ -0,0 +1,155 @@
+"""
+Incremental re-analysis
+The workflow is a graph of stages, each declaring the case fields it reads and the
+upstream stages whose outputs it consumes. A stage's output is cached under a hash of
+exactly those inputs, so a case edit (answering a clarifying question about sleep, say)
+recomputes only the stages whose inputs changed; a stage whose upstream recomputed to
+the same output is still reused. Each run reports which stages were reused.
+"""
+import copy
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from common.workflow_cache import VERSION_CHECK_INTERVAL, data_version
+
+from .utils import LRUCache
+
+# Stage outputs kept across runs
+STAGE_CACHE_SIZE = int(os.getenv("STAGE_CACHE_SIZE", 256))
+STAGE_CACHE_ENABLED = os.getenv("STAGE_CACHE", "1").lower() not in ("0", "false", "off")
+
+ALL_FIELDS = ("*",)
+
+# Fields scanned by repertorize (see repertory.TEXT_FIELDS / LIST_FIELDS)
+REPERTORY_FIELDS = (
+    "presenting_complaint", "etiology", "thermal", "mental_emotional", "generals", "cravings",
+    "aversions", "sleep", "dreams", "past_history", "family_history", "lifestyle", "particulars",
+)
+# Fields of the differential prompt (etiology through its matched keynotes) plus those
+# read by the template rationale
+DIFFERENTIAL_FIELDS = (
+    "presenting_complaint", "etiology", "mental_emotional", "generals", "thermal", "cravings", "aversions",
+    "sleep", "past_history", "family_history", "lifestyle", "particulars", "duration",
+)
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    fields: Tuple[str, ...]          # case fields read (ALL_FIELDS for the whole case)
+    after: Tuple[str, ...] = ()      # stages whose outputs are inputs
+
+
+STAGES: Dict[str, Stage] = {s.name: s for s in (
+    Stage("case_taker", ALL_FIELDS),
+    Stage("repertory", REPERTORY_FIELDS),
+    Stage("materia_medica", ("presenting_complaint", "mental_emotional", "generals"), ("repertory",)),
+    Stage("questioning", ALL_FIELDS, ("repertory",)),
+    Stage("clinical", ALL_FIELDS, ("repertory",)),
+    Stage("differential", DIFFERENTIAL_FIELDS, ("repertory", "materia_medica", "clinical")),
+    Stage("prescription", (), ("differential",)),
+)}
+
+_cache = LRUCache(STAGE_CACHE_SIZE)
+_version: Optional[str] = None
+_version_checked = 0.0
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _data_version() -> str:
+    """Fingerprint of the repertory/MM/prompt files, re-checked every VERSION_CHECK_INTERVAL seconds"""
+    global _version, _version_checked
+    now = time.monotonic()
+    if _version is None or now - _version_checked > VERSION_CHECK_INTERVAL:
+        _version = data_version()
+        _version_checked = now
+    return _version
+
+
+def _degraded(output: Any) -> bool:
+    """Timed-out, failed, partial or deadline-degraded outputs are not reused by later runs"""
+    return isinstance(output, dict) and (
+        output.get("status") in ("error", "timeout") or bool(output.get("failed_searches"))
+        or bool(output.get("degraded")) or output.get("rationale_source") == "clinical"
+    )
+
+
+def clear_stage_cache():
+    _cache.clear()
+
+
+def stage_cache_stats() -> Dict:
+    return _cache.stats()
+
+
+class StageRunner:
+    """
+    Runs the stages of one workflow run through the shared stage cache.
+    `run(name, fn, ...)` returns the cached output when the stage's declared inputs
+    (its case-field slice, upstream outputs and `params`) match an earlier run;
+    streaming stages use `cached()` / `store()` directly.
+    """
+
+    def __init__(self, case_data, use_cache: bool = True):
+        self.case_data = case_data
+        self.use_cache = use_cache and STAGE_CACHE_ENABLED
+        self._status: Dict[str, str] = {}
+        self._outputs: Dict[str, str] = {}
+
+    def key(self, name: str, params: Optional[Dict] = None) -> str:
+        stage = STAGES[name]
+        if stage.fields == ALL_FIELDS:
+            fields = dict(self.case_data)
+        else:
+            fields = {f: self.case_data.get(f) for f in stage.fields}
+        upstream = {dep: self._outputs.get(dep) for dep in stage.after}
+        return _digest([name, _data_version(), fields, upstream, params or {}])
+
+    def _record(self, name: str, output: Any, status: str) -> Any:
+        self._outputs[name] = _digest(output)
+        self._status.pop(name, None)
+        self._status[name] = status
+        return output
+
+    def cached(self, name: str, params: Optional[Dict] = None) -> Any:
+        """The stage's earlier output for the same inputs (recorded as reused), or None"""
+        if not self.use_cache:
+            return None
+        output = _cache.get(self.key(name, params))
+        if output is None:
+            return None
+        return self._record(name, copy.deepcopy(output), "reused")
+
+    def store(self, name: str, output: Any, params: Optional[Dict] = None) -> Any:
+        """Record a freshly computed output (degraded outputs are not kept)"""
+        if self.use_cache and not _degraded(output):
+            _cache.put(self.key(name, params), copy.deepcopy(output))
+        return self._record(name, output, "computed")
+
+    def run(self, name: str, fn: Callable, *args, params: Optional[Dict] = None, **kwargs) -> Any:
+        output = self.cached(name, params)
+        if output is None:
+            output = self.store(name, fn(*args, **kwargs), params)
+        return output
+
+    async def run_async(self, name: str, factory: Callable[[], Awaitable], params: Optional[Dict] = None) -> Any:
+        """Like run(); `factory` returns the awaitable and is only called on a miss"""
+        output = self.cached(name, params)
+        if output is None:
+            output = self.store(name, await factory(), params)
+        return output
+
+    def report(self) -> Dict[str, List[str]]:
+        """Stages reused from earlier runs and stages computed in this one, in run order"""
+        return {
+            "reused": [name for name, status in self._status.items() if status == "reused"],
+            "computed": [name for name, status in self._status.items() if status == "computed"],
+        }
@@ -0,0 +1,102 @@
+"""
+Append-only patient timeline store
+Every follow-up visit is one immutable row keyed by (patient_id, visit_no), so a
+patient's whole history is a single primary-key range read
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+TIMELINE_DB_PATH = os.getenv("TIMELINE_DB_PATH", "data/timeline.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS visits (
+    patient_id  TEXT    NOT NULL,
+    visit_no    INTEGER NOT NULL,
+    recorded_at TEXT    NOT NULL,
+    remedy      TEXT,
+    state       TEXT    NOT NULL,
+    analysis    TEXT,
+    PRIMARY KEY (patient_id, visit_no)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS visits_no_update BEFORE UPDATE ON visits
+BEGIN SELECT RAISE(ABORT, 'timeline is append-only'); END;
+
+CREATE TRIGGER IF NOT EXISTS visits_no_delete BEFORE DELETE ON visits
+BEGIN SELECT RAISE(ABORT, 'timeline is append-only'); END;
+"""
+
+
+class TimelineStore:
+    """
+    SQLite-backed, append-only visit log.
+    `state` is the full symptom state at the visit and `analysis` the delta against
+    the previous visit, so appending a visit only ever needs the latest row.
+    """
+
+    def __init__(self, path: str = TIMELINE_DB_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict:
+        return {
+            "patient_id": row["patient_id"],
+            "visit_no": row["visit_no"],
+            "recorded_at": row["recorded_at"],
+            "remedy": row["remedy"],
+            "state": json.loads(row["state"]),
+            "analysis": json.loads(row["analysis"]) if row["analysis"] else None,
+        }
+
+    def latest(self, patient_id: str) -> Optional[Dict]:
+        """Most recent visit of a patient, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM visits WHERE patient_id = ? ORDER BY visit_no DESC LIMIT 1",
+                (patient_id,)
+            ).fetchone()
+        return self._row(row) if row else None
+
+    def history(self, patient_id: str) -> List[Dict]:
+        """All visits of a patient in order (one primary-key range read)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM visits WHERE patient_id = ? ORDER BY visit_no",
+                (patient_id,)
+            ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def append(self, patient_id: str, state: Dict, analysis: Optional[Dict] = None,
+               remedy: Optional[str] = None, recorded_at: Optional[str] = None) -> int:
+        """Append the next visit for a patient and return its visit number"""
+        recorded_at = recorded_at or datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT COALESCE(MAX(visit_no), 0) FROM visits WHERE patient_id = ?",
+                (patient_id,)
+            ).fetchone()
+            visit_no = row[0] + 1
+            self._conn.execute(
+                "INSERT INTO visits (patient_id, visit_no, recorded_at, remedy, state, analysis) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (patient_id, visit_no, recorded_at, remedy,
+                 json.dumps(state, ensure_ascii=False),
+                 json.dumps(analysis, ensure_ascii=False) if analysis is not None else None)
+            )
+        return visit_no
@@ -0,0 +1,203 @@
+"""
+Lightweight tracing
+A trace covers one workflow run; spans inside it time each stage and external call
+(LLM, embeddings, Vision, Whisper) and carry token usage and cache status. Finished
+traces are appended to a rotating JSONL file and summarized onto the workflow result.
+Outside a trace (or with TRACING=0) `span()` hands out a shared no-op span.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+TRACING_ENABLED = os.getenv("TRACING", "1").lower() not in ("0", "false", "off")
+TRACE_PATH = os.getenv("TRACE_PATH", "data/traces.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 5 * 1024 * 1024))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", 3))
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_writer_lock = threading.Lock()
+_writer: Optional[logging.Logger] = None
+# (path, max bytes, backups) of the trace file
+_trace_file = (TRACE_PATH, TRACE_MAX_BYTES, TRACE_BACKUPS)
+
+
+class Span:
+    """One timed operation; `attrs` holds model, tokens, cache status, errors"""
+    __slots__ = ("name", "attrs", "offset_ms", "duration_ms")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], offset_ms: float):
+        self.name = name
+        self.attrs = attrs
+        self.offset_ms = offset_ms
+        self.duration_ms = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def usage(self, usage):
+        """
+        Record token counts from an OpenAI `usage` object (chat, embeddings or audio),
+        including the prompt tokens served from the provider's prefix cache
+        """
+        if usage is None:
+            return
+        tokens_in = getattr(usage, "prompt_tokens", None)
+        if tokens_in is None:
+            tokens_in = getattr(usage, "input_tokens", None)
+        tokens_out = getattr(usage, "completion_tokens", None)
+        if tokens_out is None:
+            tokens_out = getattr(usage, "output_tokens", None)
+        details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+        tokens_cached = getattr(details, "cached_tokens", None)
+        if tokens_in is not None:
+            self.attrs["tokens_in"] = self.attrs.get("tokens_in", 0) + tokens_in
+        if tokens_out is not None:
+            self.attrs["tokens_out"] = self.attrs.get("tokens_out", 0) + tokens_out
+        if tokens_cached is not None:
+            self.attrs["tokens_cached"] = self.attrs.get("tokens_cached", 0) + tokens_cached
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "offset_ms": self.offset_ms, "duration_ms": self.duration_ms, **self.attrs}
+
+
+class _NullSpan:
+    """Span handed out when no trace is active; every method is a no-op"""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def usage(self, usage):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self._start = time.perf_counter()
+        self.total_ms = 0.0
+        self.spans: List[Span] = []
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 2)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-span-name wall time plus token and cache totals"""
+        durations: Dict[str, float] = {}
+        cache: Dict[str, int] = {}
+        tokens_in = tokens_out = tokens_cached = 0
+        for s in self.spans:
+            durations[s.name] = round(durations.get(s.name, 0.0) + s.duration_ms, 2)
+            tokens_in += s.attrs.get("tokens_in", 0)
+            tokens_out += s.attrs.get("tokens_out", 0)
+            tokens_cached += s.attrs.get("tokens_cached", 0)
+            if "cache" in s.attrs:
+                cache[s.attrs["cache"]] = cache.get(s.attrs["cache"], 0) + 1
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": self.total_ms or self.elapsed_ms(),
+            "spans": durations,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_cached": tokens_cached,
+            "cache": cache,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "spans": [s.to_dict() for s in self.spans],
+        }
+
+
+def _get_writer() -> logging.Logger:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            path, max_bytes, backups = _trace_file
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("homeopathy.traces")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _writer = logger
+    return _writer
+
+
+def set_trace_file(path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+    """Append finished traces to `path` from now on (e.g. a temporary file in tests)"""
+    global _writer, _trace_file
+    with _writer_lock:
+        if _writer is not None:
+            for handler in list(_writer.handlers):
+                _writer.removeHandler(handler)
+                handler.close()
+            _writer = None
+        _trace_file = (path, max_bytes, backups)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def trace(name: str):
+    """
+    Start a trace for the enclosed block (yields the Trace, or None when tracing is
+    disabled). Inside an active trace this joins it instead of starting a new one.
+    """
+    active = _current.get()
+    if not TRACING_ENABLED or active is not None:
+        yield active
+        return
+
+    current = Trace(name)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Ended from another context (e.g. an abandoned generator)
+            _current.set(None)
+        current.total_ms = current.elapsed_ms()
+        _get_writer().info(json.dumps(current.to_dict(), ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the enclosed block as a span of the active trace"""
+    current = _current.get()
+    if current is None:
+        yield NULL_SPAN
+        return
+
+    s = Span(name, attrs, current.elapsed_ms())
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        s.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        current.spans.append(s)
@@ -0,0 +1,289 @@
+"""
+Offline scoring-weight tuning harness
+Evaluates Kent weights, repertory grade weights and differential parameters (ranking
+and confidence formula) over the test-case corpus plus synthetic cases, without any
+LLM or embeddings calls. Confidence is scored for calibration (Brier score, accuracy
+above the fast-path threshold), since it does not change the ranking.
+
+    python -m src.tuning --search grid --workers 4
+    python -m src.tuning --search random --trials 200 --synthetic 60 --output tuning.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from .clinical_engine import ClinicalScoringEngine, DifferentialAnalyzer, get_clinical_recommendation
+from .modalities import describe
+from .remedies import REPERTORY_PATH, get_registry
+from .rationale import FAST_PATH_CONFIDENCE
+from .remedy_profiles import load_keynote_index, load_profiles, load_remedy_matrix
+from .repertory import GRADE_WEIGHTS, compile_repertory, repertorize
+
+TEST_CASES_PATH = "test_cases/test_cases_comprehensive.json"
+
+# Grid search values; unlisted parameters keep their defaults
+DEFAULT_GRID: Dict[str, List[float]] = {
+    "mental": [8, 10, 12],
+    "generals": [5, 7, 9],
+    "causation": [6, 8],
+    "modalities": [3, 5],
+    "particulars": [2, 3],
+    "REPERTORY_WEIGHT": [0.0, 0.1, 0.5],
+    "grade_3": [3.0, 5.0],
+    "CONFIDENCE_FULL_MATCHES": [3.0, 5.0],
+}
+
+# Random search ranges (uniform)
+SEARCH_SPACE: Dict[str, tuple] = {
+    "mental": (4.0, 14.0),
+    "generals": (2.0, 10.0),
+    "causation": (2.0, 10.0),
+    "modalities": (0.0, 8.0),
+    "particulars": (1.0, 6.0),
+    "constitution": (0.0, 8.0),
+    "miasm": (0.0, 6.0),
+    "REPERTORY_WEIGHT": (0.0, 1.0),
+    "grade_1": (0.5, 2.0),
+    "grade_2": (1.0, 4.0),
+    "grade_3": (2.0, 8.0),
+    "CONFIDENCE_FULL_MATCHES": (2.0, 8.0),
+    "CONFIDENCE_GAP_SCALE": (1.0, 6.0),
+    "CONFIDENCE_GAP_CAP": (0.0, 0.5),
+}
+
+# Config keys for repertory grade weights: grade_<n> is the score of a grade-n rubric
+GRADE_PREFIX = "grade_"
+
+
+def baseline_config() -> Dict[str, float]:
+    """The shipped weights, always evaluated first for reference"""
+    config = dict(ClinicalScoringEngine().category_weights())
+    config.update((f"{GRADE_PREFIX}{grade}", weight) for grade, weight in GRADE_WEIGHTS.items())
+    for name in ("REPERTORY_WEIGHT", "CONFIDENCE_FULL_MATCHES", "CONFIDENCE_GAP_SCALE", "CONFIDENCE_GAP_CAP"):
+        config[name] = getattr(DifferentialAnalyzer, name)
+    return config
+
+
+def split_config(config: Dict[str, float]):
+    """(Kent category weights, repertory grade weights, differential parameters) of a flat config"""
+    categories = set(ClinicalScoringEngine().category_weights())
+    weights = {k: v for k, v in config.items() if k in categories}
+    grades = {int(k[len(GRADE_PREFIX):]): v for k, v in config.items() if k.startswith(GRADE_PREFIX)}
+    params = {k: v for k, v in config.items() if k not in categories and not k.startswith(GRADE_PREFIX)}
+    return weights, grades, params
+
+
+def grid_configs(grid: Dict[str, List[float]] = None) -> List[Dict[str, float]]:
+    grid = grid or DEFAULT_GRID
+    base = baseline_config()
+    keys = list(grid)
+    return [dict(base, **dict(zip(keys, values))) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def random_configs(trials: int, seed: int = 0, space: Dict[str, tuple] = None) -> List[Dict[str, float]]:
+    space = space or SEARCH_SPACE
+    rng = random.Random(seed)
+    base = baseline_config()
+    return [
+        dict(base, **{k: round(rng.uniform(lo, hi), 2) for k, (lo, hi) in space.items()})
+        for _ in range(trials)
+    ]
+
+
+def load_corpus(path: str = TEST_CASES_PATH) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        {"case_id": tc["case_id"], "source": "corpus", "expected": tc["expected_remedy"], "case_data": tc["case_data"]}
+        for tc in data.get("test_cases", [])
+    ]
+
+
+def synthetic_cases(count: int, seed: int = 0) -> List[Dict]:
+    """
+    Cases assembled from monograph keynotes, generals and modalities, with one
+    distractor symptom from another remedy. They are easier than real cases
+    (same vocabulary as the MM) and only complement the corpus.
+    """
+    rng = random.Random(seed)
+    profiles = [p for p in load_profiles().values() if len(p.mental or p.keynotes) >= 3]
+    if not profiles:
+        return []
+
+    cases = []
+    for i in range(count):
+        profile = rng.choice(profiles)
+        other = rng.choice(profiles)
+        mental = rng.sample(list(profile.mental or profile.keynotes), 3)
+        if other.remedy_id != profile.remedy_id:
+            mental.append(rng.choice(other.mental or other.keynotes))
+
+        modalities = describe(profile.modality_bits)
+        thermal = None
+        if "heat" in modalities["worse"]:
+            thermal = "Hot (worse heat)"
+        elif "cold" in modalities["worse"]:
+            thermal = "Chilly (worse cold)"
+
+        complaint = rng.choice(profile.clinical_uses or profile.keynotes)
+        cases.append({
+            "case_id": f"SYN{i + 1:03d}",
+            "source": "synthetic",
+            "expected": profile.name,
+            "case_data": {
+                "presenting_complaint": complaint,
+                "mental_emotional": mental,
+                "generals": rng.sample(list(profile.generals), min(2, len(profile.generals))),
+                "thermal": thermal,
+                "particulars": [{
+                    "section": "General",
+                    "description": complaint,
+                    "modalities_worse": list(profile.worse[:2]),
+                    "modalities_better": list(profile.better[:2]),
+                }],
+            },
+        })
+    return cases
+
+
+# Per-process state: compiled structures and repertory results, built once per worker
+_WORKER: Dict = {}
+
+
+def _init_worker(cases: List[Dict], repertory_path: str):
+    registry = get_registry()
+    compile_repertory(repertory_path)
+    load_remedy_matrix()
+    load_keynote_index()
+    _WORKER["repertory_path"] = repertory_path
+    _WORKER["repertory"] = {}
+    _WORKER["cases"] = [dict(case, expected_id=registry.resolve(case["expected"])) for case in cases]
+
+
+def _repertory_results(grades: Dict[int, float]) -> List[Dict]:
+    """Repertorization of every case under `grades`, run once per distinct grade weighting"""
+    key = tuple(sorted(grades.items()))
+    if key not in _WORKER["repertory"]:
+        _WORKER["repertory"][key] = [
+            repertorize(case["case_data"], _WORKER["repertory_path"], semantic=False, grade_weights=grades)
+            for case in _WORKER["cases"]
+        ]
+    return _WORKER["repertory"][key]
+
+
+def evaluate_config(config: Dict[str, float]) -> Dict:
+    """
+    Top-1/top-3 accuracy of one configuration over the worker's cases, plus the
+    calibration of its confidence: Brier score against top-1 hits, and the share and
+    accuracy of cases at or above the fast-path threshold
+    """
+    weights, grades, params = split_config(config)
+    scorer = ClinicalScoringEngine(weights)
+    differentiator = DifferentialAnalyzer(params)
+    matrix = load_remedy_matrix()
+
+    stats: Dict[str, Dict[str, float]] = {}
+    confident: Dict[str, List[bool]] = {}
+    confidences = {True: [], False: []}
+    for case, repertory in zip(_WORKER["cases"], _repertory_results({**GRADE_WEIGHTS, **grades})):
+        result = get_clinical_recommendation(case["case_data"], repertory, [], scorer, differentiator)
+        ranked = [result.get("remedy_id")] + [d.get("remedy_id") for d in result.get("differential_diagnosis", [])]
+        totality = [row["remedy_id"] for row in scorer.score_all(case["case_data"], matrix)[:3]]
+
+        expected = case["expected_id"]
+        hit = expected is not None and ranked[0] == expected
+        confidence = result.get("confidence", 0.0)
+        confidences[hit].append(confidence)
+        for source in (case["source"], "all"):
+            s = stats.setdefault(source, {"cases": 0, "top1": 0, "top3": 0, "totality_top1": 0, "totality_top3": 0,
+                                          "brier": 0.0})
+            s["cases"] += 1
+            s["top1"] += hit
+            s["top3"] += expected is not None and expected in ranked[:3]
+            s["totality_top1"] += expected is not None and totality[:1] == [expected]
+            s["totality_top3"] += expected is not None and expected in totality
+            s["brier"] += (confidence - hit) ** 2
+            if confidence >= FAST_PATH_CONFIDENCE:
+                confident.setdefault(source, []).append(hit)
+
+    report = {"config": config}
+    for source, s in stats.items():
+        n = s.pop("cases")
+        report[source] = {k: round(v / n, 3) for k, v in s.items()}
+        hits = confident.get(source, [])
+        report[source]["fast_path_share"] = round(len(hits) / n, 3)
+        report[source]["fast_path_top1"] = round(sum(hits) / len(hits), 3) if hits else None
+        report[source]["cases"] = n
+    if confidences[True] and confidences[False]:
+        report["confidence_gap"] = round(
+            sum(confidences[True]) / len(confidences[True]) - sum(confidences[False]) / len(confidences[False]), 3
+        )
+    return report
+
+
+def run_search(configs: List[Dict[str, float]], cases: List[Dict], workers: Optional[int] = None,
+               repertory_path: str = REPERTORY_PATH) -> List[Dict]:
+    """Evaluate configurations in a process pool; results sorted best first"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(cases, repertory_path)
+        results = [evaluate_config(c) for c in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cases, repertory_path)) as pool:
+            results = list(pool.map(evaluate_config, configs, chunksize=max(1, len(configs) // (workers * 4))))
+    # Ranking accuracy first; confidence parameters only move the Brier score
+    results.sort(key=lambda r: (r["all"]["top1"], r["all"]["top3"], r["all"]["totality_top1"], -r["all"]["brier"]),
+                 reverse=True)
+    return results
+
+
+def _format_row(rank: int, result: Dict) -> str:
+    weights = " ".join(f"{k}={v:g}" for k, v in result["config"].items())
+    scores = result["all"]
+    return (f"{rank:>3}  top1={scores['top1']:.3f}  top3={scores['top3']:.3f}  "
+            f"totality={scores['totality_top1']:.3f}/{scores['totality_top3']:.3f}  "
+            f"brier={scores['brier']:.3f}  {weights}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tune clinical scoring weights offline")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--trials", type=int, default=100, help="random search configurations")
+    parser.add_argument("--synthetic", type=int, default=40, help="synthetic cases added to the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cases", default=TEST_CASES_PATH)
+    parser.add_argument("--top", type=int, default=10, help="configurations to print")
+    parser.add_argument("--output", help="write all results as JSON")
+    args = parser.parse_args(argv)
+
+    cases = load_corpus(args.cases) + synthetic_cases(args.synthetic, args.seed)
+    configs = grid_configs() if args.search == "grid" else random_configs(args.trials, args.seed)
+    configs = [baseline_config()] + [c for c in configs if c != baseline_config()]
+
+    start = time.perf_counter()
+    results = run_search(configs, cases, args.workers)
+    elapsed = time.perf_counter() - start
+
+    baseline = next(r for r in results if r["config"] == configs[0])
+    print(f"Evaluated {len(configs)} configurations on {len(cases)} cases in {elapsed:.1f}s")
+    print("Baseline:")
+    print(_format_row(0, baseline))
+    print(f"Top {min(args.top, len(results))}:")
+    for rank, result in enumerate(results[:args.top], 1):
+        print(_format_row(rank, result))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,6 +2,8 @@ import os
 import csv
 import json
 import re
+import threading
+from collections import OrderedDict
 from typing import List, Dict
 
 def load_repertory(path: str) -> List[Dict]:
@@ -26,6 +28,14 @@ def load_materia_medica(mm_dir: str) -> List[Dict]:
             files.append({"id": fn, "title": title, "text": txt})
     return files
 
+def as_list(value) -> List:
+    """Case list fields sometimes arrive as a single string; never iterate it char by char"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
 def save_json(path: str, data):
     """Save JSON data to file"""
     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -38,3 +48,40 @@ def load_json(path: str, default):
         return default
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -10,10 +10,8 @@ import json
 import tempfile
 from pathlib import Path
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+from .openai_clients import OpenAI, get_client
+from .tracing import span, trace
 
 
 class VideoAnalyzer:
@@ -112,7 +110,7 @@ Return in JSON:
         if OpenAI:
             api_key = os.getenv("OPENAI_API_KEY")
             if api_key:
-                self.client = OpenAI(api_key=api_key)
+                self.client = get_client()
     
     def analyze_video(self, video_path: str) -> Dict:
         """
@@ -133,29 +131,31 @@ Return in JSON:
             base64_video = base64.b64encode(video_data).decode('utf-8')
             
             # Analyze video using GPT-4 Vision
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": self.VIDEO_ANALYSIS_PROMPT
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:video/mp4;base64,{base64_video}",
-                                    "detail": "high"
+            with trace("video_analysis"), span("llm.vision", model="gpt-4o") as s:
+                response = self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": self.VIDEO_ANALYSIS_PROMPT
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:video/mp4;base64,{base64_video}",
+                                        "detail": "high"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=2000,
-                temperature=0.3
-            )
+                            ]
+                        }
+                    ],
+                    max_tokens=2000,
+                    temperature=0.3
+                )
+                s.usage(response.usage)
             
             content = response.choices[0].message.content
             
@@ -189,28 +189,34 @@ Return in JSON:
         
         try:
             # Transcribe using Whisper API
-            with open(audio_path, 'rb') as audio_file:
-                transcription = self.client.audio.transcriptions.create(
+            with trace("audio_analysis"), span("llm.transcription", model="whisper-1") as s, open(audio_path, 'rb') as audio_file:
+                # verbose_json carries the audio duration Whisper is billed by
+                transcribed = self.client.audio.transcriptions.create(
                     model="whisper-1",
                     file=audio_file,
-                    response_format="text"
+                    response_format="verbose_json"
                 )
+                s.set(audio_seconds=round(getattr(transcribed, "duration", None) or 0, 2))
+                s.usage(getattr(transcribed, "usage", None))
+            transcription = transcribed.text
             
             # Analyze transcription for homeopathic relevance
-            analysis_response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.AUDIO_TRANSCRIPTION_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Analyze this patient's verbal description:\n\n{transcription}"
-                    }
-                ],
-                temperature=0.3
-            )
+            with trace("audio_analysis"), span("llm.chat", model="gpt-4o") as s:
+                analysis_response = self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.AUDIO_TRANSCRIPTION_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": f"Analyze this patient's verbal description:\n\n{transcription}"
+                        }
+                    ],
+                    temperature=0.3
+                )
+                s.usage(analysis_response.usage)
             
             content = analysis_response.choices[0].message.content
             
@@ -190,6 +190,717 @@ def test_intelligent_questioning():
         traceback.print_exc()
         return False
 
+def test_remedy_registry():
+    """Test canonical remedy registry"""
+    print("\n🔍 Testing remedy registry...")
+    try:
+        from src.remedies import get_registry
+        
+        registry = get_registry()
+        nat_mur = registry.resolve("Natrum muriaticum")
+        
+        checks = {
+            "Nat Mur": nat_mur,
+            "Nat-m": nat_mur,
+            "natrum_muriaticum": nat_mur,
+            "Pulsatilla nigricans": registry.resolve("Pulsatilla"),
+            "Coffea": registry.resolve("Coffea Cruda"),
+        }
+        failed = [alias for alias, expected in checks.items()
+                  if expected is None or registry.resolve(alias) != expected]
+        
+        print(f"✅ Registry built: {len(registry)} remedies")
+        if failed:
+            print(f"❌ Unresolved aliases: {failed}")
+            return False
+        
+        print(f"   📊 All {len(checks)} aliases resolved")
+        return True
+    except Exception as e:
+        print(f"❌ Error testing remedy registry: {e}")
+        return False
+
+def test_phrase_normalization():
+    """Test that plain-language phrases reach rubrics through synonyms and stems"""
+    print("\n🔍 Testing symptom phrase normalization...")
+    try:
+        from src.repertory import compile_repertory
+        from common.normalize import normalize_phrase
+        
+        repertory = compile_repertory("data/repertory_mapping.csv")
+        checks = {
+            ("Very chilly person", ""): "Generalities - Cold - agg.",
+            ("Everything worse in warm rooms", ""): "Generalities - Heat - agg.",
+            ("Craves sweet things", ""): "Stomach - Desires - sweets",
+            ("Sugar", "desire"): "Stomach - Desires - sweets",
+            ("Weeps at the slightest thing", ""): "Mind - Weeping - easily",
+            ("Fears being alone", ""): "Mind - Fear - alone",
+            ("Painless diarrhea", ""): "Rectum - Diarrhea",
+        }
+        failed = []
+        for (text, context), rubric in checks.items():
+            matched = {repertory.rubrics[ri]["rubric"] for ri, _ in repertory.match_phrase(normalize_phrase(text, context))}
+            if rubric not in matched:
+                failed.append(text)
+        
+        print(f"✅ {len(checks) - len(failed)}/{len(checks)} phrases matched their rubric")
+        if failed:
+            print(f"❌ Unmatched phrases: {failed}")
+            return False
+        
+        # Negation covers only the negated symptom, never what follows "with"/"despite"
+        scopes = {
+            "Painless diarrhea": ({"~pain"}, {"diarrhea"}),
+            "No thirst with fever": ({"~thirst"}, {"fever"}),
+            "No thirst despite fever": ({"~thirst"}, {"fever"}),
+            "Thirstless despite dry mouth": ({"~thirst"}, {"dry", "mouth"}),
+            "Thirstless with dry mouth": ({"~thirst"}, {"dry", "mouth"}),
+        }
+        wrong = [text for text, (negated, positive) in scopes.items()
+                 if not negated | positive <= normalize_phrase(text)]
+        print(f"✅ {len(scopes) - len(wrong)}/{len(scopes)} negations scoped correctly")
+        if wrong:
+            print(f"❌ Negation leaked past its symptom: {wrong}")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing phrase normalization: {e}")
+        return False
+
+def test_semantic_fallback():
+    """Test that only phrases without a lexical hit go to the semantic matcher"""
+    print("\n🔍 Testing semantic rubric fallback...")
+    try:
+        from src.repertory import compile_repertory, repertorize
+        
+        repertory = compile_repertory("data/repertory_mapping.csv")
+        sent = []
+        def match_semantic(phrases):
+            # Stands in for the embeddings lookup: every phrase is closest to the first rubric
+            sent.extend(text for text, _ in phrases)
+            return {0: (0.8, phrases[0][0])} if phrases else {}
+        
+        case = {"presenting_complaint": "Feels like a stranger in her own home",
+                "thermal": "Very chilly", "mental_emotional": ["Irritable"]}
+        repertory.match_semantic = match_semantic
+        try:
+            lexical = repertorize(case, "data/repertory_mapping.csv", semantic=False)
+            result = repertorize(case, "data/repertory_mapping.csv", semantic=True)
+        finally:
+            del repertory.match_semantic
+        
+        semantic = [h for h in result["hits"] if h["match_type"] == "semantic"]
+        print(f"✅ Sent to semantic matching: {sent}")
+        if sent != ["Feels like a stranger in her own home"] or len(semantic) != 1:
+            print("❌ Semantic fallback not limited to phrases without lexical hits")
+            return False
+        if len(result["hits"]) != len(lexical["hits"]) + 1:
+            print("❌ Lexical hits changed when the fallback was enabled")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing semantic fallback: {e}")
+        return False
+
+def test_matrix_scoring():
+    """Test that the all-remedy matrix scorer agrees with the per-remedy scorer"""
+    print("\n🔍 Testing matrix totality scoring...")
+    try:
+        from src.clinical_engine import ClinicalScoringEngine
+        from src.remedy_profiles import load_remedy_matrix
+        
+        with open("test_cases/test_cases_comprehensive.json", "r") as f:
+            case_data = json.load(f)["test_cases"][0]["case_data"]
+        matrix = load_remedy_matrix()
+        engine = ClinicalScoringEngine()
+        rows = engine.score_all(case_data, matrix)
+        single = {p.remedy_id: engine.calculate_totality_score(case_data, p) for p in matrix.profiles}
+        
+        worst = max(abs(row["totality"] - single[row["remedy_id"]]) for row in rows)
+        ranked = sorted(single, key=lambda r: -single[r])
+        print(f"✅ Scored {len(rows)} remedies, largest difference {worst:.4f}")
+        if worst > 1e-3 or [row["remedy_id"] for row in rows[:5]] != ranked[:5]:
+            print("❌ Matrix ranking differs from the per-remedy scorer")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing matrix scoring: {e}")
+        return False
+
+def test_modality_engine():
+    """Test modality agreement and contradiction scoring"""
+    print("\n🔍 Testing modality engine...")
+    try:
+        from src.modalities import encode_modalities, modality_score, describe, WORSE
+        
+        case_bits = encode_modalities(["heat", "consolation", "4 pm"], WORSE)
+        agrees = encode_modalities(["Worse heat, worse consolation, worse 4 pm"])
+        contradicts = encode_modalities(["Better heat, better consolation, better afternoon"])
+        
+        agree, contradict = modality_score(case_bits, agrees), modality_score(case_bits, contradicts)
+        print(f"✅ Case modalities: {describe(case_bits)}")
+        print(f"   📊 Agreeing remedy {agree:.2f}, contradicting remedy {contradict:.2f}")
+        if agree != 1.0 or contradict != -1.0:
+            print("❌ Modality scores not at the agree/contradict extremes")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing modality engine: {e}")
+        return False
+
+def test_miasm_classifier():
+    """Test miasm classification of known cases, one at a time and as a batch"""
+    print("\n🔍 Testing miasm classifier...")
+    try:
+        import numpy as np
+        from src.miasms import get_miasm_classifier
+        
+        classifier = get_miasm_classifier()
+        cases = [
+            {"presenting_complaint": "Warts on hands, chronic catarrh with thick discharge",
+             "mental_emotional": ["Secretive, fixed ideas"], "generals": ["Worse damp weather"]},
+            {"presenting_complaint": "Mouth ulcers, bone pains worse night", "mental_emotional": ["Suicidal thoughts"]},
+            {"presenting_complaint": "Cough"},
+        ]
+        profiles = classifier.classify_many(cases)
+        dominant = [classifier.miasms[int(row.argmax())] if row.any() else None for row in profiles]
+        
+        print(f"✅ Dominant miasms: {dominant}")
+        if dominant != ["sycosis", "syphilis", None]:
+            print("❌ Unexpected miasm classification")
+            return False
+        if not all(np.allclose(row, classifier.classify(case)) for row, case in zip(profiles, cases)):
+            print("❌ Batch classification differs from single-case classification")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing miasm classifier: {e}")
+        return False
+
+def test_followup_timeline():
+    """Test follow-up analysis over an in-memory timeline"""
+    print("\n🔍 Testing follow-up timeline...")
+    try:
+        from src.clinical_engine import FollowUpAnalyzer
+        from src.timeline import TimelineStore
+        
+        analyzer = FollowUpAnalyzer(TimelineStore(":memory:"))
+        baseline = {"symptoms": [
+            {"text": "Irritable", "level": "mental", "intensity": 8},
+            {"text": "Headache", "level": "particular", "intensity": 6},
+        ]}
+        better = {"symptoms": [
+            {"text": "Irritable", "level": "mental", "intensity": 1},
+            {"text": "Headache", "level": "particular", "intensity": 2},
+        ]}
+        analyzer.record_visit("demo", baseline)
+        result = analyzer.record_visit("demo", better)
+        
+        print(f"✅ Visits stored: {len(analyzer.history('demo'))}")
+        if result["pattern"] != "ideal":
+            print(f"❌ Expected 'ideal' response, got {result['pattern']}")
+            return False
+        
+        print(f"   📊 Pattern: {result['pattern']}, net improvement {result['net_improvement']}")
+        return True
+    except Exception as e:
+        print(f"❌ Error testing follow-up timeline: {e}")
+        return False
+
+def test_tuning_harness():
+    """Test the offline tuning harness over a 2-point grid"""
+    print("\n🔍 Testing tuning harness...")
+    try:
+        from src.tuning import grid_configs, load_corpus, run_search
+        
+        configs = grid_configs({"mental": [8.0, 10.0]})
+        results = run_search(configs, load_corpus()[:6], workers=1)
+        
+        best = results[0]["all"]
+        print(f"✅ {len(results)} configurations: best top1 {best['top1']}, brier {best['brier']}")
+        if len(results) != 2 or {r["config"]["mental"] for r in results} != {8.0, 10.0}:
+            print("❌ Grid configurations not all evaluated")
+            return False
+        return all(0.0 <= r["all"]["brier"] <= 1.0 and r["all"]["cases"] == 6 for r in results)
+    except Exception as e:
+        print(f"❌ Error testing tuning harness: {e}")
+        return False
+
+def test_concurrent_workflow():
+    """Test that MM, questioning and clinical run concurrently and match a sequential run"""
+    print("\n🔍 Testing concurrent workflow stages...")
+    try:
+        import asyncio
+        import time
+        import src.async_orchestrator as async_orchestrator
+        import src.orchestrator as orchestrator
+        from src.clinical_engine import get_clinical_recommendation
+        from src.embeddings import lexical_search
+        from src.intelligent_questioning import should_ask_more_questions
+        
+        with open("test_cases/test_cases_comprehensive.json", "r") as f:
+            case_data = json.load(f)["test_cases"][0]["case_data"]
+        
+        # Stand-ins for the embeddings search and the two thread-pool stages, each taking 0.2s
+        intervals = {}
+        def timed(name, fn):
+            def run(*args, **kwargs):
+                start = time.perf_counter()
+                time.sleep(0.2)
+                result = fn(*args, **kwargs)
+                first, last = intervals.get(name, (start, 0.0))
+                intervals[name] = (min(first, start), max(last, time.perf_counter()))
+                return result
+            return run
+        search = timed("materia_medica", lambda query, k=2: lexical_search(query, k=k))
+        async def search_async(query, k=2):
+            return await asyncio.to_thread(search, query, k)
+        
+        patched = {
+            (async_orchestrator, "mm_search_async"): search_async,
+            (async_orchestrator, "should_ask_more_questions"): timed("questioning", should_ask_more_questions),
+            (async_orchestrator, "get_clinical_recommendation"): timed("clinical", get_clinical_recommendation),
+            (orchestrator, "mm_search"): search,
+        }
+        originals = {target: getattr(*target) for target in patched}
+        for (module, name), stand_in in patched.items():
+            setattr(module, name, stand_in)
+        try:
+            result = async_orchestrator.run_full_case_workflow_sync(case_data, use_cache=False)
+            concurrent = dict(intervals)
+            
+            # The same stages one after another
+            case = orchestrator.agent_case_taker(case_data)["case"]
+            repertory = orchestrator.agent_repertory(case)
+            mm_result = orchestrator.agent_materia_medica(repertory["top_candidates"],
+                                                          orchestrator.build_case_summary(case))
+            clinical = get_clinical_recommendation(case, repertory["repertory"], mm_result["mm_context"])
+            differential = orchestrator.agent_differential(case, repertory["repertory"], mm_result["mm_context"],
+                                                           clinical)
+            sequential = orchestrator.agent_prescription(differential)
+        finally:
+            for (module, name), original in originals.items():
+                setattr(module, name, original)
+        
+        overlap = min(end for _, end in concurrent.values()) - max(start for start, _ in concurrent.values())
+        steps = {step["agent"]: step["result"] for step in result["steps"]}
+        print(f"✅ {sorted(concurrent)} overlapped {overlap:.2f}s · "
+              f"{result['final_result'].get('prescription', {}).get('remedy')}")
+        if len(concurrent) != 3 or overlap <= 0:
+            print("❌ Independent stages did not run concurrently")
+            return False
+        if result["final_result"] != sequential or steps["MateriaMedica"]["mm_context"] != mm_result["mm_context"]:
+            print("❌ Concurrent workflow differs from the sequential stages")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing concurrent workflow: {e}")
+        return False
+
+def test_llm_cache():
+    """Test the LLM response cache in memory"""
+    print("\n🔍 Testing LLM response cache...")
+    try:
+        from common.llm_cache import LLMCache
+        
+        cache = LLMCache(":memory:", max_entries=2, max_temperature=0.3)
+        key = cache.key("gpt-4o", 0.2, "system", "case")
+        if cache.get(key) is not None:
+            print("❌ Empty cache returned a response")
+            return False
+        cache.put(key, "gpt-4o", 0.2, "response")
+        for i in range(2):
+            cache.put(cache.key("gpt-4o", 0.2, "system", f"other {i}"), "gpt-4o", 0.2, "x")
+        
+        stats = cache.stats()
+        print(f"✅ Entries after eviction: {stats['entries']}")
+        if stats["entries"] != 2 or cache.get(key) is not None or cache.cacheable(0.7):
+            print("❌ Eviction or temperature threshold not applied")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing LLM cache: {e}")
+        return False
+
+def test_client_provider():
+    """Test that a provider pointed at a local stand-in server reuses its connections"""
+    print("\n🔍 Testing shared OpenAI clients...")
+    try:
+        import asyncio
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from src.openai_clients import ClientProvider, set_provider
+        from src.orchestrator import call_llm
+        from src.async_orchestrator import async_call_llm
+        
+        ports = []
+        class StandIn(BaseHTTPRequestHandler):
+            """Chat completions endpoint answering every request on a keep-alive connection"""
+            protocol_version = "HTTP/1.1"
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                ports.append(self.client_address[1])
+                body = json.dumps({
+                    "id": "standin", "object": "chat.completion", "created": 0, "model": request["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": request["messages"][-1]["content"]}}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        provider = ClientProvider(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        previous = set_provider(provider)
+        try:
+            replies = [call_llm("system", f"sync {i}", use_cache=False) for i in range(3)]
+            sync_ports = list(ports)
+            
+            async def run_async():
+                try:
+                    return [await async_call_llm("system", f"async {i}", use_cache=False) for i in range(3)]
+                finally:
+                    await provider.aclose()
+            replies += asyncio.run(run_async())
+            async_ports = ports[len(sync_ports):]
+        finally:
+            set_provider(previous)
+            provider.close()
+            server.shutdown()
+            server.server_close()
+        
+        print(f"✅ {len(ports)} requests over {len(set(ports))} connection(s)")
+        if replies != [f"sync {i}" for i in range(3)] + [f"async {i}" for i in range(3)]:
+            print("❌ Stand-in replies not returned")
+            return False
+        if len(set(sync_ports)) != 1 or len(set(async_ports)) != 1:
+            print("❌ Connections were not reused")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing shared clients: {e}")
+        return False
+
+def test_streaming_parser():
+    """Test incremental parsing of a streamed differential reply"""
+    print("\n🔍 Testing streaming JSON parser...")
+    try:
+        from common.streaming import IncrementalJSONParser
+        
+        reply = '```json\n{"remedy": "Sepia", "rationale": ["Indifference, \\"flat\\"", "Worse consolation"], "monitoring": ["Energy"]}\n```'
+        parser = IncrementalJSONParser()
+        items = []
+        for i in range(0, len(reply), 5):
+            items += [e["value"] for e in parser.feed(reply[i:i + 5]) if e["type"] == "item"]
+        
+        print(f"✅ Streamed items: {items}")
+        if items != ['Indifference, "flat"', "Worse consolation", "Energy"] or not parser.done:
+            print("❌ Unexpected streamed items")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing streaming parser: {e}")
+        return False
+
+def test_tracing():
+    """Test per-stage workflow spans, trace file rotation and TRACING=0"""
+    print("\n🔍 Testing workflow tracing...")
+    try:
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        from src import tracing
+        from src.async_orchestrator import run_full_case_workflow_sync
+        
+        with open("test_cases/test_cases_comprehensive.json", "r") as f:
+            case_data = json.load(f)["test_cases"][0]["case_data"]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces.jsonl")
+            tracing.set_trace_file(path, max_bytes=2000, backups=2)
+            try:
+                # A short deadline keeps the run offline (lexical MM search, template rationale)
+                result = run_full_case_workflow_sync(case_data, use_cache=False, deadline_s=2)
+                for _ in range(20):
+                    with tracing.trace("rotation"), tracing.span("stage.test"):
+                        pass
+            finally:
+                tracing.set_trace_file()
+            files = sorted(os.listdir(tmp))
+            written = []
+            for name in files:
+                with open(os.path.join(tmp, name), "r") as f:
+                    written += [json.loads(line)["trace_id"] for line in f]
+        
+        stages = {"stage.case_taker", "stage.repertory", "stage.materia_medica", "stage.questioning",
+                  "stage.clinical", "stage.differential", "stage.prescription"}
+        summary = result.get("trace", {})
+        print(f"✅ {len(summary.get('spans', {}))} span names, {len(written)} traces in {files}")
+        if not stages <= set(summary.get("spans", {})):
+            print(f"❌ Missing stage spans: {sorted(stages - set(summary.get('spans', {})))}")
+            return False
+        if files != ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"] or summary["trace_id"] not in written:
+            print("❌ Trace file not written or not rotated")
+            return False
+        
+        # Tracing is read from the environment at import
+        disabled = subprocess.run(
+            [sys.executable, "-c", "from src.tracing import trace, span, NULL_SPAN\n"
+                                   "with trace('workflow') as t, span('stage.test') as s:\n"
+                                   "    print(t is None and s is NULL_SPAN)"],
+            env=dict(os.environ, TRACING="0"), capture_output=True, text=True, timeout=60
+        )
+        if disabled.stdout.strip() != "True":
+            print(f"❌ TRACING=0 did not hand out the no-op span {disabled.stderr[-200:]}")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing tracing: {e}")
+        return False
+
+def test_fast_path():
+    """Test the template rationale for high-confidence cases (no API calls)"""
+    print("\n🔍 Testing high-confidence fast path...")
+    try:
+        from src.orchestrator import agent_case_taker, agent_repertory, agent_differential
+        
+        with open("test_cases/test_cases_comprehensive.json", "r") as f:
+            case_data = json.load(f)["test_cases"][0]["case_data"]
+        case_data = agent_case_taker(case_data)["case"]
+        repertory = agent_repertory(case_data)["repertory"]
+        result = agent_differential(case_data, repertory, [], fast_path_confidence=0.5)
+        
+        print(f"✅ {result.get('remedy')}: {len(result.get('rationale', []))} rationale lines from {result.get('rationale_source')}")
+        if result.get("rationale_source") != "template" or not result.get("rationale") or not result.get("monitoring"):
+            print("❌ Fast path did not render a template rationale")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing fast path: {e}")
+        return False
+
+def test_workflow_cache():
+    """Test canonical case hashing and workflow result memoization"""
+    print("\n🔍 Testing workflow result cache...")
+    try:
+        from common.workflow_cache import WorkflowCache, case_hash
+        
+        case = {"presenting_complaint": "Headache  after grief", "mental_emotional": ["Weeps alone"], "onset": None}
+        same = {"mental_emotional": ["weeps alone "], "presenting_complaint": "headache after Grief"}
+        if case_hash(case) != case_hash(same):
+            print("❌ Equivalent cases hash differently")
+            return False
+        
+        cache = WorkflowCache(":memory:", sources=[])
+        key = cache.key(case)
+        cache.put(key, {"steps": [], "final_result": {"status": "complete"}, "trace": {}})
+        cached = cache.get(cache.key(same))
+        
+        print(f"✅ Canonical hash {case_hash(case)[:12]}, memo {cached and cached.get('memo')}")
+        if not cached or "trace" in cached:
+            print("❌ Memoized result not returned")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing workflow cache: {e}")
+        return False
+
+def test_stage_reuse():
+    """Test that an edit only recomputes the stages reading the changed fields"""
+    print("\n🔍 Testing incremental stage reuse...")
+    try:
+        from src.stages import StageRunner, clear_stage_cache
+        
+        clear_stage_cache()
+        calls = []
+        def stage(name):
+            return lambda *args: calls.append(name) or {"status": "complete", "stage": name}
+        
+        def analyze(case):
+            stages = StageRunner(case)
+            stages.run("repertory", stage("repertory"))
+            stages.run("materia_medica", stage("materia_medica"))
+            stages.run("clinical", stage("clinical"))
+            stages.run("differential", stage("differential"))
+            return stages.report()
+        
+        case = {"presenting_complaint": "Grief", "mental_emotional": ["Weeps alone"], "onset": "Sudden"}
+        analyze(case)
+        calls.clear()
+        report = analyze(dict(case, onset="Gradual"))
+        
+        print(f"✅ Reused {report['reused']}, recomputed {report['computed']}")
+        if calls != ["clinical"] or report["reused"] != ["repertory", "materia_medica", "differential"]:
+            print("❌ Unchanged stages were recomputed")
+            return False
+        
+        # Etiology reaches the differential prompt through the matched keynotes
+        calls.clear()
+        report = analyze(dict(case, etiology="Ailments from grief"))
+        print(f"✅ Etiology edit recomputed {report['computed']}")
+        if "differential" not in calls:
+            print("❌ Differential reused after an etiology edit")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing stage reuse: {e}")
+        return False
+
+def test_deadline():
+    """Test that a spent deadline degrades MM search to lexical matching"""
+    print("\n🔍 Testing request deadline fallbacks...")
+    try:
+        from src.deadline import deadline
+        from src.orchestrator import agent_materia_medica
+        
+        with deadline(0.0) as budget:
+            mm_result = agent_materia_medica([{"name": "Ignatia", "score": 10}], "grief sighing weeping")
+            result = budget.attach({})
+        
+        print(f"✅ {mm_result['message']} · degradations {result['degradations']}")
+        if mm_result.get("degraded") != "budget" or [d["fallback"] for d in result["degradations"]] != ["lexical"]:
+            print("❌ Spent deadline did not fall back to lexical search")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing deadline: {e}")
+        return False
+
+def test_singleflight():
+    """Test that identical concurrent calls share one computation"""
+    print("\n🔍 Testing request coalescing...")
+    try:
+        import threading
+        import time
+        from common.singleflight import SingleFlight, request_key
+        
+        flights = SingleFlight("test")
+        calls = []
+        def search(query):
+            calls.append(query)
+            time.sleep(0.2)
+            return [{"title": query}]
+        
+        results = []
+        key = request_key("grief", 2)
+        threads = [threading.Thread(target=lambda: results.append(flights.do(key, search, "grief")))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        shared = sum(1 for _, was_shared in results if was_shared)
+        print(f"✅ 4 identical calls: {len(calls)} computation(s), {shared} shared")
+        if len(calls) != 1 or shared != 3 or any(result != [{"title": "grief"}] for result, _ in results):
+            print("❌ Identical concurrent calls were not coalesced")
+            return False
+        return True
+    except Exception as e:
+        print(f"❌ Error testing request coalescing: {e}")
+        return False
+
+def test_prompt_budget():
+    """Test that the differential context fits its token budget, keynotes first"""
+    print("\n🔍 Testing prompt context budget...")
+    try:
+        from common.normalize import normalize_text
+        from common.prompt_budget import budget_context, count_tokens
+        
+        excerpt = "Keynotes:\n- Weepy, seeks consolation\n- Thirstless\n" + "\n".join(
+            f"- Unrelated symptom number {i} of the monograph" for i in range(40))
+        mm_context = [{"remedy": "Pulsatilla", "mm_excerpts": [excerpt, excerpt]},
+                      {"remedy": "Sepia", "mm_excerpts": [excerpt]}]
+        candidates = [{"name": "Pulsatilla", "score": 11.0, "reasons": []}, {"name": "Sepia", "score": 3.0}]
+        keynotes = {"Pulsatilla": ["Weepy, seeks consolation"]}
+        case_tokens = normalize_text("Weepy, wants consolation; thirstless; every symptom worse at night")
+        
+        candidates_text, mm_text, report = budget_context(case_tokens, candidates, mm_context, keynotes, budget=100)
+        print(f"✅ {report['tokens']} tokens (full {report['full_tokens']}, saved {report['saved']})")
+        if report["tokens"] > 100 or "Weepy" not in mm_text or mm_text.count("Thirstless") != 1:
+            print("❌ Context exceeded its budget or lost keynotes")
+            return False
+        _, full_text, full_report = budget_context(case_tokens, candidates, mm_context, keynotes, full=True)
+        return full_report["tokens"] == full_report["full_tokens"] and count_tokens(full_text) > report["tokens"]
+    except Exception as e:
+        print(f"❌ Error testing prompt budget: {e}")
+        return False
+
+def test_prompt_prefix():
+    """Test that differential prompts share a static prefix and cached tokens are recorded"""
+    print("\n🔍 Testing cache-friendly prompt layout...")
+    try:
+        from types import SimpleNamespace
+        from src.orchestrator import differential_request
+        from src.tracing import span, trace
+        
+        repertory = {"candidates": [{"name": "Pulsatilla", "score": 11.0}]}
+        requests = [differential_request({"presenting_complaint": complaint}, repertory, [], {"status": "unclear"})
+                    for complaint in ("Ear infection", "Headache after grief")]
+        if requests[0]["system_prompt"] != requests[1]["system_prompt"] or "Ear infection" in requests[0]["system_prompt"]:
+            print("❌ Case data leaked into the static prompt prefix")
+            return False
+        
+        usage = SimpleNamespace(prompt_tokens=1200, completion_tokens=80,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+        with trace("test") as current:
+            with span("llm.chat") as s:
+                s.usage(usage)
+        if current is None:
+            print("⚠️  Tracing disabled; cached-token recording not checked")
+            return True
+        summary = current.summary()
+        print(f"✅ Shared prefix; recorded {summary['tokens_cached']} of {summary['tokens_in']} prompt tokens as cached")
+        return summary["tokens_cached"] == 1024
+    except Exception as e:
+        print(f"❌ Error testing prompt layout: {e}")
+        return False
+
+def test_batch_resume():
+    """Test that an offline batch run writes results and resumes, retrying degraded cases"""
+    print("\n🔍 Testing batch runs...")
+    try:
+        import os
+        import tempfile
+        from src.batch import BatchRunner, run_offline
+        
+        with open("test_cases/test_cases_comprehensive.json", "r") as f:
+            test_cases = json.load(f)["test_cases"][:3]
+        cases = [(tc["case_id"], tc["case_data"]) for tc in test_cases]
+        
+        class OutageRunner(BatchRunner):
+            """Second case falls back as if the LLM had timed out"""
+            def run_case(self, case_data):
+                result = run_offline(case_data)
+                if case_data is cases[1][1]:
+                    result["degradations"] = [{"stage": "differential", "fallback": "template", "reason": "timeout"}]
+                return result
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.jsonl")
+            first = OutageRunner(output, workers=2, mode="offline").run(iter(cases[:2]))
+            resumed = BatchRunner(output, workers=2, mode="offline").run(iter(cases))
+            with open(output, "r") as f:
+                records = [json.loads(line) for line in f]
+        
+        print(f"✅ {first['done']} done, {first['errors']} degraded, then resumed: "
+              f"{resumed['skipped']} skipped, {resumed['done']} run")
+        if first["errors"] != 1 or resumed["skipped"] != 1 or resumed["done"] != 2 or len(records) != 4:
+            print("❌ Resumed batch did not skip finished cases and retry degraded ones")
+            return False
+        latest = {r["case_id"]: r["status"] for r in records}
+        return all(status == "ok" for status in latest.values())
+    except Exception as e:
+        print(f"❌ Error testing batch runs: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("=" * 70)
@@ -205,6 +916,27 @@ def main():
     results.append(("Repertory", test_repertory()))
     results.append(("OpenAI Key", test_openai_key()))
     results.append(("Intelligent Questioning", test_intelligent_questioning()))
+    results.append(("Remedy Registry", test_remedy_registry()))
+    results.append(("Phrase Normalization", test_phrase_normalization()))
+    results.append(("Semantic Fallback", test_semantic_fallback()))
+    results.append(("Matrix Scoring", test_matrix_scoring()))
+    results.append(("Modality Engine", test_modality_engine()))
+    results.append(("Miasm Classifier", test_miasm_classifier()))
+    results.append(("Follow-up Timeline", test_followup_timeline()))
+    results.append(("Tuning Harness", test_tuning_harness()))
+    results.append(("Concurrent Workflow", test_concurrent_workflow()))
+    results.append(("LLM Cache", test_llm_cache()))
+    results.append(("Shared Clients", test_client_provider()))
+    results.append(("Streaming Parser", test_streaming_parser()))
+    results.append(("Tracing", test_tracing()))
+    results.append(("Fast Path", test_fast_path()))
+    results.append(("Workflow Cache", test_workflow_cache()))
+    results.append(("Stage Reuse", test_stage_reuse()))
+    results.append(("Request Deadline", test_deadline()))
+    results.append(("Request Coalescing", test_singleflight()))
+    results.append(("Prompt Budget", test_prompt_budget()))
+    results.append(("Prompt Prefix", test_prompt_prefix()))
+    results.append(("Batch Resume", test_batch_resume()))
     
     print("\n" + "=" * 70)
     print("📊 TEST SUMMARY")